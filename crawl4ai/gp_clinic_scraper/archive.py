@@ -0,0 +1,168 @@
+"""
+Append-only compressed archive of fetched Healthpoint pages
+
+Every page the scraper fetches is appended to a segment file as its own gzip
+member (so `zcat segment-00001.gz` still reads the whole segment), and a JSONL
+index records where it landed:
+
+  {"url": ..., "type": "clinic", "segment": "segment-00001.gz", "offset": 0,
+   "length": 18234, "hash": ..., "fetched_at": ...}
+
+A page whose content hash matches the last archived copy is not stored again.
+Segments roll over at `max_segment_bytes`. The latest index entry per URL wins
+on read.
+"""
+
+import gzip
+import json
+import logging
+import os
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from checkpoint import _BatchedSyncFile
+from http_cache import content_hash
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = 'index.jsonl'
+
+
+class ArchiveEntry:
+    def __init__(self, url: str, page_type: str, segment: str, offset: int, length: int, hash_: str,
+                 fetched_at: float):
+        self.url = url
+        self.page_type = page_type
+        self.segment = segment
+        self.offset = offset
+        self.length = length
+        self.hash = hash_
+        self.fetched_at = fetched_at
+
+
+def read_entry(directory: str, segment: str, offset: int, length: int) -> str:
+    """Decompress one archived page"""
+    with open(os.path.join(directory, segment), 'rb') as f:
+        f.seek(offset)
+        return gzip.decompress(f.read(length)).decode('utf-8')
+
+
+def load_index(directory: str) -> Dict[str, ArchiveEntry]:
+    """Latest entry per URL, in the order URLs were first archived; entries past a torn segment end are dropped"""
+    entries: Dict[str, ArchiveEntry] = {}
+    path = os.path.join(directory, INDEX_NAME)
+    if not os.path.exists(path):
+        return entries
+    sizes: Dict[str, int] = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                e = json.loads(line)
+            except ValueError:
+                continue  # torn last line
+            segment = e['segment']
+            if segment not in sizes:
+                segment_path = os.path.join(directory, segment)
+                sizes[segment] = os.path.getsize(segment_path) if os.path.exists(segment_path) else 0
+            if e['offset'] + e['length'] > sizes[segment]:
+                continue
+            entry = ArchiveEntry(e['url'], e.get('type', ''), segment, e['offset'], e['length'], e['hash'],
+                                 e.get('fetched_at', 0.0))
+            # Re-assigning keeps the URL's first-seen position
+            entries[entry.url] = entry
+    return entries
+
+
+class HtmlArchive(_BatchedSyncFile):
+    """The index is the batched-sync JSONL file; the current segment is synced before it"""
+
+    def __init__(self, directory: str, max_segment_bytes: int = 256 * 1024 * 1024, compresslevel: int = 6):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.compresslevel = compresslevel
+        self.entries = load_index(directory)
+        self.stats = {'stored': 0, 'duplicates': 0, 'bytes': 0}
+        self._segment_file = None
+        self._segment_name = ''
+        names = sorted(n for n in os.listdir(directory) if n.startswith('segment-') and n.endswith('.gz'))
+        self._open_segment(names[-1] if names else 'segment-00001.gz')
+        super().__init__(os.path.join(directory, INDEX_NAME))
+
+    def _open_segment(self, name: str):
+        if self._segment_file is not None:
+            self._sync_segment()
+            self._segment_file.close()
+        path = os.path.join(self.directory, name)
+        if os.path.exists(path) and os.path.getsize(path) >= self.max_segment_bytes:
+            return self._open_segment(f'segment-{int(name[8:13]) + 1:05d}.gz')
+        self._segment_name = name
+        self._segment_file = open(path, 'ab')
+
+    def _sync_segment(self):
+        self._segment_file.flush()
+        os.fsync(self._segment_file.fileno())
+
+    def sync(self):
+        # An index line must never reach disk before the bytes it points at
+        if self._segment_file is not None and not self._segment_file.closed:
+            self._sync_segment()
+        super().sync()
+
+    def append(self, url: str, html: str, page_type: str = '') -> bool:
+        """Archive a fetched page; returns False if it matches the latest archived copy"""
+        hash_ = content_hash(html)
+        previous = self.entries.get(url)
+        if previous is not None and previous.hash == hash_:
+            self.stats['duplicates'] += 1
+            return False
+        if self._segment_file.tell() >= self.max_segment_bytes:
+            self._open_segment(f'segment-{int(self._segment_name[8:13]) + 1:05d}.gz')
+
+        blob = gzip.compress(html.encode('utf-8'), compresslevel=self.compresslevel, mtime=0)
+        offset = self._segment_file.tell()
+        self._segment_file.write(blob)
+        self._segment_file.flush()
+
+        entry = ArchiveEntry(url, page_type, self._segment_name, offset, len(blob), hash_, time.time())
+        self.file.write(json.dumps({
+            'url': url, 'type': page_type, 'segment': entry.segment, 'offset': offset,
+            'length': entry.length, 'hash': hash_, 'fetched_at': round(entry.fetched_at, 3),
+        }) + '\n')
+        self.wrote()
+        self.entries[url] = entry
+        self.stats['stored'] += 1
+        self.stats['bytes'] += len(blob)
+        return True
+
+    def get(self, url: str) -> Optional[str]:
+        entry = self.entries.get(url)
+        if entry is None:
+            return None
+        return read_entry(self.directory, entry.segment, entry.offset, entry.length)
+
+    def iter_pages(self, page_type: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+        """(url, html) for the latest copy of each archived page, optionally of one type"""
+        for entry in list(self.entries.values()):
+            if page_type is None or entry.page_type == page_type:
+                yield entry.url, read_entry(self.directory, entry.segment, entry.offset, entry.length)
+
+    def close(self):
+        super().close()
+        if self._segment_file is not None:
+            self._segment_file.close()
+            self._segment_file = None
+
+    def summary(self) -> str:
+        s = self.stats
+        return (f"archived {s['stored']} pages ({s['bytes'] / 1e6:.1f} MB compressed), "
+                f"{s['duplicates']} unchanged, {len(self.entries)} URLs in {self.directory}")
+
+
+def find_archives(root: str) -> List[str]:
+    """Archive directories under root (one per region shard, or root itself)"""
+    found = []
+    for dirpath, _, filenames in os.walk(root):
+        if INDEX_NAME in filenames:
+            found.append(dirpath)
+    return sorted(found)
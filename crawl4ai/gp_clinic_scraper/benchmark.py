@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the GP clinic scraper
+
+Two suites, both driven by the saved HTML fixtures next to this script:
+
+  parse  - parse throughput of the listing helpers (_extract_clinic_urls_from_page,
+           _find_next_page_url) and the clinic page extractors (BeautifulSoup
+           _extract_* methods and the lxml ClinicPageExtractor), over synthetic
+           variants of the fixtures
+  crawl  - an end-to-end crawl against a local stand-in for Healthpoint that
+           serves the fixtures with configurable latency and pagination
+  index  - build, load, incremental update and lookup latency of ClinicIndex
+           over --clinics synthetic records derived from the region CSV
+
+Results (pages/s, p50/p95 latency, peak RSS) are written to JSON. Pass
+--compare with an earlier results file to flag regressions. Every run first
+checks that the lxml extractor returns exactly what the BeautifulSoup methods
+do on each fixture, and fails if any field differs.
+
+Usage:
+  python benchmark.py --output bench_results.json
+  python benchmark.py --suite parse --pages 2000 --compare bench_results.json
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import platform
+import re
+import resource
+import statistics
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from bs4 import BeautifulSoup
+
+from clinic_index import ClinicIndex
+from gp_clinic_scraper import GPClinicScraper
+
+logger = logging.getLogger(__name__)
+
+FIXTURE_DIR = os.path.dirname(os.path.abspath(__file__))
+LISTING_FIXTURES = ['debug_page_1.html', 'test_page2_actual.html', 'test_page2_flow.html']
+CLINIC_FIXTURE = 'test_clinic_page.html'
+RECORDS_FIXTURE = 'north_auckland_gp_clinics.csv'
+
+_FIXTURE_PAGINATION = re.compile(r'<span class="pagination">.*?class="next">Next page</a>\s*</span>', re.DOTALL)
+
+# Metrics where a bigger number is better; everything else is treated as lower-is-better
+HIGHER_IS_BETTER = ('pages_per_s',)
+
+
+def load_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURE_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def summarise(latencies: List[float], elapsed: float) -> Dict:
+    latencies = sorted(latencies)
+    n = len(latencies)
+    return {
+        'pages': n,
+        'elapsed_s': round(elapsed, 4),
+        'pages_per_s': round(n / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(latencies[n // 2] * 1000, 3) if n else 0.0,
+        'p95_ms': round(latencies[min(n - 1, int(n * 0.95))] * 1000, 3) if n else 0.0,
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3) if n else 0.0,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def clinic_variant(template: str, i: int) -> str:
+    """A distinct clinic page per index so nothing downstream can memoise on identical input"""
+    return (template
+            .replace('Windsor Medical Centre', f'Windsor Medical Centre {i}')
+            .replace('Dr Alan Lee', f'Dr Alan Lee{i}')
+            .replace('admin@windsormedical.co.nz', f'admin{i}@windsormedical.co.nz'))
+
+
+def listing_variant(template: str, i: int) -> str:
+    return template.replace('/gps-accident-urgent-medical-care/gp/', f'/gps-accident-urgent-medical-care/gp/v{i}-')
+
+
+def time_each(items: List[str], fn: Callable[[str], object]) -> Dict:
+    latencies = []
+    start = time.perf_counter()
+    for html in items:
+        t0 = time.perf_counter()
+        fn(html)
+        latencies.append(time.perf_counter() - t0)
+    return summarise(latencies, time.perf_counter() - start)
+
+
+def check_extractor_parity(scraper: GPClinicScraper) -> List[str]:
+    """Fields where ClinicPageExtractor and the BeautifulSoup methods disagree on a fixture"""
+    extractor = scraper.extractor
+    if extractor is None:
+        return []
+    mismatches = []
+    pages = [(name, load_fixture(name)) for name in LISTING_FIXTURES + [CLINIC_FIXTURE]]
+    pages += [(f"{CLINIC_FIXTURE} variant {i}", clinic_variant(load_fixture(CLINIC_FIXTURE), i)) for i in range(3)]
+    for name, html in pages:
+        fast = extractor.extract(html, name)
+        scraper.extractor = None
+        try:
+            reference = scraper.parse_clinic_page(html, name)
+        finally:
+            scraper.extractor = extractor
+        mismatches += [f"{name} {field}: lxml {fast[field]!r} != bs4 {reference[field]!r}"
+                       for field in reference if fast.get(field) != reference[field]]
+    return mismatches
+
+
+def run_parse_suite(pages: int) -> Dict:
+    scraper = GPClinicScraper()
+    listing_templates = [load_fixture(name) for name in LISTING_FIXTURES]
+    listings = [listing_variant(listing_templates[i % len(listing_templates)], i) for i in range(pages)]
+    clinic_template = load_fixture(CLINIC_FIXTURE)
+    clinics = [clinic_variant(clinic_template, i) for i in range(pages)]
+
+    def listing_bs4(html: str):
+        soup = BeautifulSoup(html, 'html.parser')
+        scraper._extract_clinic_urls_from_page(soup)
+        scraper._find_next_page_url(soup)
+
+    def clinic_bs4(html: str):
+        soup = BeautifulSoup(html, 'html.parser')
+        scraper._extract_clinic_name(soup)
+        scraper._extract_address(soup)
+        scraper._extract_phone(soup)
+        scraper._extract_email(soup)
+        scraper._extract_doctors(soup)
+
+    results = {
+        'listing_bs4': time_each(listings, listing_bs4),
+        'clinic_bs4': time_each(clinics, clinic_bs4),
+    }
+    if scraper.extractor is not None:
+        results['clinic_lxml'] = time_each(clinics, lambda html: scraper.extractor.extract(html, 'bench'))
+    return results
+
+
+class StandInServer:
+    """Local HTTP stand-in for Healthpoint serving the saved fixtures"""
+
+    def __init__(self, listing_pages: int, latency_ms: float, port: int = 0):
+        self.listing_pages = listing_pages
+        self.latency = latency_ms / 1000
+        self.port = port
+        self.listing = load_fixture(LISTING_FIXTURES[0])
+        self.clinic = load_fixture(CLINIC_FIXTURE)
+        self._runner = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def start_url(self) -> str:
+        return f"{self.base_url}/gps-accident-urgent-medical-care/gp/"
+
+    def _pagination(self, page: int) -> str:
+        """Numbered links to every listing page, as Healthpoint renders them"""
+        links = [f'<span class="page">{k + 1}</span>' if k == page else
+                 f'<a href="?services={k * 40}" class="page">{k + 1}</a>' for k in range(self.listing_pages)]
+        if page + 1 < self.listing_pages:
+            links.append(f'<a href="?services={(page + 1) * 40}" class="next">Next page</a>')
+        return '<span class="pagination">Page ' + '\n'.join(links) + '</span>'
+
+    async def _handle(self, request):
+        from aiohttp import web
+
+        await asyncio.sleep(self.latency)
+        path = request.path
+        if path.rstrip('/') == '/gps-accident-urgent-medical-care/gp':
+            page = int(request.query.get('services') or 0) // 40
+            html = _FIXTURE_PAGINATION.sub(lambda _: self._pagination(page), self.listing, count=1)
+            return web.Response(text=listing_variant(html, page), content_type='text/html')
+        slug = path.rstrip('/').rsplit('/', 1)[-1]
+        return web.Response(text=self.clinic.replace('Windsor Medical Centre', slug), content_type='text/html')
+
+    async def __aenter__(self):
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get('/{tail:.*}', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._runner.cleanup()
+
+
+class _TimedScraper(GPClinicScraper):
+    """Records wall time of every clinic detail fetch+parse"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.latencies: List[float] = []
+
+    async def _extract_clinic_details(self, fetcher, url, debug_mode=False):
+        t0 = time.perf_counter()
+        try:
+            return await super()._extract_clinic_details(fetcher, url, debug_mode)
+        finally:
+            self.latencies.append(time.perf_counter() - t0)
+
+
+async def run_crawl_suite(listing_pages: int, latency_ms: float, concurrency: int,
+                          listing_mode: str = 'prefetch') -> Dict:
+    async with StandInServer(listing_pages, latency_ms) as server:
+        scraper = _TimedScraper(concurrency=concurrency, requests_per_second=10000, burst=concurrency,
+                                fetch_mode='http', start_url=server.start_url, listing_mode=listing_mode,
+                                adaptive=False)
+        scraper.base_url = server.base_url
+        start = time.perf_counter()
+        records = await scraper.scrape_all_clinics()
+        elapsed = time.perf_counter() - start
+    result = summarise(scraper.latencies, elapsed)
+    result.update({'records': len(records), 'listing_pages': listing_pages,
+                   'latency_ms': latency_ms, 'concurrency': concurrency})
+    return result
+
+
+def synthetic_clinics(count: int) -> list:
+    """count distinct clinic records cycling through the region CSV with renamed doctors and new URLs/phones"""
+    with open(os.path.join(FIXTURE_DIR, RECORDS_FIXTURE), newline='', encoding='utf-8') as f:
+        templates = list(csv.DictReader(f))
+    records = []
+    for i in range(count):
+        record = dict(templates[i % len(templates)])
+        generation = i // len(templates)
+        record['url'] = f"{record['url']}v{i}/"
+        record['phone'] = f"(09) {400 + generation % 600:03d} {i % 10000:04d}"
+        record['email'] = f"clinic{i}@example.co.nz"
+        record['doctors'] = '; '.join(f"{d.strip()}{generation}" for d in record['doctors'].split(';') if d.strip())
+        records.append(record)
+    return records
+
+
+def run_index_suite(clinics: int, queries: int = 2000) -> Dict:
+    records = synthetic_clinics(clinics)
+    rng = random.Random(0)
+    sample = [rng.choice(records) for _ in range(queries)]
+
+    start = time.perf_counter()
+    index = ClinicIndex()
+    index.update(records)
+    build = summarise([time.perf_counter() - start], time.perf_counter() - start)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'clinics.idx')
+        start = time.perf_counter()
+        index.save(path)
+        save = summarise([time.perf_counter() - start], time.perf_counter() - start)
+        save['bytes'] = os.path.getsize(path)
+        start = time.perf_counter()
+        index = ClinicIndex.load(path)
+        load = summarise([time.perf_counter() - start], time.perf_counter() - start)
+
+    def first_doctor(record):
+        return record['doctors'].split(';')[0]
+
+    updates = [dict(r, phone='(09) 000 0000') for r in sample[:100]]
+    return {
+        'build': build,
+        'save': save,
+        'load': load,
+        'update_100': time_each(updates, lambda r: index.upsert(r)),
+        'by_doctor': time_each(sample, lambda r: index.by_doctor(first_doctor(r))),
+        'by_phone': time_each(sample, lambda r: index.by_phone(r['phone'])),
+        'by_email': time_each(sample, lambda r: index.by_email(r['email'])),
+        'by_suburb_prefix': time_each(sample, lambda r: index.by_suburb('stanmore')),
+    }
+
+
+def compare(current: Dict, previous: Dict, threshold: float) -> List[str]:
+    """Regressions beyond threshold (fractional) for every metric present in both runs"""
+    regressions = []
+    for suite, cases in current.get('results', {}).items():
+        for case, metrics in cases.items():
+            old = previous.get('results', {}).get(suite, {}).get(case, {})
+            for metric in ('pages_per_s', 'p50_ms', 'p95_ms', 'peak_rss_mb'):
+                if metric not in metrics or not old.get(metric):
+                    continue
+                change = (metrics[metric] - old[metric]) / old[metric]
+                worse = -change if metric in HIGHER_IS_BETTER else change
+                if worse > threshold:
+                    regressions.append(f"{suite}.{case}.{metric}: {old[metric]} -> {metrics[metric]} "
+                                       f"({change:+.1%})")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline GP scraper benchmark")
+    parser.add_argument('--suite', choices=['parse', 'crawl', 'index', 'all'], default='all')
+    parser.add_argument('--pages', type=int, default=500, help="Synthetic pages per parse case")
+    parser.add_argument('--listing-pages', type=int, default=10, help="Listing pages served by the stand-in")
+    parser.add_argument('--latency-ms', type=float, default=50.0, help="Stand-in response latency")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--clinics', type=int, default=10000, help="Synthetic clinics for the index suite")
+    parser.add_argument('--output', default=os.path.join(FIXTURE_DIR, 'bench_results.json'))
+    parser.add_argument('--compare', help="Earlier results JSON to check for regressions")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Allowed fractional regression")
+    args = parser.parse_args()
+
+    # gp_clinic_scraper configures INFO logging on import; per-page logs would dominate the timings
+    logging.getLogger().setLevel(logging.WARNING)
+    mismatches = check_extractor_parity(GPClinicScraper())
+    if mismatches:
+        print("Extractor output differs from the BeautifulSoup reference:")
+        for line in mismatches:
+            print(f"  {line}")
+        return 1
+    results: Dict[str, Dict] = {}
+    if args.suite in ('parse', 'all'):
+        results['parse'] = run_parse_suite(args.pages)
+    if args.suite in ('index', 'all'):
+        results['index'] = run_index_suite(args.clinics)
+    if args.suite in ('crawl', 'all'):
+        results['crawl'] = {
+            'http_stand_in': asyncio.run(run_crawl_suite(args.listing_pages, args.latency_ms, args.concurrency)),
+            'http_stand_in_serial': asyncio.run(
+                run_crawl_suite(args.listing_pages, args.latency_ms, args.concurrency, listing_mode='serial')),
+        }
+
+    report = {
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': vars(args),
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    for suite, cases in results.items():
+        for case, metrics in cases.items():
+            print(f"{suite:6} {case:16} {metrics['pages_per_s']:>10} pages/s  "
+                  f"p50 {metrics['p50_ms']:>8} ms  p95 {metrics['p95_ms']:>8} ms  rss {metrics['peak_rss_mb']} MB")
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("No regressions against", args.compare)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
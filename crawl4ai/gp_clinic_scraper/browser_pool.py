@@ -0,0 +1,188 @@
+"""
+Pool of pre-warmed Playwright browser contexts for the GP clinic scraper's browser fallback
+
+Requests for resources the extractors never read (images, fonts, media,
+stylesheets, analytics / third-party beacons) are aborted before they leave
+the browser, so pages settle quickly. A crawl4ai-style `wait_for` condition
+ends the wait as soon as the DOM is ready. Each pooled page is reused for up
+to `max_uses` navigations before its context is torn down and replaced, which
+keeps Chromium memory flat over long runs.
+
+BrowserPool.arun() takes fetchers.readiness_config() as keyword arguments and
+returns a CrawlResult-like object, so it can stand in as PageFetcher's crawler.
+"""
+
+import asyncio
+import logging
+from typing import Iterable, List, Optional
+from urllib.parse import urlparse
+
+try:
+    from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+    from playwright.async_api import async_playwright
+except ImportError:  # crawl4ai's own browser is used instead
+    async_playwright = None  # type: ignore
+    PlaywrightTimeoutError = asyncio.TimeoutError  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+PLAYWRIGHT_AVAILABLE = async_playwright is not None
+
+DEFAULT_BLOCKED_RESOURCE_TYPES = ('image', 'media', 'font', 'stylesheet', 'beacon', 'ping', 'imageset')
+DEFAULT_BLOCKED_DOMAINS = (
+    'google-analytics.com', 'googletagmanager.com', 'doubleclick.net', 'googlesyndication.com',
+    'facebook.net', 'facebook.com', 'hotjar.com', 'typekit.net', 'openstreetmap.org',
+    'youtube.com', 'vimeo.com', 'newrelic.com', 'nr-data.net',
+)
+
+
+class BrowserResult:
+    """The subset of crawl4ai's CrawlResult that PageFetcher reads"""
+
+    def __init__(self, url: str, html: str = "", success: bool = False, status_code: Optional[int] = None,
+                 error_message: str = ""):
+        self.url = url
+        self.html = html
+        self.success = success
+        self.status_code = status_code
+        self.error_message = error_message
+
+
+class _Slot:
+    """A pooled context and page; both None for a placeholder whose replacement failed"""
+
+    def __init__(self, context, page):
+        self.context = context
+        self.page = page
+        self.uses = 0
+        self.broken = False
+
+
+class BrowserPool:
+    def __init__(self, size: int = 4, headless: bool = True, max_uses: int = 50,
+                 blocked_resource_types: Iterable[str] = DEFAULT_BLOCKED_RESOURCE_TYPES,
+                 blocked_domains: Iterable[str] = DEFAULT_BLOCKED_DOMAINS,
+                 user_agent: Optional[str] = None):
+        if not PLAYWRIGHT_AVAILABLE:
+            raise RuntimeError("playwright is required for BrowserPool (pip install playwright)")
+        self.size = max(1, size)
+        self.headless = headless
+        self.max_uses = max(1, max_uses)
+        self.blocked_resource_types = frozenset(blocked_resource_types)
+        self.blocked_domains = tuple(d.lower().lstrip('.') for d in blocked_domains)
+        self.user_agent = user_agent
+        self.stats = {'navigations': 0, 'blocked': 0, 'recycled': 0}
+        self._playwright = None
+        self._browser = None
+        self._slots: asyncio.Queue = asyncio.Queue()
+        self._all_slots: List[_Slot] = []
+
+    async def __aenter__(self):
+        self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch(headless=self.headless)
+        # Pre-warm every context so the first navigations do not pay the setup cost
+        for slot in await asyncio.gather(*(self._new_slot() for _ in range(self.size))):
+            self._slots.put_nowait(slot)
+        logger.info(f"Browser pool ready: {self.size} contexts, recycling pages after {self.max_uses} uses")
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        for slot in self._all_slots:
+            try:
+                await slot.context.close()
+            except Exception:
+                pass
+        self._all_slots.clear()
+        if self._browser is not None:
+            await self._browser.close()
+        if self._playwright is not None:
+            await self._playwright.stop()
+        logger.info(f"Browser pool stats: {self.stats}")
+
+    def _is_blocked(self, request) -> bool:
+        if request.resource_type in self.blocked_resource_types:
+            return True
+        host = urlparse(request.url).hostname or ''
+        return any(host == d or host.endswith('.' + d) for d in self.blocked_domains)
+
+    async def _route(self, route):
+        if self._is_blocked(route.request):
+            self.stats['blocked'] += 1
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _new_slot(self) -> _Slot:
+        context = await self._browser.new_context(user_agent=self.user_agent) if self.user_agent \
+            else await self._browser.new_context()
+        await context.route('**/*', self._route)
+        slot = _Slot(context, await context.new_page())
+        self._all_slots.append(slot)
+        return slot
+
+    async def _release(self, slot: _Slot):
+        slot.uses += 1
+        if slot.broken or slot.uses >= self.max_uses:
+            self.stats['recycled'] += 1
+            self._all_slots.remove(slot)
+            try:
+                await slot.context.close()
+            except Exception:
+                pass
+            try:
+                slot = await self._new_slot()
+            except Exception as e:
+                # Never leave the queue a slot short: put back a placeholder rebuilt on next use
+                logger.warning(f"Could not replace browser context, retrying on next use: {e}")
+                slot = _Slot(None, None)
+        self._slots.put_nowait(slot)
+
+    async def _acquire(self) -> _Slot:
+        """Next free slot, first rebuilding it if it is a placeholder"""
+        slot = await self._slots.get()
+        if slot.page is None:
+            try:
+                slot = await self._new_slot()
+            except Exception:
+                self._slots.put_nowait(slot)
+                raise
+        return slot
+
+    async def _wait_for(self, page, condition: str, timeout: int):
+        """crawl4ai-style wait_for ('js:<function>' or 'css:<selector>'); a timeout is not an error"""
+        try:
+            if condition.startswith('css:'):
+                await page.wait_for_selector(condition[4:].strip(), timeout=timeout)
+            else:
+                expression = condition[3:] if condition.startswith('js:') else condition
+                await page.wait_for_function(expression.strip(), timeout=timeout, polling=100)
+        except PlaywrightTimeoutError:
+            pass
+
+    async def arun(self, url: str, wait_until: str = 'networkidle', timeout: int = 30000, extra_wait: float = 0,
+                   js_code: Optional[str] = None, wait_for: Optional[str] = None,
+                   wait_for_timeout: Optional[int] = None, **_ignored) -> BrowserResult:
+        """Navigate a pooled page to url and return its rendered HTML"""
+        try:
+            slot = await self._acquire()
+        except Exception as e:
+            return BrowserResult(url, success=False, error_message=f"No browser context: {e}")
+        try:
+            response = await slot.page.goto(url, wait_until=wait_until, timeout=timeout)
+            if wait_for:
+                await self._wait_for(slot.page, wait_for, wait_for_timeout or timeout)
+            if js_code:
+                # crawl4ai snippets use top-level await; run them inside an async function
+                await slot.page.evaluate(f"async () => {{ {js_code} }}")
+            if extra_wait:
+                await asyncio.sleep(extra_wait)
+            html = await slot.page.content()
+            status = response.status if response is not None else None
+            self.stats['navigations'] += 1
+            return BrowserResult(url, html, status is None or status < 400, status,
+                                 '' if status is None or status < 400 else f"HTTP {status}")
+        except Exception as e:
+            slot.broken = True
+            return BrowserResult(url, success=False, error_message=str(e) or type(e).__name__)
+        finally:
+            await self._release(slot)
@@ -0,0 +1,170 @@
+"""
+Crash-safe incremental output for the GP clinic scraper
+
+RecordWriter appends each clinic row to the CSV as soon as it is extracted and
+fsyncs in batches. CrawlJournal is an append-only JSONL log of listing pages
+and finished clinic URLs, so an interrupted run can resume where it stopped.
+"""
+
+import csv
+import json
+import logging
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class _BatchedSyncFile:
+    """Line-oriented append file: flush on every write, fsync every N writes or T seconds"""
+
+    def __init__(self, path: str, fsync_every: int = 20, fsync_interval: float = 5.0):
+        self.path = path
+        self.fsync_every = max(1, fsync_every)
+        self.fsync_interval = fsync_interval
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._repair_torn_tail()
+        self.file = open(path, 'a', newline='', encoding='utf-8')
+
+    def _repair_torn_tail(self):
+        """Drop a partially written last line left behind by a crash"""
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+        with open(self.path, 'rb+') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) == b'\n':
+                return
+            f.seek(0)
+            f.truncate(f.read().rfind(b'\n') + 1)
+            logger.warning(f"Truncated torn trailing line in {self.path}")
+
+    def wrote(self):
+        self.file.flush()
+        self._pending += 1
+        if self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        if self.file.closed:
+            return
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        if not self.file.closed:
+            self.sync()
+            self.file.close()
+
+
+class RecordWriter(_BatchedSyncFile):
+    """Append clinic records to a CSV, writing the header only for a new file"""
+
+    def __init__(self, path: str, fieldnames: List[str], fsync_every: int = 20, fsync_interval: float = 5.0):
+        super().__init__(path, fsync_every, fsync_interval)
+        self.fieldnames = fieldnames
+        self.writer = csv.DictWriter(self.file, fieldnames=fieldnames)
+        self.count = 0
+        if self.file.tell() == 0:
+            self.writer.writeheader()
+            self.sync()
+
+    def write(self, record: Dict):
+        self.writer.writerow(record)
+        self.count += 1
+        self.wrote()
+
+    @staticmethod
+    def existing_urls(path: str) -> Set[str]:
+        """URLs already present in an output CSV from an earlier, interrupted run"""
+        if not os.path.exists(path):
+            return set()
+        with open(path, newline='', encoding='utf-8') as f:
+            return {row['url'] for row in csv.DictReader(f) if row.get('url')}
+
+
+class JournalState:
+    """What an interrupted run had reached"""
+
+    def __init__(self):
+        self.done: Set[str] = set()
+        # Clinic URL -> failed attempts, counted across resumed runs
+        self.failed: Dict[str, int] = {}
+        self.listed: List[str] = []
+        self.last_page = 0
+        self.next_url: Optional[str] = None
+        # False until the first listing page is journalled
+        self.started = False
+
+    @property
+    def pagination_complete(self) -> bool:
+        return self.started and self.next_url is None
+
+    def pending(self, max_failures: Optional[int] = None) -> List[str]:
+        """
+        Listed clinic URLs not yet finished, in listing order. A clinic that has
+        failed max_failures times counts as finished; None keeps every failed one.
+        """
+        return [url for url in self.listed if url not in self.done
+                and (max_failures is None or self.failed.get(url, 0) < max_failures)]
+
+    def given_up(self, max_failures: int) -> List[str]:
+        """Failed clinics no longer retried"""
+        return [url for url, n in self.failed.items() if url not in self.done and n >= max_failures]
+
+
+class CrawlJournal(_BatchedSyncFile):
+    """
+    Append-only JSONL journal:
+      {"page": n, "urls": [...], "next": "<next listing url or null>"}
+      {"done": "<clinic url>"}
+      {"failed": "<clinic url>"}
+    """
+
+    @staticmethod
+    def load(path: str) -> JournalState:
+        state = JournalState()
+        if not os.path.exists(path):
+            return state
+        seen = set()
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn last line
+                if 'done' in entry:
+                    state.done.add(entry['done'])
+                elif 'failed' in entry:
+                    state.failed[entry['failed']] = state.failed.get(entry['failed'], 0) + 1
+                elif 'page' in entry:
+                    state.started = True
+                    state.last_page = entry['page']
+                    state.next_url = entry.get('next')
+                    for url in entry.get('urls', []):
+                        if url not in seen:
+                            seen.add(url)
+                            state.listed.append(url)
+        return state
+
+    def _append(self, entry: Dict):
+        self.file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.wrote()
+
+    def record_page(self, page_num: int, page_urls: Iterable[str], next_url: Optional[str]):
+        self._append({'page': page_num, 'urls': list(page_urls), 'next': next_url})
+
+    def record_done(self, url: str):
+        self._append({'done': url})
+
+    def record_failed(self, url: str):
+        self._append({'failed': url})
+
+    def discard(self):
+        """Remove the journal after a complete run so the next run starts fresh"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
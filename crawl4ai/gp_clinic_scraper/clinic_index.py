@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Indexed lookups over scraped clinic records
+
+ClinicIndex answers the questions other tools used to answer with linear
+scans over the CSV:
+
+  - which clinics list a doctor (exact normalised name, else all name tokens)
+  - clinics whose name contains given words (inverted token index)
+  - exact phone / email matches (normalised: digits only with +64 -> 0, lower-case email)
+  - suburb prefix search over the locality words of each address (sorted keys + bisect)
+
+Indexes are persisted as one zlib-compressed JSON file and can be updated in
+place from a newer CSV or a snapshots change set without a full rebuild.
+
+Usage:
+  python clinic_index.py build --csv gp_clinics.csv --index gp_clinics.idx
+  python clinic_index.py query --index gp_clinics.idx --doctor "Dr Alan Lee"
+  python clinic_index.py query --index gp_clinics.idx --suburb "stanmore"
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import re
+import unicodedata
+import zlib
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from extractor import NOT_FOUND
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+KEY_FIELD = 'url'
+
+Postings = Union[Set[int], Tuple[int, ...]]
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+# Honorifics and filler that would match almost every doctor or clinic
+_STOPWORDS = frozenset({'dr', 'doctor', 'the', 'and', 'of', 'mr', 'mrs', 'ms', 'miss', 'prof'})
+_POSTCODE = re.compile(r'\s*\b\d{4}\s*$')
+_STREET_TYPES = re.compile(
+    r'.*\b(?:road|rd|drive|dr|street|avenue|ave|highway|hwy|lane|ln|place|pl|crescent|cres|terrace|tce|'
+    r'parade|way|close|court|ct|boulevard|square|mall|grove|rise|quay|esplanade)\b\.?\s*',
+    re.IGNORECASE,
+)
+# Placeholders the extractor writes when a field is missing
+_MISSING = frozenset(value.lower() for value in NOT_FOUND.values())
+
+
+def fold(text: str) -> str:
+    """Lower-case and strip diacritics (Ōrewa -> orewa)"""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(fold(text)) if t not in _STOPWORDS]
+
+
+def normalise_phone(phone: str) -> str:
+    digits = re.sub(r'\D', '', phone or '')
+    if digits.startswith('64') and len(digits) > 9:
+        digits = '0' + digits[2:]
+    return digits
+
+
+def normalise_email(email: str) -> str:
+    return (email or '').strip().lower()
+
+
+def normalise_person(name: str) -> str:
+    return ' '.join(tokenize(name))
+
+
+def present(value: Optional[str]) -> str:
+    """The field value, or '' for an empty field or an extractor placeholder"""
+    value = (value or '').strip()
+    return '' if value.lower() in _MISSING else value
+
+
+def split_doctors(doctors: str) -> List[str]:
+    if not present(doctors):
+        return []
+    return [d.strip() for d in re.split(r'[;\n]', doctors) if d.strip()]
+
+
+def locality_keys(address: str) -> List[str]:
+    """
+    Suffix phrases of the locality part of an address, so both "stanmore bay"
+    and "whangaparaoa" prefix-match "... Road Stanmore Bay Whangaparāoa Auckland 0932"
+    """
+    if not present(address):
+        return []
+    last = re.split(r'[,\n]', address.strip())[-1]
+    locality = _STREET_TYPES.sub('', _POSTCODE.sub('', last), count=1)
+    words = [w for w in _TOKEN.findall(fold(locality)) if not w[0].isdigit()]
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+class ClinicIndex:
+    def __init__(self):
+        # Record slots; ids are stable and removed records leave a None tombstone
+        self.records: List[Optional[Dict[str, str]]] = []
+        self.ids_by_url: Dict[str, int] = {}
+        # Postings are sets while building; a loaded index keeps tuples until a key is modified
+        self.name_tokens: Dict[str, Postings] = {}
+        self.doctor_tokens: Dict[str, Postings] = {}
+        self.doctor_names: Dict[str, Postings] = {}
+        self.phones: Dict[str, Postings] = {}
+        self.emails: Dict[str, Postings] = {}
+        # Sorted (locality phrase, id) pairs for prefix search; rebuilt lazily after updates
+        self._suburb_keys: List[Tuple[str, int]] = []
+        self._suburbs_dirty = False
+
+    def __len__(self) -> int:
+        return len(self.ids_by_url)
+
+    # -- building -------------------------------------------------------------
+
+    @staticmethod
+    def _keys(record: Dict[str, str]) -> Dict[str, Iterable[str]]:
+        doctors = split_doctors(record.get('doctors', ''))
+        return {
+            'name_tokens': set(tokenize(present(record.get('name')))),
+            'doctor_tokens': {t for d in doctors for t in tokenize(d)},
+            'doctor_names': {normalise_person(d) for d in doctors} - {''},
+            'phones': {normalise_phone(present(record.get('phone')))} - {''},
+            'emails': {normalise_email(present(record.get('email')))} - {''},
+        }
+
+    def _post(self, clinic_id: int, record: Dict[str, str]):
+        for attr, keys in self._keys(record).items():
+            postings = getattr(self, attr)
+            for key in keys:
+                ids = postings.get(key)
+                if not isinstance(ids, set):
+                    ids = postings[key] = set(ids or ())
+                ids.add(clinic_id)
+
+    def _unpost(self, clinic_id: int, record: Dict[str, str]):
+        for attr, keys in self._keys(record).items():
+            postings = getattr(self, attr)
+            for key in keys:
+                ids = postings.get(key)
+                if ids is None:
+                    continue
+                if not isinstance(ids, set):
+                    ids = postings[key] = set(ids)
+                ids.discard(clinic_id)
+                if not ids:
+                    del postings[key]
+
+    def upsert(self, record: Dict[str, str]) -> bool:
+        """Add or replace the record for its URL; returns False if nothing changed"""
+        url = record[KEY_FIELD]
+        record = {k: ('' if v is None else str(v)) for k, v in record.items()}
+        clinic_id = self.ids_by_url.get(url)
+        if clinic_id is not None:
+            old = self.records[clinic_id]
+            if old == record:
+                return False
+            self._unpost(clinic_id, old)
+        else:
+            clinic_id = len(self.records)
+            self.records.append(None)
+            self.ids_by_url[url] = clinic_id
+        self.records[clinic_id] = record
+        self._post(clinic_id, record)
+        self._suburbs_dirty = True
+        return True
+
+    def remove(self, url: str) -> bool:
+        clinic_id = self.ids_by_url.pop(url, None)
+        if clinic_id is None:
+            return False
+        self._unpost(clinic_id, self.records[clinic_id])
+        self.records[clinic_id] = None
+        self._suburbs_dirty = True
+        return True
+
+    def update(self, records: Iterable[Dict[str, str]], prune: bool = False) -> Dict[str, int]:
+        """Apply a batch of records; with prune, URLs missing from the batch are removed"""
+        counts = {'added': 0, 'changed': 0, 'removed': 0}
+        seen = set()
+        for record in records:
+            url = record.get(KEY_FIELD)
+            if not url:
+                continue
+            seen.add(url)
+            existed = url in self.ids_by_url
+            if self.upsert(record):
+                counts['changed' if existed else 'added'] += 1
+        if prune:
+            for url in [u for u in self.ids_by_url if u not in seen]:
+                self.remove(url)
+                counts['removed'] += 1
+        return counts
+
+    def apply_change_set(self, changes: Dict) -> Dict[str, int]:
+        """Apply a change set written by snapshots.SnapshotExporter"""
+        counts = {'added': 0, 'changed': 0, 'removed': 0}
+        for record in changes.get('added', []):
+            counts['added'] += self.upsert(record)
+        for change in changes.get('changed', []):
+            clinic_id = self.ids_by_url.get(change[KEY_FIELD])
+            if clinic_id is None:
+                continue
+            record = dict(self.records[clinic_id])
+            record.update({field: values['new'] for field, values in change['fields'].items()})
+            counts['changed'] += self.upsert(record)
+        for url in changes.get('removed', []):
+            counts['removed'] += self.remove(url)
+        return counts
+
+    @classmethod
+    def from_csv(cls, path: str) -> 'ClinicIndex':
+        index = cls()
+        index.update_from_csv(path)
+        return index
+
+    def update_from_csv(self, path: str, prune: bool = True) -> Dict[str, int]:
+        with open(path, newline='', encoding='utf-8') as f:
+            return self.update(csv.DictReader(f), prune=prune)
+
+    # -- queries --------------------------------------------------------------
+
+    def _resolve(self, ids: Iterable[int]) -> List[Dict[str, str]]:
+        return [self.records[i] for i in sorted(ids)]
+
+    def _all_tokens(self, postings: Dict[str, Postings], tokens: List[str]) -> Set[int]:
+        if not tokens:
+            return set()
+        lists = sorted((postings.get(t, ()) for t in tokens), key=len)
+        return set(lists[0]).intersection(*lists[1:])
+
+    def by_doctor(self, name: str) -> List[Dict[str, str]]:
+        """Clinics listing this doctor; falls back to clinics whose doctors contain all the name's words"""
+        ids = self.doctor_names.get(normalise_person(name))
+        if ids is None:
+            ids = self._all_tokens(self.doctor_tokens, tokenize(name))
+        return self._resolve(ids)
+
+    def by_name(self, words: str) -> List[Dict[str, str]]:
+        return self._resolve(self._all_tokens(self.name_tokens, tokenize(words)))
+
+    def by_phone(self, phone: str) -> List[Dict[str, str]]:
+        return self._resolve(self.phones.get(normalise_phone(phone), ()))
+
+    def by_email(self, email: str) -> List[Dict[str, str]]:
+        return self._resolve(self.emails.get(normalise_email(email), ()))
+
+    def _rebuild_suburbs(self):
+        self._suburb_keys = sorted(
+            (key, clinic_id)
+            for clinic_id, record in enumerate(self.records) if record is not None
+            for key in locality_keys(record.get('address', ''))
+        )
+        self._suburbs_dirty = False
+
+    def by_suburb(self, prefix: str) -> List[Dict[str, str]]:
+        """Clinics with a locality word sequence starting with prefix ("mairangi", "stanmore b")"""
+        if self._suburbs_dirty:
+            self._rebuild_suburbs()
+        prefix = ' '.join(_TOKEN.findall(fold(prefix)))
+        if not prefix:
+            return []
+        ids = set()
+        i = bisect_left(self._suburb_keys, (prefix, -1))
+        while i < len(self._suburb_keys) and self._suburb_keys[i][0].startswith(prefix):
+            ids.add(self._suburb_keys[i][1])
+            i += 1
+        return self._resolve(ids)
+
+    # -- persistence ----------------------------------------------------------
+
+    def save(self, path: str):
+        """Write records and postings as zlib-compressed JSON (atomic replace)"""
+        if self._suburbs_dirty:
+            self._rebuild_suburbs()
+        fields = sorted({k for r in self.records if r is not None for k in r})
+        payload = {
+            'version': INDEX_VERSION,
+            'fields': fields,
+            'records': [None if r is None else [r.get(f, '') for f in fields] for r in self.records],
+            'postings': {
+                attr: {key: sorted(ids) for key, ids in getattr(self, attr).items()}
+                for attr in ('name_tokens', 'doctor_tokens', 'doctor_names', 'phones', 'emails')
+            },
+            'suburbs': self._suburb_keys,
+        }
+        data = zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), 6)
+        tmp = f'{path}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'ClinicIndex':
+        with open(path, 'rb') as f:
+            payload = json.loads(zlib.decompress(f.read()))
+        if payload.get('version') != INDEX_VERSION:
+            raise ValueError(f"Unsupported clinic index version {payload.get('version')} in {path}")
+        index = cls()
+        fields = payload['fields']
+        index.records = [None if r is None else dict(zip(fields, r)) for r in payload['records']]
+        index.ids_by_url = {r[KEY_FIELD]: i for i, r in enumerate(index.records) if r is not None}
+        for attr, postings in payload['postings'].items():
+            setattr(index, attr, {key: tuple(ids) for key, ids in postings.items()})
+        index._suburb_keys = [tuple(pair) for pair in payload['suburbs']]
+        return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the clinic lookup index")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help="Create or incrementally update an index from a CSV or change set")
+    build.add_argument('--csv', help="Clinic CSV; the index is synced to it (absent URLs are removed)")
+    build.add_argument('--changes', help="Change set JSON from exports/ to apply instead of a CSV")
+    build.add_argument('--index', required=True)
+    query = sub.add_parser('query', help="Look clinics up in an index")
+    query.add_argument('--index', required=True)
+    query.add_argument('--doctor')
+    query.add_argument('--name')
+    query.add_argument('--phone')
+    query.add_argument('--email')
+    query.add_argument('--suburb')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == 'build':
+        index = ClinicIndex.load(args.index) if os.path.exists(args.index) else ClinicIndex()
+        if args.changes:
+            with open(args.changes, encoding='utf-8') as f:
+                counts = index.apply_change_set(json.load(f))
+        elif args.csv:
+            counts = index.update_from_csv(args.csv)
+        else:
+            parser.error("build needs --csv or --changes")
+        index.save(args.index)
+        logger.info(f"Index {args.index}: {len(index)} clinics ({counts})")
+        return
+
+    index = ClinicIndex.load(args.index)
+    for option, lookup in (('doctor', index.by_doctor), ('name', index.by_name), ('phone', index.by_phone),
+                           ('email', index.by_email), ('suburb', index.by_suburb)):
+        value = getattr(args, option)
+        if value:
+            for record in lookup(value):
+                print(f"{record.get('name')}\t{record.get('phone')}\t{record.get('address')}\t{record.get('url')}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+Single-pass clinic page extractor built on lxml
+
+Produces the same dict as GPClinicScraper's BeautifulSoup `_extract_*` methods,
+but parses each page once, compiles every selector up front and only runs the
+regex fallbacks over the contact / people subtrees instead of the whole page.
+"""
+
+import hashlib
+import logging
+import re
+from typing import Dict, Iterable, List, Optional
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:  # Callers fall back to the BeautifulSoup extractors
+    etree = None  # type: ignore
+    lxml_html = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+LXML_AVAILABLE = lxml_html is not None
+
+# Changes with every edit to this module; cached records from another version are parsed again
+with open(__file__, 'rb') as _source:
+    EXTRACTOR_VERSION = hashlib.sha256(_source.read()).hexdigest()[:12]
+
+_CLASS = "contains(concat(' ', normalize-space(@class), ' '), ' {} ')"
+
+NOT_FOUND = {
+    'name': "Unknown",
+    'address': "Address not found",
+    'phone': "Phone not found",
+    'email': "Email not found",
+    'doctors': "Doctors not listed",
+}
+
+
+def _text(el) -> str:
+    """Every text node stripped and joined, as BeautifulSoup's get_text(strip=True)"""
+    return ''.join(t.strip() for t in el.itertext())
+
+
+class ClinicPageExtractor:
+    """Compiled field selectors for Healthpoint clinic pages; build once and reuse"""
+
+    def __init__(self):
+        if not LXML_AVAILABLE:
+            raise RuntimeError("lxml is required for ClinicPageExtractor (pip install lxml)")
+        self._parser = lxml_html.HTMLParser(encoding='utf-8', remove_comments=True)
+
+        # Relative selectors, evaluated from the anchor elements found in the single walk
+        self._address_div = etree.XPath("following-sibling::div[@itemprop='address'][1]")
+        self._telephone = etree.XPath("following-sibling::*[1]//p[@itemprop='telephone']")
+        self._mailto = etree.XPath("..//a[starts-with(@href, 'mailto:')]")
+        self._people_names = etree.XPath(
+            "following-sibling::div[" + _CLASS.format('content') + "][1]"
+            "//ul[" + _CLASS.format('people') + "]//h4/a"
+        )
+        # Subtrees the regex fallbacks are confined to
+        self._contact_roots = etree.XPath(
+            "//ul[" + _CLASS.format('contact-list') + "]/ancestor::section[1]"
+            " | //ul[" + _CLASS.format('contact-list') + "]"
+            " | //div[@itemprop='address']"
+        )
+        self._people_roots = etree.XPath("//ul[" + _CLASS.format('people') + "]")
+
+        self._address_pattern = re.compile(r'\d+.*(?:Drive|Street|Road|Avenue|Lane|Way|Place|Crescent)')
+        self._phone_pattern = re.compile(r'\(?\d{2,3}\)?\s?\d{3}\s?\d{4}')
+        self._email_pattern = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+        self._doctor_pattern = re.compile(r'Dr\s+[A-Za-z\s\(\)]+')
+
+    def parse(self, html: str):
+        return lxml_html.document_fromstring(html.encode('utf-8', errors='ignore'), parser=self._parser)
+
+    def extract(self, html: str, url: str, debug_mode: bool = False) -> Dict:
+        """Extract name, address, phone, email and doctors from a clinic page"""
+        root = self.parse(html)
+
+        # One walk over the tree collects every anchor element the fields hang off
+        name = None
+        title_text = None
+        labels: Dict[str, object] = {}
+        doctors_header = None
+        for el in root.iter('h1', 'h3', 'h4', 'title'):
+            tag = el.tag
+            if tag == 'h4':
+                if 'label-text' in (el.get('class') or '').split():
+                    # Exact text, as BeautifulSoup's string= match
+                    labels.setdefault(el.text_content(), el)
+            elif tag == 'h1':
+                if name is None:
+                    text = _text(el)
+                    if text:
+                        name = text
+            elif tag == 'h3':
+                if doctors_header is None and el.text_content() == 'Doctors' \
+                        and 'section-header' in (el.get('class') or '').split():
+                    doctors_header = el
+            elif title_text is None:
+                title_text = _text(el)
+
+        if name is None and title_text and '•' in title_text:
+            name = title_text.split('•')[0].strip()
+
+        clinic_data = {
+            'name': name or NOT_FOUND['name'],
+            'address': self._address(root, labels.get('Street Address')),
+            'phone': self._phone(root, labels.get('Phone')),
+            'email': self._email(root, labels.get('Email')),
+            'doctors': self._doctors(root, doctors_header),
+            'url': url,
+        }
+        if debug_mode:
+            logger.info(f"lxml extractor fields for {url}: {clinic_data}")
+        return clinic_data
+
+    def _address(self, root, label) -> str:
+        if label is not None:
+            divs = self._address_div(label)
+            if divs:
+                return ' '.join(' '.join(t.strip() for t in divs[0].itertext() if t.strip()).split())
+        match = self._first_match(self._contact_roots(root) or [root], self._address_pattern)
+        return match or NOT_FOUND['address']
+
+    def _phone(self, root, label) -> str:
+        if label is not None:
+            phones = self._telephone(label)
+            if phones:
+                return _text(phones[0])
+        match = self._first_match(self._contact_roots(root) or [root], self._phone_pattern)
+        return match or NOT_FOUND['phone']
+
+    def _email(self, root, label) -> str:
+        if label is not None:
+            links = self._mailto(label)
+            if links:
+                return links[0].get('href').replace('mailto:', '')
+        match = self._first_match(self._contact_roots(root) or [root], self._email_pattern)
+        return match or NOT_FOUND['email']
+
+    def _doctors(self, root, header) -> str:
+        doctors: List[str] = []
+        if header is not None:
+            for link in self._people_names(header):
+                doctor_name = _text(link)
+                if doctor_name.startswith('Dr '):
+                    doctors.append(doctor_name)
+
+        if not doctors:
+            for subtree in self._people_roots(root) or [root]:
+                for text in subtree.itertext():
+                    if 'Dr ' in text and self._doctor_pattern.search(text):
+                        doctors.append(text.strip())
+
+        doctors = list(dict.fromkeys(doctors))
+        return '; '.join(doctors) if doctors else NOT_FOUND['doctors']
+
+    @staticmethod
+    def _first_match(subtrees: Iterable, pattern: re.Pattern) -> Optional[str]:
+        """First text node under the given subtrees matching pattern, stripped"""
+        for subtree in subtrees:
+            for text in subtree.itertext():
+                if pattern.search(text):
+                    return text.strip()
+        return None
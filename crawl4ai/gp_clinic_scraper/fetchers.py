@@ -0,0 +1,262 @@
+"""
+Page fetching for the GP clinic scraper: pooled plain HTTP first, headless browser as fallback
+"""
+
+import asyncio
+import json
+import logging
+import re
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from browser_pool import BrowserPool
+from http_cache import PageCache, content_hash
+
+try:
+    import aiohttp
+except ImportError:  # Fast path is disabled without aiohttp; every page uses the browser
+    aiohttp = None  # type: ignore
+
+try:
+    from crawl4ai import CacheMode, CrawlerRunConfig
+except ImportError:  # Only BrowserPool is available as the browser
+    CrawlerRunConfig = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+)
+
+# Server-rendered markers the extractors depend on, as (tag, class) pairs
+LISTING_MARKERS: Tuple[Tuple[str, str], ...] = (('div', 'subscriber'), ('span', 'pagination'))
+CLINIC_MARKERS: Tuple[Tuple[str, str], ...] = (('h4', 'label-text'),)
+
+FETCH_MODES = ('auto', 'http', 'browser')
+
+# Rendered-DOM selectors meaning a page holds what the extractors read; the first to match ends the wait
+LISTING_READY_SELECTORS: Tuple[str, ...] = ('div.subscriber', 'span.pagination')
+CLINIC_READY_SELECTORS: Tuple[str, ...] = ('h4.label-text', 'h3.section-header')
+
+# Set on <html> by the readiness condition to the selector that matched; stripped before hashing
+READY_ATTRIBUTE = 'data-crawl-ready'
+_READY_ATTRIBUTE_PATTERN = re.compile(r'\s' + READY_ATTRIBUTE + r'="([^"]*)"')
+
+_marker_patterns: Dict[Tuple[str, str], re.Pattern] = {}
+
+
+def has_markers(html: str, markers: Sequence[Tuple[str, str]]) -> bool:
+    """True if the raw HTML contains at least one `<tag class="... cls ...">` from markers"""
+    for marker in markers:
+        pattern = _marker_patterns.get(marker)
+        if pattern is None:
+            tag, cls = marker
+            pattern = re.compile(
+                r'<' + tag + r'\b[^>]*\bclass=["\'](?:[^"\']*\s)?' + re.escape(cls) + r'(?:\s[^"\']*)?["\']',
+                re.IGNORECASE,
+            )
+            _marker_patterns[marker] = pattern
+        if pattern.search(html):
+            return True
+    return False
+
+
+def readiness_config(selectors: Sequence[str], ready_timeout: float = 10.0, page_timeout: int = 30000) -> Dict:
+    """
+    Browser config that returns as soon as the DOM matches one of `selectors`
+    instead of waiting for networkidle plus a fixed delay. The wait is bounded
+    by ready_timeout seconds; the page is captured as-is when it runs out.
+    Passed as keywords to BrowserPool.arun(); crawl4ai gets the same settings
+    through crawl4ai_run_config().
+
+    The condition gives up on its own once ready_timeout has passed, leaving
+    the ready attribute unset so the result reads as 'timeout'. crawl4ai turns
+    its own wait_for timeout into a failed fetch, so wait_for_timeout is only
+    a backstop a few seconds later.
+    """
+    ready_ms = int(ready_timeout * 1000)
+    condition = (
+        "() => {"
+        f" const deadline = window.__crawlReadyDeadline = window.__crawlReadyDeadline || Date.now() + {ready_ms};"
+        f" const hit = {json.dumps(list(selectors))}.find(s => document.querySelector(s));"
+        f" if (hit) document.documentElement.setAttribute('{READY_ATTRIBUTE}', hit);"
+        " return !!hit || Date.now() > deadline; }"
+    )
+    return {
+        'wait_until': 'domcontentloaded',
+        'timeout': page_timeout,
+        'page_timeout': page_timeout,
+        'wait_for': 'js:' + condition,
+        'wait_for_timeout': ready_ms + 5000,
+        # Nudge lazy-loaded sections without sleeping
+        'js_code': "window.scrollTo(0, document.body.scrollHeight);",
+    }
+
+
+def crawl4ai_run_config(browser_config: Dict) -> 'CrawlerRunConfig':
+    """The readiness_config() settings as a CrawlerRunConfig; crawl4ai's arun() ignores them as keywords"""
+    return CrawlerRunConfig(
+        # PageFetcher keeps its own cache; crawl4ai's would hand back stale pages
+        cache_mode=CacheMode.BYPASS,
+        wait_until=browser_config.get('wait_until', 'domcontentloaded'),
+        page_timeout=browser_config.get('page_timeout', 60000),
+        wait_for=browser_config.get('wait_for'),
+        wait_for_timeout=browser_config.get('wait_for_timeout'),
+        js_code=browser_config.get('js_code'),
+    )
+
+
+class FetchResult:
+    """Minimal stand-in for crawl4ai's CrawlResult so callers can treat both paths alike"""
+
+    def __init__(self, url: str, html: str = "", success: bool = False, status_code: Optional[int] = None,
+                 error_message: str = "", via: str = "http"):
+        self.url = url
+        self.html = html
+        self.success = success
+        self.status_code = status_code
+        self.error_message = error_message
+        self.via = via
+        # HTTP validators, sent back as If-None-Match / If-Modified-Since on the next run
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        # Set when the page matches the cached copy; cached_record is what was parsed from it
+        self.unchanged = False
+        self.cached_record: Optional[Dict] = None
+        # Browser readiness: the selector that matched, 'timeout', or None when no condition was set
+        self.ready_by: Optional[str] = None
+
+
+class PageFetcher:
+    """
+    Fetch a page over pooled HTTP and only escalate to the browser when the
+    expected markers are missing (e.g. a bot challenge or client-side render).
+
+    mode: 'auto' (HTTP then browser), 'http' (never escalate), 'browser' (old behaviour)
+
+    The browser is created from `crawler_factory` on first use, so runs where
+    every page is served over HTTP never start Chromium at all.
+
+    With a PageCache, HTTP requests are made conditional on the stored
+    validators and every successful page is compared to its cached hash.
+    """
+
+    def __init__(self, crawler_factory: Callable, mode: str = 'auto', timeout: float = 20.0, pool_size: int = 10,
+                 cache: Optional[PageCache] = None):
+        if mode not in FETCH_MODES:
+            raise ValueError(f"Unknown fetch mode: {mode}")
+        if mode != 'browser' and aiohttp is None:
+            logger.warning("aiohttp not installed - falling back to browser-only fetching")
+            mode = 'browser'
+        self.crawler_factory = crawler_factory
+        self.crawler = None
+        self._crawler_lock = asyncio.Lock()
+        self.mode = mode
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.session = None
+        self.cache = cache
+        self.stats = {'http': 0, 'browser': 0, 'escalated': 0}
+
+    async def __aenter__(self):
+        if self.mode != 'browser':
+            connector = aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.pool_size)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={'User-Agent': USER_AGENT, 'Accept': 'text/html,application/xhtml+xml'},
+            )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        if self.crawler is not None:
+            await self.crawler.__aexit__(exc_type, exc, tb)
+            self.crawler = None
+
+    async def _get_crawler(self):
+        async with self._crawler_lock:
+            if self.crawler is None:
+                logger.info("Starting headless browser")
+                crawler = self.crawler_factory()
+                await crawler.__aenter__()
+                self.crawler = crawler
+        return self.crawler
+
+    async def _fetch_http(self, url: str, headers: Optional[Dict[str, str]] = None) -> FetchResult:
+        try:
+            async with self.session.get(url, allow_redirects=True, headers=headers) as resp:
+                html = await resp.text(errors='ignore')
+                result = FetchResult(url, html, resp.status == 200, resp.status,
+                                     '' if resp.status == 200 else resp.reason or '', via='http')
+                result.etag = resp.headers.get('ETag')
+                result.last_modified = resp.headers.get('Last-Modified')
+                return result
+        except Exception as e:
+            return FetchResult(url, success=False, error_message=str(e) or type(e).__name__, via='http')
+
+    async def _fetch_browser(self, url: str, browser_config: Dict) -> FetchResult:
+        crawler = await self._get_crawler()
+        if isinstance(crawler, BrowserPool):
+            result = await crawler.arun(url=url, **browser_config)
+        else:
+            result = await crawler.arun(url=url, config=crawl4ai_run_config(browser_config))
+        self.stats['browser'] += 1
+        html = result.html or ''
+        ready_by = None
+        if browser_config.get('wait_for'):
+            match = _READY_ATTRIBUTE_PATTERN.search(html, 0, 4096)
+            ready_by = match.group(1) if match else 'timeout'
+            if match:
+                html = html[:match.start()] + html[match.end():]
+        fetched = FetchResult(url, html, result.success, result.status_code,
+                              result.error_message or '', via='browser')
+        fetched.ready_by = ready_by
+        return fetched
+
+    async def fetch(self, url: str, markers: Sequence[Tuple[str, str]], browser_config: Dict) -> FetchResult:
+        """Fetch url, returning the HTTP response if it carries the markers, else the rendered page"""
+        entry = self.cache.get(url) if self.cache is not None else None
+
+        if self.mode == 'browser':
+            return self._revalidate(await self._fetch_browser(url, browser_config), entry)
+
+        headers = self.cache.conditional_headers(entry) if entry is not None and entry.body else None
+        result = await self._fetch_http(url, headers)
+        if result.status_code == 304 and entry is not None:
+            self.stats['http'] += 1
+            self.cache.stats['hits'] += 1
+            self.cache.stats['revalidated'] += 1
+            self.cache.touch(url, result.etag, result.last_modified)
+            cached = FetchResult(url, entry.body, True, 200, via='cache')
+            cached.unchanged = True
+            cached.cached_record = entry.record
+            return cached
+
+        if self.mode == 'http' or (result.success and has_markers(result.html, markers)):
+            self.stats['http'] += 1
+            return self._revalidate(result, entry)
+
+        reason = result.error_message if not result.success else "expected markers missing"
+        logger.info(f"Escalating to browser for {url} ({reason})")
+        self.stats['escalated'] += 1
+        return self._revalidate(await self._fetch_browser(url, browser_config), entry)
+
+    def _revalidate(self, result: FetchResult, entry) -> FetchResult:
+        """Compare a fresh page against the cache, flagging it unchanged or storing the new copy"""
+        if self.cache is None or not result.success:
+            return result
+        hash_ = content_hash(result.html)
+        if entry is not None and entry.content_hash == hash_:
+            self.cache.stats['hits'] += 1
+            self.cache.touch(result.url, result.etag, result.last_modified)
+            result.unchanged = True
+            result.cached_record = entry.record
+        else:
+            self.cache.stats['misses'] += 1
+            if entry is not None:
+                self.cache.stats['changed'] += 1
+            self.cache.put(result.url, result.html, hash_, result.etag, result.last_modified)
+        return result
@@ -6,126 +6,512 @@ Extracts clinic details and exports to CSV format
 
 import asyncio
 import csv
+import hashlib
+import inspect
 import os
 import re
+import sys
+import time
 from urllib.parse import urljoin, urlparse
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 import logging
 
 # Install requirements: pip install crawl4ai beautifulsoup4 aiohttp
 from crawl4ai import AsyncWebCrawler
 from bs4 import BeautifulSoup
 
+# Helpers shared with the Healthify crawler live in crawl_common/ at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from crawl_common.adaptive import AdaptiveConcurrency
+from crawl_common.metrics import Metrics, MetricsReporter, add_metrics_arguments, profiling
+
+from archive import HtmlArchive, find_archives, load_index, read_entry
+from browser_pool import PLAYWRIGHT_AVAILABLE, BrowserPool
+from checkpoint import CrawlJournal, JournalState, RecordWriter
+from extractor import EXTRACTOR_VERSION, LXML_AVAILABLE, NOT_FOUND, ClinicPageExtractor
+from http_cache import PageCache
+from fetchers import (CLINIC_MARKERS, CLINIC_READY_SELECTORS, FETCH_MODES, LISTING_MARKERS,
+                      LISTING_READY_SELECTORS, PageFetcher, readiness_config)
+from rate_limiter import HostRateLimiter
+from snapshots import SnapshotExporter
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+CSV_FIELDNAMES = ['name', 'address', 'phone', 'email', 'doctors', 'url']
+
+GP_LANDING_URL = "https://www.healthpoint.co.nz/gps-accident-urgent-medical-care/gp/"
+REGION_URL_TEMPLATE = "https://www.healthpoint.co.nz/gps-accident-urgent-medical-care/{region}/"
+
+# 'prefetch' fetches the listing pages named in page 1's pagination concurrently; 'serial' follows a.next
+LISTING_MODES = ('prefetch', 'serial')
+# Numbered pagination links look like ?services=40 (40 clinics per page)
+PAGINATION_HREF_PATTERN = re.compile(r'^\?(\w+)=(\d*)$')
+
 class GPClinicScraper:
-    def __init__(self):
+    def __init__(self, concurrency: int = 4, requests_per_second: float = 1.0, burst: int = 1,
+                 fetch_mode: str = 'auto', queue_size: int = 100,
+                 output_path: Optional[str] = None, resume: bool = True,
+                 cache_dir: Optional[str] = None, cache_ttl_days: float = 30, cache_max_mb: int = 500,
+                 start_url: Optional[str] = None, browser_backend: str = 'pool',
+                 browser_pool_size: int = 4, page_recycle_after: int = 50,
+                 ready_timeout: float = 10.0, listing_mode: str = 'prefetch',
+                 adaptive: bool = True, min_concurrency: int = 1, max_concurrency: int = 16,
+                 archive_dir: Optional[str] = None, metrics: Optional[Metrics] = None,
+                 max_clinic_failures: int = 3, retry_failed: bool = False):
         self.base_url = "https://www.healthpoint.co.nz"
-        self.start_url = "https://www.healthpoint.co.nz/gps-accident-urgent-medical-care/gp/"
+        # Listing to crawl: the GP landing page, or one region's listing when sharding
+        self.start_url = start_url or GP_LANDING_URL
         self.clinic_data = []
+        # Number of clinic detail pages fetched in parallel (the starting point when adaptive)
+        self.concurrency = max(1, concurrency)
+        # Clinic URLs buffered between the listing walker and the detail workers
+        self.queue_size = queue_size
+        # Shared per-host budget replacing the fixed sleeps between requests
+        self.rate_limiter = HostRateLimiter(requests_per_second, burst)
+        # 'auto' tries plain HTTP and only renders in the browser when markers are missing
+        self.fetch_mode = fetch_mode
+        # Compiled single-pass lxml extractor; None falls back to the BeautifulSoup methods below
+        self.extractor = ClinicPageExtractor() if LXML_AVAILABLE else None
+        # When set, records are appended to this CSV as they complete instead of kept in memory
+        self.output_path = output_path
+        # Pick up an interrupted run's journal next to output_path instead of starting over
+        self.resume = resume
+        # A clinic that fails this many times (across resumed runs) is left out instead of retried;
+        # retry_failed retries every failed clinic once more regardless
+        self.max_clinic_failures = max_clinic_failures
+        self.retry_failed = retry_failed
+        self.writer: Optional[RecordWriter] = None
+        self.journal: Optional[CrawlJournal] = None
+        self.records_written = 0
+        # Set when a journalled run ends with pagination finished and every clinic done or failed
+        self.run_complete = False
+        # Clinics that failed and were never extracted; the snapshot keeps their previous rows
+        self.failed_urls: List[str] = []
+        # Revalidation cache for repeat runs; unchanged pages reuse their stored record
+        self.cache_dir = cache_dir
+        self.cache_ttl_days = cache_ttl_days
+        self.cache_max_mb = cache_max_mb
+        self.cache: Optional[PageCache] = None
+        # 'pool': pre-warmed Playwright contexts with resource blocking; 'crawl4ai': AsyncWebCrawler
+        self.browser_backend = browser_backend
+        self.browser_pool_size = browser_pool_size
+        self.page_recycle_after = page_recycle_after
+        # Upper bound (seconds) on waiting for a rendered page's ready selectors
+        self.ready_timeout = ready_timeout
+        if listing_mode not in LISTING_MODES:
+            raise ValueError(f"Unknown listing mode: {listing_mode}")
+        self.listing_mode = listing_mode
+        # Every fetched page is kept compressed here so extractor fixes can be replayed offline
+        self.archive_dir = archive_dir
+        self.archive: Optional[HtmlArchive] = None
+        # Per-stage histograms and counters (fetch, parse, rate-limit wait, write)
+        self.metrics = metrics or Metrics(prefix='gp_scraper')
+        # AIMD limit on in-flight fetches between min_concurrency and max_concurrency; the
+        # rate limiter stays the hard requests-per-second ceiling
+        if adaptive:
+            self.controller = AdaptiveConcurrency(self.concurrency, min_concurrency, max_concurrency,
+                                                  metrics=self.metrics)
+        else:
+            self.controller = AdaptiveConcurrency(self.concurrency, self.concurrency, self.concurrency,
+                                                  metrics=self.metrics)
+        # Enough detail workers to use the controller's ceiling
+        self.workers = self.controller.ceiling
+        
+    def _browser_factory(self, debug_mode: bool = False):
+        """Build the browser PageFetcher falls back to; only called once a page needs rendering"""
+        if self.browser_backend == 'pool' and PLAYWRIGHT_AVAILABLE:
+            return BrowserPool(size=self.browser_pool_size, headless=not debug_mode,
+                               max_uses=self.page_recycle_after)
         
-    async def scrape_all_clinics(self, debug_mode: bool = False) -> List[Dict]:
-        """Main method to scrape all GP clinics"""
         # Enhanced crawler configuration based on web research
         crawler_config = {
             'headless': not debug_mode,  # Non-headless for debugging
             'verbose': True
         }
+        return AsyncWebCrawler(**crawler_config)
+    
+    def _record_version(self) -> str:
+        """Changes whenever the code that turns a page into a cached record does"""
+        methods = [self._extract_clinic_urls_from_page, self._find_next_page_url]
+        if self.extractor is None:
+            methods += [self.parse_clinic_page, self._extract_clinic_name, self._extract_address,
+                        self._extract_phone, self._extract_email, self._extract_doctors]
+        source = ''.join(inspect.getsource(method) for method in methods)
+        return f"{EXTRACTOR_VERSION if self.extractor is not None else 'bs4'}-" \
+               f"{hashlib.sha256(source.encode('utf-8')).hexdigest()[:12]}"
+    
+    async def scrape_all_clinics(self, debug_mode: bool = False) -> List[Dict]:
+        """Main method to scrape all GP clinics"""
+        if self.cache_dir:
+            self.cache = PageCache(self.cache_dir, self.cache_ttl_days * 86400, self.cache_max_mb * 1024 * 1024,
+                                   record_version=self._record_version())
+        if self.archive_dir:
+            self.archive = HtmlArchive(self.archive_dir)
         
-        async with AsyncWebCrawler(**crawler_config) as crawler:
-            logger.info("Starting GP clinic scraping process")
-            logger.info(f"Debug mode: {'ON' if debug_mode else 'OFF'}")
-            
-            # Get all clinic URLs from paginated listing
-            clinic_urls = await self._get_all_clinic_urls(crawler, debug_mode)
-            logger.info(f"Found {len(clinic_urls)} clinic URLs")
-            
-            # Extract details from each clinic
-            for i, url in enumerate(clinic_urls, 1):
-                logger.info(f"Processing clinic {i}/{len(clinic_urls)}: {url}")
-                clinic_data = await self._extract_clinic_details(crawler, url, debug_mode)
-                if clinic_data:
-                    self.clinic_data.append(clinic_data)
-                    
-                # Rate limiting - be respectful
-                await asyncio.sleep(1)
+        try:
+            async with PageFetcher(lambda: self._browser_factory(debug_mode), mode=self.fetch_mode,
+                                   cache=self.cache) as fetcher:
+                logger.info("Starting GP clinic scraping process")
+                logger.info(f"Debug mode: {'ON' if debug_mode else 'OFF'}, fetch mode: {fetcher.mode}")
+                
+                # Listing pages feed clinic URLs straight into the detail workers
+                await self._run_pipeline(fetcher, debug_mode)
+                
+                logger.info(f"Fetch stats: {fetcher.stats}")
+        finally:
+            logger.info(f"Stage metrics:\n{self.metrics.summary()}")
+            logger.info(f"Adaptive {self.controller.summary()}")
+            if self.cache is not None:
+                logger.info(f"Page cache - {self.cache.summary()}")
+                self.cache.close()
+                self.cache = None
+            if self.archive is not None:
+                logger.info(f"HTML archive - {self.archive.summary()}")
+                self.archive.close()
+                self.archive = None
                 
         return self.clinic_data
     
-    async def _get_all_clinic_urls(self, crawler, debug_mode: bool = False) -> List[str]:
-        """Extract all clinic URLs from paginated listing"""
+    async def _run_pipeline(self, fetcher: PageFetcher, debug_mode: bool = False):
+        """
+        Producer/consumer crawl: the listing walker pushes clinic URLs into a
+        bounded queue as each page is parsed while the detail workers fetch pages
+        from it, as many at a time as the adaptive controller allows. A full queue pauses pagination (backpressure) and
+        one sentinel per worker shuts them down once pagination ends.
+        
+        With an output_path, every listing page and finished clinic is journalled
+        and records are appended to the CSV as they complete, so an interrupted
+        run resumes from where it stopped instead of page 1.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        state = self._open_checkpoint()
+        # Records are released in listing order; this holds ones that finished early
+        pending: Dict[int, tuple] = {}
+        next_index = 1
+        
+        def complete(i: int, url: str, clinic_data: Optional[Dict]):
+            nonlocal next_index
+            pending[i] = (url, clinic_data)
+            while next_index in pending:
+                done_url, data = pending.pop(next_index)
+                if data:
+                    self._store_record(data)
+                    if self.journal is not None:
+                        self.journal.record_done(done_url)
+                elif self.journal is not None:
+                    # Counts as finished, so one dead link cannot keep the run incomplete forever
+                    self.journal.record_failed(done_url)
+                next_index += 1
+        
+        async def producer():
+            seen = set(state.listed)
+            count = 0
+            try:
+                # Clinics listed before an interruption but never finished go first, along with
+                # failed ones still under the failure limit
+                for url in state.pending(None if self.retry_failed else self.max_clinic_failures):
+                    count += 1
+                    await queue.put((count, url))
+                if state.pagination_complete:
+                    return
+                start_url = state.next_url if state.started else self.start_url
+                async for page_num, page_urls, next_url in self._iter_listing_pages(
+                        fetcher, debug_mode, start_url=start_url, start_page=state.last_page + 1):
+                    if self.journal is not None:
+                        self.journal.record_page(page_num, page_urls, next_url)
+                    for url in page_urls:
+                        if url in seen:
+                            continue
+                        seen.add(url)
+                        count += 1
+                        await queue.put((count, url))
+            finally:
+                for _ in range(self.workers):
+                    await queue.put(None)
+                logger.info(f"Queued {count} clinic URLs")
+        
+        async def worker():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                i, url = item
+                logger.info(f"Processing clinic {i}: {url}")
+                complete(i, url, await self._extract_clinic_details(fetcher, url, debug_mode))
+        
+        try:
+            await asyncio.gather(producer(), *(worker() for _ in range(self.workers)))
+        finally:
+            self._close_checkpoint()
+    
+    def _open_checkpoint(self) -> JournalState:
+        """Open the incremental writer and journal, returning any state to resume from"""
+        if not self.output_path:
+            return JournalState()
+        
+        journal_path = self.output_path + '.journal'
+        if not self.resume:
+            for path in (self.output_path, journal_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        
+        state = CrawlJournal.load(journal_path)
+        if not state.started and os.path.exists(self.output_path):
+            # No journal means the last run finished; start a new snapshot
+            os.remove(self.output_path)
+        # Rows that reached the CSV count as done even if their journal entry was lost
+        state.done |= RecordWriter.existing_urls(self.output_path)
+        if state.started:
+            logger.info(f"Resuming: {len(state.done)} clinics done, {len(state.pending(self.max_clinic_failures))} pending, "
+                        f"{len(state.failed)} failed, "
+                        f"pagination at page {state.last_page + 1}"
+                        f"{' (complete)' if state.pagination_complete else ''}")
+        
+        self.writer = RecordWriter(self.output_path, CSV_FIELDNAMES)
+        self.journal = CrawlJournal(journal_path)
+        return state
+    
+    def _close_checkpoint(self):
+        if self.writer is not None:
+            self.records_written = self.writer.count
+            self.writer.close()
+        if self.journal is not None:
+            self.journal.close()
+            state = CrawlJournal.load(self.journal.path)
+            retrying = [url for url in state.pending(self.max_clinic_failures) if url in state.failed]
+            given_up = state.given_up(self.max_clinic_failures)
+            self.failed_urls = [url for url in state.failed if url not in state.done]
+            for urls, outcome in ((retrying, "will be retried on the next run"),
+                                  (given_up, f"failed {self.max_clinic_failures} times and are left out")):
+                if urls:
+                    logger.warning(f"{len(urls)} clinics {outcome}: {', '.join(urls[:5])}"
+                                   f"{' ...' if len(urls) > 5 else ''}")
+            # Failed clinics under the retry limit keep the run (and its journal) open
+            self.run_complete = state.pagination_complete and not state.pending(self.max_clinic_failures)
+            if self.run_complete:
+                self.journal.discard()
+            else:
+                logger.warning(f"Run incomplete; rerun to resume from {self.journal.path}")
+        self.writer = None
+        self.journal = None
+    
+    def _store_record(self, clinic_data: Dict):
+        """Persist one clinic record: straight to disk when writing incrementally, else in memory"""
+        if self.writer is not None:
+            with self.metrics.timer('write_seconds'):
+                self.writer.write(clinic_data)
+        else:
+            self.clinic_data.append(clinic_data)
+        self.metrics.inc('records_total')
+    
+    async def _fetch(self, fetcher: PageFetcher, url: str, markers, crawl_config: Dict, page_type: str):
+        """Rate-limited fetch that records wait time, fetch latency and outcome counters"""
+        async with self.controller.slot() as slot:
+            waited = await self.rate_limiter.acquire(url)
+            self.metrics.observe('rate_limit_wait_seconds', waited)
+            start = time.perf_counter()
+            escalated = fetcher.stats.get('escalated', 0)
+            result = await fetcher.fetch(url, markers, crawl_config)
+            slot.record(result.success, result.status_code, result.error_message,
+                        latency=time.perf_counter() - start)
+        self.metrics.observe('fetch_seconds', time.perf_counter() - start,
+                             page=page_type, via=getattr(result, 'via', 'browser'))
+        if fetcher.stats.get('escalated', 0) > escalated:
+            self.metrics.inc('browser_escalations_total', page=page_type)
+        ready_by = getattr(result, 'ready_by', None)
+        if ready_by:
+            self.metrics.inc('readiness_total', page=page_type, condition=ready_by)
+            if ready_by == 'timeout':
+                logger.warning(f"Ready selectors not found within {self.ready_timeout}s on {url}; "
+                               f"captured page as-is after {time.perf_counter() - start:.1f}s")
+            else:
+                logger.debug(f"{url} ready on {ready_by} after {time.perf_counter() - start:.2f}s")
+        if not result.success:
+            self.metrics.inc('failures_total', page=page_type, stage='fetch')
+        elif getattr(result, 'unchanged', False):
+            self.metrics.inc('cache_hits_total', page=page_type)
+        if self.archive is not None and result.success and result.html:
+            with self.metrics.timer('archive_seconds', page=page_type):
+                self.archive.append(url, result.html, page_type)
+        return result
+    
+    async def _get_all_clinic_urls(self, fetcher: PageFetcher, debug_mode: bool = False) -> List[str]:
+        """Extract all clinic URLs from paginated listing, deduplicated in listing order"""
         clinic_urls = []
-        current_url = self.start_url
-        page_num = 1
+        seen = set()
+        async for _, page_urls, _ in self._iter_listing_pages(fetcher, debug_mode):
+            for url in page_urls:
+                if url not in seen:
+                    seen.add(url)
+                    clinic_urls.append(url)
+        return clinic_urls
+    
+    async def _iter_listing_pages(self, fetcher: PageFetcher, debug_mode: bool = False,
+                                  start_url: Optional[str] = None,
+                                  start_page: int = 1) -> AsyncIterator[Tuple[int, List[str], Optional[str]]]:
+        """
+        Walk the paginated listing, yielding (page_num, clinic_urls, next_url) for
+        each page in order as soon as it is parsed
+        
+        In 'prefetch' mode the remaining page URLs are read off the first page's
+        span.pagination and fetched concurrently; when the links do not follow a
+        recognisable ?param=offset pattern the walk follows a.next page by page.
+        """
+        current_url = start_url or self.start_url
+        page_num = start_page
+        visited = set()
+        plan_checked = self.listing_mode != 'prefetch'
         
         while current_url:
+            if current_url in visited:
+                logger.warning(f"Pagination loops back to {current_url}; stopping")
+                break
+            visited.add(current_url)
             logger.info(f"Scraping listing page {page_num}: {current_url}")
             
+            page = await self._fetch_listing_page_safely(fetcher, current_url, page_num, debug_mode)
+            if page is None:
+                break
+            page_urls, current_url, html = page
+            
+            # Pacing between pages comes from the shared rate limiter
+            yield page_num, page_urls, current_url
+            page_num += 1
+            
+            # Limit pages in debug mode (disabled for production)
+            if debug_mode and page_num > 5:
+                logger.info("Debug mode: Limiting to 5 pages")
+                break
+            
+            if plan_checked or not current_url:
+                continue
+            plan_checked = True
+            plan = self._pagination_plan(BeautifulSoup(html, 'html.parser'))
+            if not plan or plan[0] != current_url:
+                logger.info("Pagination pattern not recognised; following next links")
+                continue
+            if debug_mode:
+                plan = plan[:max(0, 6 - page_num)]
+            
+            logger.info(f"Prefetching {len(plan)} listing pages concurrently")
+            sem = asyncio.Semaphore(self.concurrency)
+            
+            async def fetch_planned(url: str, num: int):
+                async with sem:
+                    return await self._fetch_listing_page_safely(fetcher, url, num, debug_mode)
+            
+            tasks = [asyncio.create_task(fetch_planned(url, page_num + i)) for i, url in enumerate(plan)]
             try:
-                # Enhanced crawl configuration for dynamic content
-                crawl_config = {
-                    'wait_until': 'networkidle',  # Wait for all network requests
-                    'timeout': 30000,  # 30 second timeout
-                    'extra_wait': 3,  # Extra 3 seconds after networkidle (increased)
-                    'js_code': """
-                        // Clear any cached content and scroll to ensure all content is loaded
-                        if (typeof window !== 'undefined') {
-                            window.scrollTo(0, 0);
-                            await new Promise(resolve => setTimeout(resolve, 500));
-                            window.scrollTo(0, document.body.scrollHeight);
-                            await new Promise(resolve => setTimeout(resolve, 2000));
-                        }
-                    """
-                }
-                
-                # For page 2+, add extra debugging
-                if page_num > 1:
-                    logger.info(f"🔍 Page {page_num} - Enhanced debugging enabled")
-                    crawl_config['extra_wait'] = 5  # Even longer wait for subsequent pages
-                
-                result = await crawler.arun(url=current_url, **crawl_config)
-                
-                # Enhanced debugging
-                if not result.success:
-                    logger.error(f"Failed to crawl {current_url}")
-                    logger.error(f"Status: {result.status_code}")
-                    logger.error(f"Error: {result.error_message}")
-                    break
-                
-                # Save HTML for debugging
-                if debug_mode:
-                    with open(f'debug_page_{page_num}.html', 'w', encoding='utf-8') as f:
-                        f.write(result.html)
-                    logger.info(f"Saved debug HTML: debug_page_{page_num}.html")
-                    
-                soup = BeautifulSoup(result.html, 'html.parser')
-                
-                # Extract clinic URLs from current page
-                page_urls = self._extract_clinic_urls_from_page(soup, debug_mode)
-                clinic_urls.extend(page_urls)
-                logger.info(f"Found {len(page_urls)} clinics on page {page_num}")
-                
-                # Find next page URL
-                current_url = self._find_next_page_url(soup, debug_mode)
-                page_num += 1
-                
-                # Add delay between pages to avoid rate limiting and session issues
-                if current_url:
-                    logger.info(f"⏳ Waiting 3 seconds before next page...")
-                    await asyncio.sleep(3)
-                
-                # Limit pages in debug mode (disabled for production)
-                if debug_mode and page_num > 5:
-                    logger.info("Debug mode: Limiting to 5 pages")
-                    break
-                
-            except Exception as e:
-                logger.error(f"Error processing page {current_url}: {e}")
+                for i, task in enumerate(tasks):
+                    visited.add(plan[i])
+                    page = await task
+                    if page is None:
+                        # Leave the failed page as the journal's resume point, as the serial walk does
+                        return
+                    page_urls, parsed_next, _ = page
+                    if i + 1 < len(plan):
+                        next_url = plan[i + 1]
+                    else:
+                        # The listing may have grown since page 1 was rendered; keep following a.next
+                        next_url = parsed_next if parsed_next not in visited else None
+                    logger.info(f"Listing page {page_num}: {plan[i]}")
+                    yield page_num, page_urls, next_url
+                    page_num += 1
+                    current_url = next_url
+            finally:
+                for task in tasks:
+                    task.cancel()
+            if debug_mode:
                 break
-                
-        return clinic_urls
+    
+    async def _fetch_listing_page_safely(self, fetcher: PageFetcher, url: str, page_num: int,
+                                         debug_mode: bool = False) -> Optional[Tuple[List[str], Optional[str], str]]:
+        """Fetch and parse one listing page as (clinic_urls, next_url, html); None if it failed"""
+        try:
+            # Rendered pages return as soon as the clinic list or pagination is in the DOM
+            crawl_config = readiness_config(LISTING_READY_SELECTORS, self.ready_timeout)
+            
+            result = await self._fetch(fetcher, url, LISTING_MARKERS, crawl_config, 'listing')
+            
+            # Enhanced debugging
+            if not result.success:
+                logger.error(f"Failed to crawl {url}")
+                logger.error(f"Status: {result.status_code}")
+                logger.error(f"Error: {result.error_message}")
+                return None
+            
+            # Save HTML for debugging
+            if debug_mode:
+                with open(f'debug_page_{page_num}.html', 'w', encoding='utf-8') as f:
+                    f.write(result.html)
+                logger.info(f"Saved debug HTML: debug_page_{page_num}.html")
+            
+            if result.unchanged and result.cached_record:
+                # Listing unchanged since the last run; reuse its parsed links
+                page_urls = result.cached_record['urls']
+                next_url = result.cached_record['next']
+            else:
+                with self.metrics.timer('parse_seconds', page='listing'):
+                    soup = BeautifulSoup(result.html, 'html.parser')
+                    
+                    # Extract clinic URLs from current page
+                    page_urls = self._extract_clinic_urls_from_page(soup, debug_mode)
+                    
+                    # Find next page URL
+                    next_url = self._find_next_page_url(soup, debug_mode)
+                if self.cache is not None:
+                    self.cache.store_record(url, {'urls': page_urls, 'next': next_url})
+            logger.info(f"Found {len(page_urls)} clinics on page {page_num}")
+            return page_urls, next_url, result.html
+        
+        except Exception as e:
+            logger.error(f"Error processing page {url}: {e}")
+            return None
+    
+    def _pagination_plan(self, soup: BeautifulSoup) -> Optional[List[str]]:
+        """
+        URLs of the listing pages after the current one, derived from the numbered
+        links in span.pagination (e.g. ?services=40, ?services=80 ... for pages 2, 3 ...)
+        
+        Elided page numbers are filled in from the offset step. Returns None when
+        the links do not share one query parameter with a fixed offset per page.
+        """
+        pagination = soup.find('span', class_='pagination')
+        if not pagination:
+            return []
+        
+        current = pagination.find('span', class_='page')
+        if not current or not current.get_text(strip=True).isdigit():
+            return None
+        current_page = int(current.get_text(strip=True))
+        
+        params = set()
+        offsets: Dict[int, int] = {}
+        for link in pagination.find_all('a', class_='page'):
+            label = link.get_text(strip=True)
+            match = PAGINATION_HREF_PATTERN.match(link.get('href', ''))
+            if not label.isdigit() or not match:
+                return None
+            params.add(match.group(1))
+            offsets[int(label)] = int(match.group(2) or 0)
+        
+        last_page = max([current_page, *offsets])
+        if last_page <= current_page:
+            return []
+        if len(params) != 1:
+            return None
+        
+        steps = {offset // (page - 1) for page, offset in offsets.items()
+                 if page > 1 and offset % (page - 1) == 0}
+        if len(steps) != 1 or any(offset != (page - 1) * next(iter(steps)) for page, offset in offsets.items()):
+            return None
+        step = steps.pop()
+        if step <= 0:
+            return None
+        param = params.pop()
+        return [f"{self.start_url}?{param}={(page - 1) * step}" for page in range(current_page + 1, last_page + 1)]
     
     def _extract_clinic_urls_from_page(self, soup: BeautifulSoup, debug_mode: bool = False) -> List[str]:
         """Extract clinic URLs from listing page"""
@@ -200,38 +586,45 @@ class GPClinicScraper:
                 
         return None
     
-    async def _extract_clinic_details(self, crawler, url: str, debug_mode: bool = False) -> Optional[Dict]:
+    async def discover_regions(self) -> List[str]:
+        """Read the region slugs offered by the region filter on the GP landing page"""
+        async with PageFetcher(self._browser_factory, mode=self.fetch_mode) as fetcher:
+            result = await self._fetch(fetcher, GP_LANDING_URL, LISTING_MARKERS,
+                                       readiness_config(('select#filter-region',), self.ready_timeout), 'landing')
+        if not result.success:
+            logger.error(f"Failed to fetch GP landing page: {result.status_code} {result.error_message}")
+            return []
+        return self._extract_regions_from_page(BeautifulSoup(result.html, 'html.parser'))
+    
+    def _extract_regions_from_page(self, soup: BeautifulSoup) -> List[str]:
+        """Extract region slugs from <select id="filter-region">"""
+        select = soup.find('select', id='filter-region')
+        if not select:
+            logger.warning("Region filter not found on landing page")
+            return []
+        return [option['value'] for option in select.find_all('option') if option.get('value')]
+    
+    async def _extract_clinic_details(self, fetcher: PageFetcher, url: str, debug_mode: bool = False) -> Optional[Dict]:
         """Extract detailed information from individual clinic page"""
         try:
-            # Enhanced config for clinic detail pages
-            crawl_config = {
-                'wait_until': 'networkidle',
-                'timeout': 30000,  # Increased timeout
-                'extra_wait': 3,   # Increased wait time
-                'js_code': """
-                    // Scroll to ensure all content is loaded
-                    window.scrollTo(0, document.body.scrollHeight);
-                    await new Promise(resolve => setTimeout(resolve, 1000));
-                """
-            }
+            # Rendered pages return as soon as the contact labels or section headers are in the DOM
+            crawl_config = readiness_config(CLINIC_READY_SELECTORS, self.ready_timeout)
             
-            result = await crawler.arun(url=url, **crawl_config)
+            # Rate limiting - be respectful (shared across all workers)
+            result = await self._fetch(fetcher, url, CLINIC_MARKERS, crawl_config, 'clinic')
             if not result.success:
                 logger.error(f"Failed to crawl clinic page: {url}")
                 logger.error(f"Status: {result.status_code}, Error: {result.error_message}")
                 return None
                 
-            soup = BeautifulSoup(result.html, 'html.parser')
+            if result.unchanged and result.cached_record:
+                # Same content as last run: skip parsing and reuse the stored record
+                return dict(result.cached_record, url=url)
             
-            # Extract clinic data
-            clinic_data = {
-                'name': self._extract_clinic_name(soup, debug_mode),
-                'address': self._extract_address(soup, debug_mode),
-                'phone': self._extract_phone(soup, debug_mode),
-                'email': self._extract_email(soup, debug_mode),
-                'doctors': self._extract_doctors(soup, debug_mode),
-                'url': url
-            }
+            with self.metrics.timer('parse_seconds', page='clinic'):
+                clinic_data = self.parse_clinic_page(result.html, url, debug_mode)
+            if self.cache is not None:
+                self.cache.store_record(url, clinic_data)
             
             if debug_mode:
                 logger.info(f"Extracted data for {clinic_data['name']}")
@@ -244,8 +637,24 @@ class GPClinicScraper:
             
         except Exception as e:
             logger.error(f"Error extracting clinic details from {url}: {e}")
+            self.metrics.inc('failures_total', page='clinic', stage='extract')
             return None
     
+    def parse_clinic_page(self, html: str, url: str, debug_mode: bool = False) -> Dict:
+        """Extract clinic fields from page HTML, using the lxml extractor when available"""
+        if self.extractor is not None:
+            return self.extractor.extract(html, url, debug_mode)
+        
+        soup = BeautifulSoup(html, 'html.parser')
+        return {
+            'name': self._extract_clinic_name(soup, debug_mode),
+            'address': self._extract_address(soup, debug_mode),
+            'phone': self._extract_phone(soup, debug_mode),
+            'email': self._extract_email(soup, debug_mode),
+            'doctors': self._extract_doctors(soup, debug_mode),
+            'url': url
+        }
+    
     def _extract_clinic_name(self, soup: BeautifulSoup, debug_mode: bool = False) -> str:
         """Extract clinic name from h1 tag (find first non-empty one)"""
         h1_tags = soup.find_all('h1')
@@ -269,7 +678,7 @@ class GPClinicScraper:
                     logger.info(f"Found clinic name from title: {name}")
                 return name
         
-        return "Unknown"
+        return NOT_FOUND['name']
     
     def _extract_address(self, soup: BeautifulSoup, debug_mode: bool = False) -> str:
         """Extract clinic address from contact details"""
@@ -306,7 +715,7 @@ class GPClinicScraper:
         if debug_mode:
             logger.info("No address found with current selectors")
             
-        return "Address not found"
+        return NOT_FOUND['address']
     
     def _extract_phone(self, soup: BeautifulSoup, debug_mode: bool = False) -> str:
         """Extract phone number"""
@@ -333,7 +742,7 @@ class GPClinicScraper:
         if debug_mode:
             logger.info("No phone found with current selectors")
             
-        return "Phone not found"
+        return NOT_FOUND['phone']
     
     def _extract_email(self, soup: BeautifulSoup, debug_mode: bool = False) -> str:
         """Extract email address"""
@@ -361,7 +770,7 @@ class GPClinicScraper:
         if debug_mode:
             logger.info("No email found with current selectors")
             
-        return "Email not found"
+        return NOT_FOUND['email']
     
     def _extract_doctors(self, soup: BeautifulSoup, debug_mode: bool = False) -> str:
         """Extract list of doctors"""
@@ -402,7 +811,7 @@ class GPClinicScraper:
         if debug_mode:
             logger.info(f"Final doctors list: {len(doctors)} doctors")
             
-        return '; '.join(doctors) if doctors else "Doctors not listed"
+        return '; '.join(doctors) if doctors else NOT_FOUND['doctors']
     
     def export_to_csv(self, filename: str = "gp_clinics.csv"):
         """Export clinic data to CSV in the same directory as the script"""
@@ -413,12 +822,10 @@ class GPClinicScraper:
         # Get the directory where the script is located
         script_dir = os.path.dirname(os.path.abspath(__file__))
         csv_path = os.path.join(script_dir, filename)
-            
-        fieldnames = ['name', 'address', 'phone', 'email', 'doctors', 'url']
         
         try:
             with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+                writer = csv.DictWriter(csvfile, fieldnames=CSV_FIELDNAMES)
                 writer.writeheader()
                 writer.writerows(self.clinic_data)
                 
@@ -429,25 +836,227 @@ class GPClinicScraper:
         
         return csv_path
 
-async def main(debug_mode: bool = False):
+def _crawl_region_shard(region: str, scraper_kwargs: Dict, shard_dir: str,
+                        debug_mode: bool) -> Tuple[str, str, int, bool, List[str]]:
+    """Process-pool entry point: crawl one region with its own crawler, rate limiter and cache"""
+    csv_path = os.path.join(shard_dir, f"{region}.csv")
+    kwargs = dict(scraper_kwargs)
+    if kwargs.get('cache_dir'):
+        # SQLite does not like concurrent writers; keep one cache per shard
+        kwargs['cache_dir'] = os.path.join(kwargs['cache_dir'], region)
+    if kwargs.get('archive_dir'):
+        kwargs['archive_dir'] = os.path.join(kwargs['archive_dir'], region)
+    scraper = GPClinicScraper(start_url=REGION_URL_TEMPLATE.format(region=region), output_path=csv_path, **kwargs)
+    try:
+        asyncio.run(scraper.scrape_all_clinics(debug_mode=debug_mode))
+    except Exception as e:
+        logger.error(f"Region {region} failed: {e}")
+    return region, csv_path, scraper.records_written, scraper.run_complete, scraper.failed_urls
+
+
+def merge_shards(shard_paths: List[str], csv_path: str) -> int:
+    """Merge per-region CSVs into one export, keeping the first row seen for each clinic URL"""
+    seen = set()
+    with open(csv_path, 'w', newline='', encoding='utf-8') as out:
+        writer = csv.DictWriter(out, fieldnames=CSV_FIELDNAMES)
+        writer.writeheader()
+        for path in shard_paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    if row['url'] in seen:
+                        continue
+                    seen.add(row['url'])
+                    writer.writerow(row)
+    return len(seen)
+
+
+def crawl_regions(regions: List[str], csv_path: str, workers: int = 4, debug_mode: bool = False,
+                  **scraper_kwargs) -> Tuple[int, List[str], List[str]]:
+    """
+    Crawl each region as a shard in a process pool and merge the results into csv_path.
+    Returns the merged clinic count, the regions whose crawl did not complete and
+    the clinic URLs that failed.
+    
+    `requests_per_second` in scraper_kwargs is the total budget; each worker gets an
+    equal share so adding workers adds CPU, not load on Healthpoint.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    
+    workers = max(1, min(workers, len(regions)))
+    shard_dir = os.path.join(os.path.dirname(csv_path), 'shards')
+    os.makedirs(shard_dir, exist_ok=True)
+    scraper_kwargs['requests_per_second'] = scraper_kwargs.get('requests_per_second', 1.0) / workers
+    
+    logger.info(f"Crawling {len(regions)} regions across {workers} worker processes")
+    # spawn: workers must not inherit the parent's event loop or browser state
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = [pool.submit(_crawl_region_shard, region, scraper_kwargs, shard_dir, debug_mode)
+                   for region in regions]
+        incomplete = []
+        failed = []
+        for future in as_completed(futures):
+            region, _, count, complete, region_failed = future.result()
+            failed.extend(region_failed)
+            logger.info(f"Region {region} finished: {count} clinics extracted this run")
+            if not complete:
+                incomplete.append(region)
+    
+    # Merge in the order regions were requested so the export is deterministic
+    total = merge_shards([os.path.join(shard_dir, f"{region}.csv") for region in regions], csv_path)
+    logger.info(f"Merged {total} unique clinics into {csv_path}")
+    if incomplete:
+        logger.warning(f"Incomplete regions (rerun to resume): {', '.join(sorted(incomplete))}")
+    return total, incomplete, failed
+
+_archive_scraper: Optional['GPClinicScraper'] = None
+
+
+def _extract_archived_batch(batch: List[Tuple[str, str, str, int, int]]) -> List[Dict]:
+    """Process-pool entry point: parse archived clinic pages (directory, segment, url, offset, length)"""
+    global _archive_scraper
+    if _archive_scraper is None:
+        _archive_scraper = GPClinicScraper()
+    records = []
+    for directory, segment, url, offset, length in batch:
+        try:
+            records.append(_archive_scraper.parse_clinic_page(read_entry(directory, segment, offset, length), url))
+        except Exception as e:
+            logger.error(f"Error re-extracting {url}: {e}")
+    return records
+
+
+def reextract_archive(archive_root: str, csv_path: str, workers: int = 4, batch_size: int = 100) -> int:
+    """
+    Re-run the clinic extractors over every archived clinic page, with no network
+    or browser, and write the records to csv_path in archive order. csv_path is
+    only replaced once every page is extracted, and not at all when nothing was.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    
+    jobs = []
+    seen = set()
+    for directory in find_archives(archive_root):
+        for entry in load_index(directory).values():
+            if entry.page_type == 'clinic' and entry.url not in seen:
+                seen.add(entry.url)
+                jobs.append((directory, entry.segment, entry.url, entry.offset, entry.length))
+    if not jobs:
+        logger.error(f"No archived clinic pages under {archive_root}")
+        return 0
+    
+    batches = [jobs[i:i + batch_size] for i in range(0, len(jobs), batch_size)]
+    logger.info(f"Re-extracting {len(jobs)} archived clinic pages across {workers} worker processes")
+    start = time.perf_counter()
+    count = 0
+    tmp_path = f'{csv_path}.tmp'
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as out, \
+            ProcessPoolExecutor(max_workers=max(1, workers), mp_context=multiprocessing.get_context('spawn')) as pool:
+        writer = csv.DictWriter(out, fieldnames=CSV_FIELDNAMES)
+        writer.writeheader()
+        # map() keeps batch order, so the CSV follows archive order
+        for records in pool.map(_extract_archived_batch, batches):
+            writer.writerows(records)
+            count += len(records)
+    if not count:
+        os.remove(tmp_path)
+        logger.error(f"No clinic records extracted from {len(jobs)} archived pages; {csv_path} left as it was")
+        return 0
+    os.replace(tmp_path, csv_path)
+    logger.info(f"Re-extracted {count} clinics into {csv_path} in {time.perf_counter() - start:.1f}s")
+    return count
+
+async def main(debug_mode: bool = False, concurrency: int = 4, requests_per_second: float = 1.0,
+               fetch_mode: str = 'auto', filename: str = "gp_clinics.csv", fresh: bool = False,
+               use_cache: bool = True, regions: Optional[List[str]] = None, workers: int = 4,
+               browser_backend: str = 'pool', metrics_json: Optional[str] = None,
+               metrics_prom: Optional[str] = None, metrics_interval: float = 30.0, ready_timeout: float = 10.0,
+               listing_mode: str = 'prefetch', export: bool = True, adaptive: bool = True,
+               min_concurrency: int = 1, max_concurrency: int = 16, archive: bool = True,
+               from_archive: bool = False, retry_failed: bool = False):
     """Main execution function with enhanced debugging"""
-    scraper = GPClinicScraper()
+    # Records stream into the CSV in the script directory as they are extracted
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    csv_path = os.path.join(script_dir, filename)
+    scraper_kwargs = dict(concurrency=concurrency, requests_per_second=requests_per_second,
+                          fetch_mode=fetch_mode, resume=not fresh, browser_backend=browser_backend,
+                          ready_timeout=ready_timeout, listing_mode=listing_mode, adaptive=adaptive,
+                          min_concurrency=min_concurrency, max_concurrency=max_concurrency,
+                          cache_dir=os.path.join(script_dir, '.http_cache') if use_cache else None,
+                          archive_dir=os.path.join(script_dir, 'archive') if archive else None,
+                          retry_failed=retry_failed)
+    scraper = GPClinicScraper(output_path=csv_path, **scraper_kwargs)
     
     try:
         logger.info("=" * 50)
         logger.info("GP CLINIC SCRAPER - ENHANCED DEBUG VERSION")
         logger.info("=" * 50)
         
-        # Scrape all clinics with debug mode
-        clinic_data = await scraper.scrape_all_clinics(debug_mode=debug_mode)
+        loop = asyncio.get_running_loop()
+        if from_archive:
+            # Offline: replay the extractors over the archive (including region shards)
+            regions = None
+            journal_path = csv_path + '.journal'
+            if os.path.exists(journal_path):
+                # The replay would overwrite the CSV that crawl resumes into
+                logger.error(f"{journal_path} belongs to an interrupted crawl; finish it (or rerun it with "
+                             f"--fresh) before --from-archive, which rewrites {csv_path}")
+                return
+            count = await loop.run_in_executor(None, lambda: reextract_archive(
+                os.path.join(script_dir, 'archive'), csv_path, workers=workers))
+            if not count:
+                print("Nothing re-extracted from the archive; CSV and snapshots left as they were")
+                return
+            # A replay is as complete as the crawl that filled the archive
+            shard_dir = os.path.join(script_dir, 'shards')
+            complete = not (os.path.isdir(shard_dir)
+                            and any(name.endswith('.journal') for name in os.listdir(shard_dir)))
+            failed_urls = []
+        else:
+            if regions == ['all']:
+                regions = await scraper.discover_regions()
+                logger.info(f"Discovered {len(regions)} regions: {', '.join(regions)}")
+            
+            if regions:
+                # One shard per region across a process pool, merged into csv_path
+                _, incomplete, failed_urls = await loop.run_in_executor(None, lambda: crawl_regions(
+                    regions, csv_path, workers=workers, debug_mode=debug_mode, **scraper_kwargs))
+                complete = not incomplete
+            else:
+                # Scrape all clinics with debug mode, snapshotting stage metrics as we go
+                async with MetricsReporter(scraper.metrics, metrics_json, metrics_prom, metrics_interval):
+                    await scraper.scrape_all_clinics(debug_mode=debug_mode)
+                complete = scraper.run_complete
+                failed_urls = scraper.failed_urls
         
-        # Export to CSV in script directory
-        csv_path = scraper.export_to_csv("gp_clinics.csv")
+        with open(csv_path, newline='', encoding='utf-8') as f:
+            clinic_data = list(csv.DictReader(f))
+        
+        # Snapshot only complete runs; a partial CSV would show as mass removals.
+        # Clinics that failed to fetch keep their previous rows for the same reason.
+        if export and complete:
+            changes = SnapshotExporter(os.path.join(script_dir, 'exports'), CSV_FIELDNAMES).export(
+                csv_path, failed_urls=failed_urls)
+        else:
+            changes = None
         
         # Print summary
         print(f"\n=== Scraping Complete ===")
-        print(f"Total clinics extracted: {len(clinic_data)}")
+        if not regions and not from_archive:
+            print(f"Clinics extracted this run: {scraper.records_written}")
+        print(f"Total clinics in CSV: {len(clinic_data)}")
         print(f"CSV file saved to: {csv_path}")
+        if changes is not None and not changes['baseline']:
+            counts = changes['counts']
+            print(f"Changes since last snapshot: {counts['added']} added, {counts['removed']} removed, "
+                  f"{counts['changed']} changed")
+            if changes['carried_forward']:
+                print(f"Kept {len(changes['carried_forward'])} clinics that failed to fetch at their previous values")
+        elif export and not complete:
+            print("Run incomplete: snapshot and change set skipped until a rerun finishes it")
         
         # Show sample data
         if clinic_data:
@@ -464,4 +1073,52 @@ async def main(debug_mode: bool = False):
         logger.error(traceback.format_exc())
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Scrape GP clinic details from Healthpoint")
+    parser.add_argument("--debug", action="store_true", help="Run with a visible browser and verbose logging")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="Clinic pages fetched in parallel (the starting point when adaptive)")
+    parser.add_argument("--min-concurrency", type=int, default=1, help="Floor for adaptive concurrency")
+    parser.add_argument("--max-concurrency", type=int, default=16, help="Ceiling for adaptive concurrency")
+    parser.add_argument("--no-adaptive", action="store_true",
+                        help="Keep --concurrency fixed instead of adapting to latency and errors")
+    parser.add_argument("--rps", type=float, default=1.0, help="Requests per second ceiling per host")
+    parser.add_argument("--fetch-mode", choices=FETCH_MODES, default="auto",
+                        help="auto: plain HTTP with browser fallback; http: never render; browser: always render")
+    parser.add_argument("--output", default="gp_clinics.csv", help="CSV file name in the script directory")
+    parser.add_argument("--fresh", action="store_true", help="Ignore an interrupted run's journal and start over")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="When resuming, retry every failed clinic, even ones past the failure limit")
+    parser.add_argument("--no-cache", action="store_true", help="Re-fetch and re-parse every page")
+    parser.add_argument("--regions", help="Comma-separated region slugs (e.g. north-auckland,waikato) "
+                                          "or 'all' to discover them; each region is crawled as a shard")
+    parser.add_argument("--workers", type=int, default=4, help="Worker processes for --regions")
+    parser.add_argument("--browser", choices=["pool", "crawl4ai"], default="pool",
+                        help="Browser fallback: pooled Playwright contexts with resource blocking, or crawl4ai")
+    parser.add_argument("--ready-timeout", type=float, default=10.0,
+                        help="Seconds to wait for a rendered page's ready selectors before capturing it as-is")
+    parser.add_argument("--listing-mode", choices=LISTING_MODES, default="prefetch",
+                        help="prefetch: fetch all listing pages named in page 1's pagination concurrently; "
+                             "serial: follow next links one page at a time")
+    parser.add_argument("--no-archive", action="store_true",
+                        help="Do not keep fetched pages in the compressed archive/ directory")
+    parser.add_argument("--from-archive", action="store_true",
+                        help="Re-extract every archived clinic page with --workers processes; no network or browser")
+    parser.add_argument("--no-export", action="store_true",
+                        help="Skip the Parquet snapshot and change set written to exports/ after a complete run")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    
+    with profiling(args.profile, args.tracemalloc):
+        asyncio.run(main(debug_mode=args.debug, concurrency=args.concurrency, requests_per_second=args.rps,
+                         fetch_mode=args.fetch_mode, filename=args.output, fresh=args.fresh,
+                         use_cache=not args.no_cache,
+                         regions=[r.strip() for r in args.regions.split(',') if r.strip()] if args.regions else None,
+                         workers=args.workers, browser_backend=args.browser, metrics_json=args.metrics_json,
+                         metrics_prom=args.metrics_prom, metrics_interval=args.metrics_interval,
+                         ready_timeout=args.ready_timeout, listing_mode=args.listing_mode,
+                         export=not args.no_export, adaptive=not args.no_adaptive,
+                         min_concurrency=args.min_concurrency, max_concurrency=args.max_concurrency,
+                         archive=not args.no_archive, from_archive=args.from_archive,
+                         retry_failed=args.retry_failed))
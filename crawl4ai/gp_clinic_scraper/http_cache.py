@@ -0,0 +1,179 @@
+"""
+On-disk revalidation cache for Healthpoint pages
+
+Each page is stored under its canonical URL with the ETag / Last-Modified
+validators the server sent, a hash of its content, the compressed body and
+the record parsed from it. Repeat runs send conditional requests; a 304 or an
+unchanged content hash lets the scraper reuse the stored record without
+parsing the page again.
+
+Records are tagged with the parser version that produced them. A record from
+another version is not returned, so after an extractor fix unchanged pages
+are parsed again from the cached body. The validators are still reused for
+the fetch itself.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+import zlib
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+logger = logging.getLogger(__name__)
+
+# Script/style blocks and comments carry per-request tokens; leave them out of the hash
+_VOLATILE = re.compile(r'<script\b.*?</script>|<style\b.*?</style>|<!--.*?-->', re.IGNORECASE | re.DOTALL)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def canonical_url(url: str) -> str:
+    """Lower-case scheme/host, drop the fragment and sort query parameters"""
+    parts = urlparse(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunparse((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', '', query, ''))
+
+
+def content_hash(html: str) -> str:
+    normalised = _WHITESPACE.sub(' ', _VOLATILE.sub('', html)).strip()
+    return hashlib.sha256(normalised.encode('utf-8', errors='ignore')).hexdigest()
+
+
+class CacheEntry:
+    def __init__(self, url: str, etag: Optional[str], last_modified: Optional[str], content_hash: str,
+                 body: Optional[str], record: Optional[Dict]):
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_hash = content_hash
+        self.body = body
+        self.record = record
+
+
+class PageCache:
+    """SQLite-backed page cache with TTL and total-size eviction"""
+
+    def __init__(self, cache_dir: str, ttl_seconds: float = 30 * 86400, max_bytes: int = 500 * 1024 * 1024,
+                 record_version: str = ''):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, 'pages.sqlite3')
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        # Parser version stored with each record; records from other versions are ignored
+        self.record_version = record_version
+        self.stats = {'hits': 0, 'revalidated': 0, 'misses': 0, 'changed': 0, 'evicted': 0, 'stale_records': 0}
+        self._db = sqlite3.connect(self.path)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT NOT NULL,
+                body BLOB,
+                record TEXT,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                record_version TEXT
+            )
+        """)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(pages)")}
+        if 'record_version' not in columns:
+            # Caches written before records were versioned; their records are all stale
+            self._db.execute("ALTER TABLE pages ADD COLUMN record_version TEXT")
+        self._db.commit()
+        self._writes = 0
+        self.evict()
+
+    def _wrote(self):
+        # Commit in batches so an interrupted run keeps most of what it cached
+        self._writes += 1
+        if self._writes % 50 == 0:
+            self._db.commit()
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        key = canonical_url(url)
+        row = self._db.execute(
+            "SELECT etag, last_modified, content_hash, body, record, fetched_at, record_version FROM pages WHERE url = ?",
+            (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, hash_, body, record, fetched_at, record_version = row
+        if time.time() - fetched_at > self.ttl_seconds:
+            self._db.execute("DELETE FROM pages WHERE url = ?", (key,))
+            self.stats['evicted'] += 1
+            return None
+        self._db.execute("UPDATE pages SET accessed_at = ? WHERE url = ?", (time.time(), key))
+        if record and record_version != self.record_version:
+            self.stats['stale_records'] += 1
+            record = None
+        return CacheEntry(
+            key, etag, last_modified, hash_,
+            zlib.decompress(body).decode('utf-8') if body else None,
+            json.loads(record) if record else None,
+        )
+
+    def conditional_headers(self, entry: Optional[CacheEntry]) -> Dict[str, str]:
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def put(self, url: str, html: str, hash_: str, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        """Store a freshly fetched body; any previously parsed record is dropped"""
+        body = zlib.compress(html.encode('utf-8'), 6)
+        now = time.time()
+        self._db.execute(
+            "INSERT OR REPLACE INTO pages (url, etag, last_modified, content_hash, body, record, size, fetched_at, "
+            "accessed_at) VALUES (?, ?, ?, ?, ?, NULL, ?, ?, ?)",
+            (canonical_url(url), etag, last_modified, hash_, body, len(body), now, now),
+        )
+        self._wrote()
+
+    def touch(self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        """Mark an entry as revalidated, restarting its TTL"""
+        self._db.execute(
+            "UPDATE pages SET fetched_at = ?, etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) "
+            "WHERE url = ?",
+            (time.time(), etag, last_modified, canonical_url(url)),
+        )
+        self._wrote()
+
+    def store_record(self, url: str, record: Dict):
+        """Attach the record parsed from the cached body so unchanged pages skip parsing"""
+        self._db.execute("UPDATE pages SET record = ?, record_version = ? WHERE url = ?",
+                         (json.dumps(record, ensure_ascii=False), self.record_version, canonical_url(url)))
+        self._wrote()
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until under max_bytes"""
+        cur = self._db.execute("DELETE FROM pages WHERE fetched_at < ?", (time.time() - self.ttl_seconds,))
+        evicted = cur.rowcount
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total > self.max_bytes:
+            for url, size in self._db.execute("SELECT url, size FROM pages ORDER BY accessed_at").fetchall():
+                if total <= self.max_bytes:
+                    break
+                self._db.execute("DELETE FROM pages WHERE url = ?", (url,))
+                total -= size
+                evicted += 1
+        self._db.commit()
+        self.stats['evicted'] += evicted
+
+    def close(self):
+        self.evict()
+        self._db.close()
+
+    def summary(self) -> str:
+        s = self.stats
+        return (f"cache hits: {s['hits']} ({s['revalidated']} via 304), misses: {s['misses']}, "
+                f"changed: {s['changed']}, evicted: {s['evicted']}, "
+                f"re-parsed after a parser change: {s['stale_records']}")
@@ -0,0 +1,188 @@
+"""
+Columnar snapshots of the clinic export and change sets between runs
+
+Every complete run's CSV is written as a Parquet snapshot keyed and sorted by
+clinic URL. The new snapshot is compared with the previous one, and a compact
+change set lists the added clinics, the removed URLs and, for clinics present
+in both, only the fields that changed (phone, email, doctors, ...). Clinics
+whose fetch failed in this run keep their previous row instead of showing up
+as removed.
+Downstream loaders can apply the change set instead of diffing whole files.
+
+pyarrow is optional. Without it, snapshots are kept as CSV copies so change
+sets still work.
+"""
+
+import csv
+import json
+import logging
+import os
+import shutil
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Snapshots fall back to CSV
+    pa = None  # type: ignore
+    pq = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+PYARROW_AVAILABLE = pa is not None
+
+KEY_FIELD = 'url'
+
+
+def read_csv_records(path: str) -> Dict[str, Dict[str, str]]:
+    """Rows of a clinic CSV keyed by URL; the first row wins for duplicate URLs"""
+    records: Dict[str, Dict[str, str]] = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            url = row.get(KEY_FIELD)
+            if url and url not in records:
+                records[url] = row
+    return records
+
+
+def read_parquet_records(path: str) -> Dict[str, Dict[str, str]]:
+    table = pq.read_table(path)
+    return {row[KEY_FIELD]: row for row in table.to_pylist()}
+
+
+def write_csv_records(records: Dict[str, Dict[str, str]], fieldnames: List[str], path: str):
+    """Write records sorted by URL as a clinic CSV"""
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+        writer.writeheader()
+        for url in sorted(records):
+            writer.writerow(records[url])
+    os.replace(tmp, path)
+
+
+def write_parquet_records(records: Dict[str, Dict[str, str]], fieldnames: List[str], path: str):
+    """Write records sorted by URL with one string column per field"""
+    columns = {name: [] for name in fieldnames}
+    for url in sorted(records):
+        row = records[url]
+        for name in fieldnames:
+            value = row.get(name)
+            columns[name].append(None if value is None else str(value))
+    table = pa.table({name: pa.array(values, type=pa.string()) for name, values in columns.items()})
+    tmp = f'{path}.tmp'
+    pq.write_table(table, tmp, compression='zstd')
+    os.replace(tmp, path)
+
+
+def diff_records(previous: Dict[str, Dict[str, str]], current: Dict[str, Dict[str, str]],
+                 fieldnames: List[str]) -> Dict:
+    """Added records, removed URLs and per-field changes between two snapshots"""
+    added = [current[url] for url in sorted(current.keys() - previous.keys())]
+    removed = sorted(previous.keys() - current.keys())
+    changed = []
+    for url in sorted(current.keys() & previous.keys()):
+        old, new = previous[url], current[url]
+        fields = {
+            name: {'old': old.get(name), 'new': new.get(name)}
+            for name in fieldnames
+            if name != KEY_FIELD and (old.get(name) or '') != (new.get(name) or '')
+        }
+        if fields:
+            changed.append({KEY_FIELD: url, 'fields': fields})
+    return {
+        'counts': {'added': len(added), 'removed': len(removed), 'changed': len(changed),
+                   'unchanged': len(current) - len(added) - len(changed)},
+        'added': added,
+        'removed': removed,
+        'changed': changed,
+    }
+
+
+class SnapshotExporter:
+    """
+    Keeps `latest.parquet` (or `latest.csv` without pyarrow) in export_dir plus
+    timestamped snapshots and change sets:
+
+      clinics-<stamp>.parquet   full snapshot of this run
+      changes-<stamp>.json      delta against the previous snapshot
+      changes-latest.json       copy of the most recent change set
+    """
+
+    def __init__(self, export_dir: str, fieldnames: List[str], keep: int = 8):
+        self.export_dir = export_dir
+        self.fieldnames = fieldnames
+        # Timestamped snapshots/change sets to retain; latest.* is always kept
+        self.keep = keep
+        self.extension = 'parquet' if PYARROW_AVAILABLE else 'csv'
+        if not PYARROW_AVAILABLE:
+            logger.warning("pyarrow not installed - snapshots are stored as CSV (pip install pyarrow)")
+
+    @property
+    def latest_path(self) -> str:
+        return os.path.join(self.export_dir, f'latest.{self.extension}')
+
+    def _load_previous(self) -> Optional[Dict[str, Dict[str, str]]]:
+        parquet = os.path.join(self.export_dir, 'latest.parquet')
+        if PYARROW_AVAILABLE and os.path.exists(parquet):
+            return read_parquet_records(parquet)
+        fallback = os.path.join(self.export_dir, 'latest.csv')
+        if os.path.exists(fallback):
+            return read_csv_records(fallback)
+        return None
+
+    def _write_snapshot(self, records: Dict[str, Dict[str, str]], path: str):
+        if PYARROW_AVAILABLE:
+            write_parquet_records(records, self.fieldnames, path)
+        else:
+            write_csv_records(records, self.fieldnames, path)
+
+    def export(self, csv_path: str, failed_urls: Iterable[str] = ()) -> Dict:
+        """
+        Snapshot csv_path and return (and write) its change set against the
+        previous snapshot. failed_urls are clinics this run could not fetch;
+        their previous rows are carried into the snapshot unchanged.
+        """
+        os.makedirs(self.export_dir, exist_ok=True)
+        current = read_csv_records(csv_path)
+        previous = self._load_previous()
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+
+        carried = sorted(url for url in set(failed_urls)
+                         if url not in current and previous is not None and url in previous)
+        for url in carried:
+            current[url] = previous[url]
+
+        changes = diff_records(previous or {}, current, self.fieldnames)
+        changes = {
+            'generated_at': stamp,
+            'baseline': previous is None,
+            'total': len(current),
+            'carried_forward': carried,
+            **changes,
+        }
+
+        snapshot_path = os.path.join(self.export_dir, f'clinics-{stamp}.{self.extension}')
+        self._write_snapshot(current, snapshot_path)
+        shutil.copyfile(snapshot_path, self.latest_path)
+
+        changes_path = os.path.join(self.export_dir, f'changes-{stamp}.json')
+        with open(changes_path, 'w', encoding='utf-8') as f:
+            json.dump(changes, f, ensure_ascii=False, indent=2)
+        shutil.copyfile(changes_path, os.path.join(self.export_dir, 'changes-latest.json'))
+        self._prune()
+
+        counts = changes['counts']
+        logger.info(f"Snapshot {snapshot_path}: {len(current)} clinics"
+                    + (" (baseline)" if previous is None else
+                       f"; {counts['added']} added, {counts['removed']} removed, {counts['changed']} changed")
+                    + (f"; {len(carried)} failed clinics kept from the previous snapshot" if carried else ""))
+        return changes
+
+    def _prune(self):
+        for prefix in ('clinics-', 'changes-'):
+            names = sorted(n for n in os.listdir(self.export_dir)
+                           if n.startswith(prefix) and n != 'changes-latest.json')
+            for name in names[:-self.keep] if self.keep > 0 else []:
+                os.remove(os.path.join(self.export_dir, name))
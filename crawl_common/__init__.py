@@ -0,0 +1,3 @@
+"""
+Helpers shared by the Python crawlers (crawl4ai/gp_clinic_scraper and healthify/scripts)
+"""
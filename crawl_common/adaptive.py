@@ -0,0 +1,183 @@
+"""
+AIMD concurrency control for crawlers
+
+AdaptiveConcurrency gates in-flight requests behind a limit that follows what
+the origin can handle. Each healthy response raises the limit by about one
+request per window of successes (additive increase). Signs of an overloaded
+origin - a 429, 502, 503 or 504, a timeout or a connection error - cut the
+limit multiplicatively (at most once per cooldown, so one burst of errors
+counts once). Other failures, such as a 404 or a page that fails to parse,
+say nothing about load and leave the limit alone. The limit always stays between the floor
+and the ceiling. While smoothed latency is more than `latency_tolerance` times
+the best seen, the limit holds instead of growing.
+
+    controller = AdaptiveConcurrency(initial=4, floor=1, ceiling=16)
+    async with controller.slot() as slot:
+        result = await crawler.arun(url)
+        slot.record(result.success, result.status_code, result.error_message)
+"""
+
+import asyncio
+import contextlib
+import logging
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, Optional
+
+logger = logging.getLogger(__name__)
+
+
+BACKOFF_STATUSES = frozenset({429, 502, 503, 504})
+
+_TIMEOUT_MARKERS = ('timeout', 'timed out', 'timed_out')
+# aiohttp connector/disconnect errors, OS socket errors and Chromium net::ERR_* codes
+_CONNECTION_MARKERS = ('connection', 'cannot connect', 'disconnected', 'err_network', 'err_name_not_resolved')
+
+
+def backoff_reason(success: bool, status_code: Optional[int] = None, error: str = '') -> Optional[str]:
+    """
+    Why a response means the origin is struggling ('429', '503', 'timeout',
+    'connection'), else None. Failures that are not about load (404s, parse
+    errors, ...) return None.
+    """
+    if status_code in BACKOFF_STATUSES:
+        return str(status_code)
+    error = (error or '').lower()
+    if any(marker in error for marker in _TIMEOUT_MARKERS):
+        return 'timeout'
+    if not success and any(marker in error for marker in _CONNECTION_MARKERS):
+        return 'connection'
+    return None
+
+
+def exception_reason(exc: BaseException) -> Optional[str]:
+    """backoff_reason() for an exception raised while making a request"""
+    if isinstance(exc, asyncio.TimeoutError):
+        return 'timeout'
+    if isinstance(exc, ConnectionError):
+        return 'connection'
+    return backoff_reason(False, None, f"{type(exc).__name__}: {exc}")
+
+
+class _Slot:
+    """One admitted request; unrecorded requests count as healthy unless they raise"""
+
+    def __init__(self, waited: float):
+        self.waited = waited
+        self.started = time.perf_counter()
+        self.latency: Optional[float] = None
+        self.reason: Optional[str] = None
+
+    def record(self, success: bool, status_code: Optional[int] = None, error: str = '',
+               latency: Optional[float] = None):
+        """latency defaults to the time since admission; pass it to leave out local waits"""
+        self.reason = backoff_reason(success, status_code, error)
+        self.latency = latency
+
+
+class AdaptiveConcurrency:
+    def __init__(self, initial: int = 4, floor: int = 1, ceiling: int = 16, increase: float = 1.0,
+                 decrease: float = 0.5, latency_tolerance: float = 2.0, cooldown: float = 1.0,
+                 metrics=None):
+        self.floor = max(1, floor)
+        self.ceiling = max(self.floor, ceiling)
+        self.limit = float(min(self.ceiling, max(self.floor, initial)))
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.cooldown = cooldown
+        # Optional crawl_common.metrics.Metrics for backoff counters and wait times
+        self.metrics = metrics
+        self.in_flight = 0
+        self.latency_ewma: Optional[float] = None
+        self.best_latency: Optional[float] = None
+        self.stats = {'increases': 0, 'decreases': 0, 'peak_limit': int(self.limit)}
+        self._last_decrease = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def current_limit(self) -> int:
+        return int(self.limit)
+
+    async def acquire(self) -> float:
+        """Wait for a free slot, returning seconds waited"""
+        start = time.perf_counter()
+        if self.in_flight < self.current_limit and not self._waiters:
+            self.in_flight += 1
+            return 0.0
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as we were cancelled; hand the slot on
+                self.in_flight -= 1
+                self._wake()
+            raise
+        return time.perf_counter() - start
+
+    def release(self, latency: Optional[float] = None, reason: Optional[str] = None):
+        """Free a slot; a reason backs off, a latency without one counts as healthy, neither is neutral"""
+        self.in_flight -= 1
+        if reason:
+            self._on_backoff(reason)
+        elif latency is not None:
+            self._on_success(latency)
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self.in_flight < self.current_limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _on_success(self, latency: float):
+        self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+        if self.best_latency is None or self.latency_ewma < self.best_latency:
+            self.best_latency = self.latency_ewma
+        if self.latency_ewma > self.best_latency * self.latency_tolerance or self.limit >= self.ceiling:
+            return
+        before = self.current_limit
+        self.limit = min(self.ceiling, self.limit + self.increase / self.limit)
+        if self.current_limit > before:
+            self.stats['increases'] += 1
+            self.stats['peak_limit'] = max(self.stats['peak_limit'], self.current_limit)
+            logger.debug(f"Concurrency raised to {self.current_limit}")
+
+    def _on_backoff(self, reason: str):
+        now = time.monotonic()
+        if self.metrics is not None:
+            self.metrics.inc('backoff_signals_total', reason=reason)
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        before = self.current_limit
+        self.limit = max(self.floor, self.limit * self.decrease)
+        if self.current_limit < before:
+            self.stats['decreases'] += 1
+            logger.info(f"Backing off ({reason}): concurrency {before} -> {self.current_limit}")
+
+    @contextlib.asynccontextmanager
+    async def slot(self) -> AsyncIterator[_Slot]:
+        """Admit one request; its latency and recorded outcome drive the limit"""
+        slot = _Slot(await self.acquire())
+        if self.metrics is not None:
+            self.metrics.observe('concurrency_wait_seconds', slot.waited)
+        try:
+            yield slot
+        except asyncio.CancelledError:
+            self.release()
+            raise
+        except Exception as e:
+            self.release(reason=exception_reason(e))
+            raise
+        else:
+            latency = slot.latency if slot.latency is not None else time.perf_counter() - slot.started
+            self.release(latency, slot.reason)
+
+    def summary(self) -> str:
+        s = self.stats
+        return (f"concurrency limit {self.current_limit} (floor {self.floor}, ceiling {self.ceiling}, "
+                f"peak {s['peak_limit']}), {s['increases']} increases, {s['decreases']} decreases")
@@ -0,0 +1,344 @@
+"""
+Packed, compressed JSONL store for crawled documents and their chunks
+
+Records are JSON lines. They are hashed by their first key field (the URL), so
+every chunk of one document lands in the same shard, and they are written to
+a fixed number of shard files in gzip blocks of about `block_bytes`. Each
+block is its own gzip member, which means `zcat shard-03.jsonl.gz` still
+reads a shard as plain JSONL. An append-only index records where each
+record's latest version lives:
+
+  {"key": "https://...\\t3", "shard": 3, "offset": 81920, "length": 20311, "line": 7,
+   "name": "healthify.nz-health-a-z-a-acne-chunk-3.json"}
+
+A later line for the same key supersedes the earlier one, and
+{"key": ..., "deleted": true} removes it. `name` is the file name the record
+had in the old one-file-per-record layout; export() writes that layout back
+out for tools that still expect it. compact() drops superseded and deleted
+records from the shards.
+
+    with DocStore('data/store') as store:
+        store.put(doc, name=safe_filename(doc['url']))
+    for doc in DocStore('data/store').iter_records():
+        ...
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import shutil
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+META_NAME = 'store.json'
+INDEX_NAME = 'index.jsonl'
+STORE_VERSION = 1
+KEY_SEPARATOR = '\t'
+
+
+class StoreEntry:
+    def __init__(self, key: str, shard: int, offset: int, length: int, line: int, name: str = ''):
+        self.key = key
+        self.shard = shard
+        self.offset = offset
+        self.length = length
+        self.line = line
+        self.name = name
+
+
+def shard_name(shard: int) -> str:
+    return f'shard-{shard:02d}.jsonl.gz'
+
+
+def is_store(directory) -> bool:
+    return os.path.exists(os.path.join(directory, META_NAME))
+
+
+class DocStore:
+    def __init__(self, directory, key_fields: Sequence[str] = ('url',), shards: int = 16,
+                 block_bytes: int = 256 * 1024, compresslevel: int = 6):
+        self.directory = str(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        meta_path = os.path.join(self.directory, META_NAME)
+        if os.path.exists(meta_path):
+            # An existing store keeps the layout it was created with
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('version') != STORE_VERSION:
+                raise ValueError(f"{self.directory}: unsupported store version {meta.get('version')}")
+        else:
+            meta = {'version': STORE_VERSION, 'key_fields': list(key_fields), 'shards': shards}
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+        self.key_fields: List[str] = meta['key_fields']
+        self.shards: int = meta['shards']
+        self.block_bytes = block_bytes
+        self.compresslevel = compresslevel
+        self.entries = self._load_index()
+        # Per shard: (key, name, encoded line) not yet written as a block
+        self._pending: Dict[int, List[Tuple[str, str, bytes]]] = {}
+        self._pending_bytes: Dict[int, int] = {}
+        self._pending_keys: Dict[str, bytes] = {}
+        self._shard_files: Dict[int, object] = {}
+        self._blocks: 'OrderedDict[Tuple[int, int], List[bytes]]' = OrderedDict()
+        self._index_file = open(os.path.join(self.directory, INDEX_NAME), 'a', encoding='utf-8')
+
+    # ---- keys ------------------------------------------------------------
+
+    def key(self, *parts) -> str:
+        """Key for the given key-field values, e.g. store.key(url, 3)"""
+        if len(parts) != len(self.key_fields):
+            raise ValueError(f"expected {len(self.key_fields)} key parts ({', '.join(self.key_fields)})")
+        return KEY_SEPARATOR.join(str(p) for p in parts)
+
+    def key_of(self, record: dict) -> str:
+        return self.key(*(record[f] for f in self.key_fields))
+
+    def _shard_for(self, key: str) -> int:
+        return zlib.crc32(key.split(KEY_SEPARATOR, 1)[0].encode('utf-8')) % self.shards
+
+    # ---- index -----------------------------------------------------------
+
+    def _load_index(self) -> Dict[str, StoreEntry]:
+        """Latest live entry per key; entries past a torn shard end are dropped"""
+        entries: Dict[str, StoreEntry] = {}
+        path = os.path.join(self.directory, INDEX_NAME)
+        if not os.path.exists(path):
+            return entries
+        sizes: Dict[int, int] = {}
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    e = json.loads(line)
+                except ValueError:
+                    continue  # torn last line
+                if e.get('deleted'):
+                    entries.pop(e['key'], None)
+                    continue
+                shard = e['shard']
+                if shard not in sizes:
+                    shard_path = os.path.join(self.directory, shard_name(shard))
+                    sizes[shard] = os.path.getsize(shard_path) if os.path.exists(shard_path) else 0
+                if e['offset'] + e['length'] > sizes[shard]:
+                    continue
+                entries[e['key']] = StoreEntry(e['key'], shard, e['offset'], e['length'], e['line'],
+                                               e.get('name', ''))
+        return entries
+
+    # ---- writes ----------------------------------------------------------
+
+    def put(self, record: dict, name: str = '', encoded: Optional[bytes] = None) -> str:
+        """
+        Append a record (replacing any earlier version of its key); returns the key.
+        encoded is the record's JSON line if it was already serialised elsewhere.
+        """
+        key = self.key_of(record)
+        line = encoded if encoded is not None else json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+        self._discard_pending(key)
+        shard = self._shard_for(key)
+        self._pending.setdefault(shard, []).append((key, name, line))
+        self._pending_keys[key] = line
+        self._pending_bytes[shard] = self._pending_bytes.get(shard, 0) + len(line)
+        if self._pending_bytes[shard] >= self.block_bytes:
+            self._write_block(shard)
+        return key
+
+    def delete(self, key: str) -> bool:
+        """Remove a key; returns False if it was not stored"""
+        pending = self._discard_pending(key)
+        if key not in self.entries:
+            return pending
+        del self.entries[key]
+        self._index_file.write(json.dumps({'key': key, 'deleted': True}, ensure_ascii=False) + '\n')
+        return True
+
+    def _discard_pending(self, key: str) -> bool:
+        if key not in self._pending_keys:
+            return False
+        del self._pending_keys[key]
+        shard = self._shard_for(key)
+        kept = [item for item in self._pending[shard] if item[0] != key]
+        self._pending[shard] = kept
+        self._pending_bytes[shard] = sum(len(item[2]) for item in kept)
+        return True
+
+    def _shard_file(self, shard: int):
+        f = self._shard_files.get(shard)
+        if f is None:
+            f = self._shard_files[shard] = open(os.path.join(self.directory, shard_name(shard)), 'ab')
+        return f
+
+    def _write_block(self, shard: int):
+        items = self._pending.pop(shard, [])
+        self._pending_bytes.pop(shard, None)
+        if not items:
+            return
+        blob = gzip.compress(b''.join(item[2] for item in items), compresslevel=self.compresslevel, mtime=0)
+        f = self._shard_file(shard)
+        offset = f.tell()
+        f.write(blob)
+        # Index lines must never reach disk before the block they point at
+        f.flush()
+        for line_no, (key, name, _) in enumerate(items):
+            entry = StoreEntry(key, shard, offset, len(blob), line_no, name)
+            self._index_file.write(json.dumps({
+                'key': key, 'shard': shard, 'offset': offset, 'length': len(blob), 'line': line_no,
+                **({'name': name} if name else {}),
+            }, ensure_ascii=False) + '\n')
+            self.entries[key] = entry
+            self._pending_keys.pop(key, None)
+        self._index_file.flush()
+
+    def flush(self):
+        for shard in list(self._pending):
+            self._write_block(shard)
+        self._index_file.flush()
+
+    def close(self):
+        if self._index_file.closed:
+            return
+        self.flush()
+        for f in self._shard_files.values():
+            os.fsync(f.fileno())
+            f.close()
+        self._shard_files = {}
+        os.fsync(self._index_file.fileno())
+        self._index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---- reads -----------------------------------------------------------
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._pending_keys or key in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries) + sum(1 for k in self._pending_keys if k not in self.entries)
+
+    def keys(self) -> List[str]:
+        return list(self.entries) + [k for k in self._pending_keys if k not in self.entries]
+
+    def name_of(self, key: str) -> str:
+        entry = self.entries.get(key)
+        return entry.name if entry is not None else ''
+
+    def _read_block(self, shard: int, offset: int, length: int) -> List[bytes]:
+        cache_key = (shard, offset)
+        lines = self._blocks.get(cache_key)
+        if lines is not None:
+            self._blocks.move_to_end(cache_key)
+            return lines
+        f = self._shard_files.get(shard)
+        if f is not None:
+            f.flush()
+        with open(os.path.join(self.directory, shard_name(shard)), 'rb') as src:
+            src.seek(offset)
+            lines = gzip.decompress(src.read(length)).splitlines()
+        self._blocks[cache_key] = lines
+        # A few recent blocks cover reading every chunk of one document in turn
+        if len(self._blocks) > 8:
+            self._blocks.popitem(last=False)
+        return lines
+
+    def get(self, key: str) -> Optional[dict]:
+        line = self._pending_keys.get(key)
+        if line is not None:
+            return json.loads(line)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        return json.loads(self._read_block(entry.shard, entry.offset, entry.length)[entry.line])
+
+    def iter_entries(self) -> Iterator[Tuple[StoreEntry, dict]]:
+        """(entry, record) for every live record, one block decompressed at a time"""
+        self.flush()
+        blocks: Dict[Tuple[int, int], List[StoreEntry]] = {}
+        for entry in self.entries.values():
+            blocks.setdefault((entry.shard, entry.offset), []).append(entry)
+        for shard, offset in sorted(blocks):
+            entries = sorted(blocks[(shard, offset)], key=lambda e: e.line)
+            with open(os.path.join(self.directory, shard_name(shard)), 'rb') as src:
+                src.seek(offset)
+                lines = gzip.decompress(src.read(entries[0].length)).splitlines()
+            for entry in entries:
+                yield entry, json.loads(lines[entry.line])
+
+    def iter_records(self) -> Iterator[dict]:
+        for _, record in self.iter_entries():
+            yield record
+
+    # ---- maintenance -----------------------------------------------------
+
+    def export(self, out_dir, indent: Optional[int] = 2) -> int:
+        """Write every record to out_dir/<name> (the one-file-per-record layout); returns files written"""
+        os.makedirs(out_dir, exist_ok=True)
+        written = 0
+        for entry, record in self.iter_entries():
+            name = entry.name or (entry.key.replace('://', '-').replace('/', '-').replace(KEY_SEPARATOR, '-')
+                                  + '.json')
+            with open(os.path.join(out_dir, name), 'w', encoding='utf-8') as f:
+                json.dump(record, f, ensure_ascii=False, indent=indent)
+            written += 1
+        return written
+
+    def stats(self) -> Dict[str, int]:
+        self.flush()
+        shard_bytes = sum(os.path.getsize(os.path.join(self.directory, shard_name(s)))
+                          for s in range(self.shards)
+                          if os.path.exists(os.path.join(self.directory, shard_name(s))))
+        live_blocks = {(e.shard, e.offset): e.length for e in self.entries.values()}
+        return {'records': len(self.entries), 'bytes': shard_bytes,
+                'live_bytes': sum(live_blocks.values()), 'blocks': len(live_blocks)}
+
+    def compact(self):
+        """Rewrite the store with only live records; the directory is swapped in at the end"""
+        staging = self.directory.rstrip('/\\') + '.compact'
+        if os.path.exists(staging):
+            shutil.rmtree(staging)
+        with DocStore(staging, self.key_fields, self.shards, self.block_bytes, self.compresslevel) as fresh:
+            for entry, record in self.iter_entries():
+                fresh.put(record, name=entry.name)
+        self.close()
+        retired = self.directory.rstrip('/\\') + '.old'
+        os.replace(self.directory, retired)
+        os.replace(staging, self.directory)
+        shutil.rmtree(retired)
+        self.__init__(self.directory, self.key_fields, self.shards, self.block_bytes, self.compresslevel)
+
+    def summary(self) -> str:
+        s = self.stats()
+        dead = 1 - s['live_bytes'] / s['bytes'] if s['bytes'] else 0.0
+        return (f"{s['records']} records in {self.shards} shards, {s['bytes'] / 1e6:.1f} MB "
+                f"({dead:.0%} superseded) at {self.directory}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Inspect, export or compact a packed document store")
+    parser.add_argument('command', choices=['stats', 'export', 'compact'])
+    parser.add_argument('store', help="Store directory")
+    parser.add_argument('out_dir', nargs='?', help="export: directory for the one-file-per-record layout")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    if not is_store(args.store):
+        parser.error(f"{args.store} is not a document store")
+    store = DocStore(args.store)
+    if args.command == 'export':
+        if not args.out_dir:
+            parser.error("export needs an output directory")
+        logger.info(f"Exported {store.export(args.out_dir)} files to {args.out_dir}")
+    elif args.command == 'compact':
+        store.compact()
+        logger.info(store.summary())
+    else:
+        logger.info(store.summary())
+    store.close()
@@ -0,0 +1,259 @@
+"""
+Per-stage timing and throughput instrumentation for crawl runs
+
+A Metrics registry holds histograms (fetch latency, parse time, rate-limit
+wait, write time, ...) and counters (retries, failures, cache hits, ...).
+Snapshots can be appended to a JSONL file or written as a Prometheus
+textfile-collector file, either periodically during a run or once at the end.
+profiling() wraps a run with optional cProfile and tracemalloc.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import cProfile
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from typing import Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers sub-millisecond parses through multi-second browser renders
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative-bucket histogram with count, sum, min and max"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by interpolating inside the bucket that contains it"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, n in enumerate(self.counts):
+            upper = self.buckets[i] if i < len(self.buckets) else self.max
+            if seen + n >= rank and n:
+                return min(self.max, lower + (upper - lower) * (rank - seen) / n)
+            seen += n
+            lower = upper
+        return self.max
+
+    def snapshot(self) -> Dict:
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6) if self.count else 0.0,
+            'min': round(self.min, 6) if self.count else 0.0,
+            'max': round(self.max, 6),
+            'p50': round(self.quantile(0.5), 6),
+            'p95': round(self.quantile(0.95), 6),
+            'p99': round(self.quantile(0.99), 6),
+        }
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+
+class Metrics:
+    """Thread-safe registry of labelled histograms and counters"""
+
+    def __init__(self, prefix: str = 'crawler'):
+        self.prefix = prefix
+        self.started = time.time()
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float, **labels):
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            key = _label_key(labels)
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram()
+            hist.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + amount
+
+    @contextlib.contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """Observe the wall time of the with-block in histogram `name`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            elapsed = time.time() - self.started
+            return {
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'elapsed_s': round(elapsed, 3),
+                'histograms': {
+                    name: [dict(labels=dict(key), **hist.snapshot()) for key, hist in series.items()]
+                    for name, series in self._histograms.items()
+                },
+                'counters': {
+                    name: [{'labels': dict(key), 'value': value} for key, value in series.items()]
+                    for name, series in self._counters.items()
+                },
+            }
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._histograms.items()):
+                metric = f'{self.prefix}_{name}'
+                lines.append(f'# TYPE {metric} histogram')
+                for key, hist in series.items():
+                    cumulative = 0
+                    for bound, n in zip(hist.buckets + ('+Inf',), hist.counts):
+                        cumulative += n
+                        lines.append(f'{metric}_bucket{_format_labels(key, ("le", str(bound)))} {cumulative}')
+                    lines.append(f'{metric}_sum{_format_labels(key)} {hist.sum}')
+                    lines.append(f'{metric}_count{_format_labels(key)} {hist.count}')
+            for name, series in sorted(self._counters.items()):
+                metric = f'{self.prefix}_{name}'
+                lines.append(f'# TYPE {metric} counter')
+                for key, value in series.items():
+                    lines.append(f'{metric}{_format_labels(key)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write_json_snapshot(self, path: str):
+        """Append one snapshot line to a JSONL file"""
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(self.snapshot()) + '\n')
+
+    def write_prometheus(self, path: str):
+        """Atomically replace a node_exporter textfile-collector file"""
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp, path)
+
+    def summary(self) -> str:
+        """One line per histogram for the end-of-run log"""
+        lines = []
+        snap = self.snapshot()
+        for name, series in snap['histograms'].items():
+            for s in series:
+                labels = ','.join(f'{k}={v}' for k, v in s['labels'].items())
+                lines.append(f"{name}{'[' + labels + ']' if labels else ''}: n={s['count']} "
+                             f"p50={s['p50'] * 1000:.1f}ms p95={s['p95'] * 1000:.1f}ms max={s['max'] * 1000:.1f}ms")
+        for name, series in snap['counters'].items():
+            for c in series:
+                labels = ','.join(f'{k}={v}' for k, v in c['labels'].items())
+                lines.append(f"{name}{'[' + labels + ']' if labels else ''}: {c['value']:g}")
+        return '\n'.join(lines)
+
+
+class MetricsReporter:
+    """Writes JSON and/or Prometheus snapshots every `interval` seconds and once on stop"""
+
+    def __init__(self, metrics: Metrics, json_path: Optional[str] = None, prom_path: Optional[str] = None,
+                 interval: float = 30.0):
+        self.metrics = metrics
+        self.json_path = json_path
+        self.prom_path = prom_path
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def emit(self):
+        try:
+            if self.json_path:
+                self.metrics.write_json_snapshot(self.json_path)
+            if self.prom_path:
+                self.metrics.write_prometheus(self.prom_path)
+        except OSError as e:
+            logger.warning(f"Failed to write metrics snapshot: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.emit()
+
+    async def __aenter__(self):
+        if (self.json_path or self.prom_path) and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        self.emit()
+
+
+@contextlib.contextmanager
+def profiling(cprofile_path: Optional[str] = None, tracemalloc_top: int = 0) -> Iterator[None]:
+    """Optionally run the block under cProfile (stats dumped to a file) and tracemalloc"""
+    profiler = cProfile.Profile() if cprofile_path else None
+    if tracemalloc_top:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(cprofile_path)
+            logger.info(f"cProfile stats written to {cprofile_path}; top functions by cumulative time:")
+            stats = pstats.Stats(profiler).sort_stats('cumulative')
+            stats.print_stats(15)
+        if tracemalloc_top:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            logger.info(f"tracemalloc: current {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB; top allocations:")
+            for stat in snapshot.statistics('lineno')[:tracemalloc_top]:
+                logger.info(f"  {stat}")
+
+
+def add_metrics_arguments(parser: argparse.ArgumentParser):
+    group = parser.add_argument_group('instrumentation')
+    group.add_argument('--metrics-json', help="Append periodic JSON metric snapshots to this JSONL file")
+    group.add_argument('--metrics-prom', help="Write Prometheus textfile-collector metrics to this file")
+    group.add_argument('--metrics-interval', type=float, default=30.0, help="Seconds between metric snapshots")
+    group.add_argument('--profile', metavar='PATH', help="Run under cProfile and dump stats to PATH")
+    group.add_argument('--tracemalloc', type=int, default=0, metavar='N',
+                       help="Trace allocations and log the top N sites at the end")
@@ -0,0 +1,161 @@
+"""
+Retry budgets, exponential backoff and hedged requests for crawlers
+
+RetryPolicy decides whether a classified failure is worth another attempt and
+how long to back off first (exponential with full jitter). Every first attempt
+deposits `budget_ratio` tokens into a shared budget and every retry spends
+one, so a broken origin cannot turn into a retry storm: at most about 20% of
+requests are retries once the initial allowance is used up.
+
+hedged() protects against the latency tail. It starts an attempt, and if
+the attempt has not finished after `delay` seconds (usually a recent p95
+latency from LatencyTracker), it starts a duplicate. Whichever succeeds
+first wins and the other is cancelled. HedgeBudget caps duplicates to a
+fraction of requests.
+
+    policy = RetryPolicy(max_attempts=4)
+    latencies = LatencyTracker(quantile=0.95)
+    result, hedge_won = await hedged(lambda: fetch(url), latencies.threshold())
+"""
+
+import asyncio
+import random
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, Tuple, TypeVar, Union
+
+T = TypeVar('T')
+
+
+class _TokenBudget:
+    def __init__(self, ratio: float, initial: float):
+        self.ratio = ratio
+        self.tokens = initial
+        # A long healthy run banks at most what another 100 requests would earn
+        self.cap = initial + 100 * ratio
+        self.spent = 0
+
+    def deposit(self):
+        self.tokens = min(self.cap, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        self.spent += 1
+        return True
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int = 4, base_delay: float = 1.0, max_delay: float = 30.0,
+                 budget_ratio: float = 0.2, min_budget: float = 10.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._budget = _TokenBudget(budget_ratio, min_budget)
+        self.stats = {'retries': 0, 'exhausted': 0, 'budget_denied': 0}
+
+    def record_attempt(self):
+        """Call once per first attempt; it funds later retries"""
+        self._budget.deposit()
+
+    def should_retry(self, attempt: int, retryable: bool) -> bool:
+        """attempt is the number of attempts made so far"""
+        if not retryable:
+            return False
+        if attempt >= self.max_attempts:
+            self.stats['exhausted'] += 1
+            return False
+        if not self._budget.withdraw():
+            self.stats['budget_denied'] += 1
+            return False
+        self.stats['retries'] += 1
+        return True
+
+    def delay(self, attempt: int) -> float:
+        """Full-jitter exponential backoff before attempt + 1"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def summary(self) -> str:
+        s = self.stats
+        return f"{s['retries']} retries, {s['exhausted']} gave up after {self.max_attempts} attempts, " \
+               f"{s['budget_denied']} denied by the retry budget"
+
+
+class LatencyTracker:
+    """Rolling window of successful request latencies"""
+
+    def __init__(self, quantile: float = 0.95, window: int = 200, min_samples: int = 20,
+                 floor: float = 0.5):
+        self.quantile = quantile
+        self.min_samples = min_samples
+        # Never hedge sooner than this, however fast recent requests were
+        self.floor = floor
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+
+    def threshold(self) -> Optional[float]:
+        """Latency past which to hedge, or None until enough samples are in"""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return max(self.floor, ordered[min(len(ordered) - 1, int(self.quantile * len(ordered)))])
+
+
+class HedgeBudget(_TokenBudget):
+    """Allows about `ratio` hedges per request (10% by default)"""
+
+    def __init__(self, ratio: float = 0.1, initial: float = 2.0):
+        super().__init__(ratio, initial)
+
+
+async def hedged(attempt: Callable[[], Awaitable[T]],
+                 delay: Union[None, float, Callable[[], Optional[float]]],
+                 budget: Optional[HedgeBudget] = None,
+                 ready: Optional[Callable[[], bool]] = None,
+                 started: Optional[asyncio.Event] = None) -> Tuple[T, bool]:
+    """
+    Run attempt(); if it is still running after `delay` seconds (and the budget
+    allows), race a second attempt(). Returns (first successful result, whether
+    the hedge produced it). If both fail, the primary's error is raised.
+
+    delay may be a callable, evaluated when the clock starts: immediately, or
+    once `started` is set (e.g. when the primary is admitted past a concurrency
+    limit, so time spent queueing does not count). ready() is checked when the
+    delay expires; False skips the hedge (e.g. no spare concurrency, so the
+    duplicate would only queue).
+    """
+    if budget is not None:
+        budget.deposit()
+    primary = asyncio.ensure_future(attempt())
+    tasks = [primary]
+    try:
+        if started is not None:
+            waiter = asyncio.ensure_future(started.wait())
+            tasks.append(waiter)
+            await asyncio.wait({primary, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            tasks.remove(waiter)
+            waiter.cancel()
+        if callable(delay):
+            delay = delay()
+        if delay is None or primary.done():
+            return await primary, False
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done or (ready is not None and not ready()) or (budget is not None and not budget.withdraw()):
+            return await primary, False
+        hedge = asyncio.ensure_future(attempt())
+        tasks.append(hedge)
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), task is hedge
+        return primary.result(), False  # raises the primary's error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception()  # mark a losing attempt's error as retrieved
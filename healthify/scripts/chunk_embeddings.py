@@ -0,0 +1,201 @@
+"""
+Embedding layer for semantic_chunk_healthify.py
+
+CachedEmbedding sits between SemanticSplitterNodeParser and the real model.
+- Vectors are cached on disk (SQLite) by model name plus a SHA-256 of the
+  text. The least recently used entries are evicted once the cache grows
+  past its size limit.
+- prefetch() embeds the sentence groups of many documents in a few large
+  requests, so the per-document split that follows is served entirely from
+  the cache.
+- Vectors are always rounded to float32, the precision they are cached at,
+  so cold and warm runs split identically.
+
+HashEmbedding is a deterministic local stand-in model (signed feature hashing
+of words and word pairs). It needs no network and gives repeatable results.
+"""
+
+import hashlib
+import re
+import sqlite3
+import time
+from array import array
+from pathlib import Path
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from pydantic import PrivateAttr
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def _float32(vector) -> list[float]:
+    return array("f", vector).tolist()
+
+
+class HashEmbedding(BaseEmbedding):
+    """Deterministic offline embedding: hashed unigrams and bigrams, L2-normalised"""
+
+    dim: int = 256
+
+    def __init__(self, dim: int = 256, **kwargs):
+        super().__init__(model_name=f"local-hash-{dim}", dim=dim, **kwargs)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "HashEmbedding"
+
+    def _embed(self, text: str) -> list[float]:
+        vector = [0.0] * self.dim
+        words = WORD_PATTERN.findall(text.lower())
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[h % self.dim] += 1.0 if (h >> 63) & 1 else -1.0
+        norm = sum(v * v for v in vector) ** 0.5
+        return [v / norm for v in vector] if norm else vector
+
+    def _get_text_embedding(self, text: str) -> list[float]:
+        return self._embed(text)
+
+    def _get_query_embedding(self, query: str) -> list[float]:
+        return self._embed(query)
+
+    async def _aget_query_embedding(self, query: str) -> list[float]:
+        return self._embed(query)
+
+
+class EmbeddingCache:
+    """
+    Vectors keyed by sha256(model + text), stored as float32 blobs.
+    path=None keeps the cache in memory for the life of the process.
+    """
+
+    def __init__(self, path: Path | None, max_bytes: int = 1024 * 1024 * 1024):
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        # Chunking workers share one cache file; wait for each other's writes instead of failing
+        self.db = sqlite3.connect(str(path) if path is not None else ":memory:", timeout=60)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings "
+            "(key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self.size = self.db.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+        self.evicted = 0
+
+    @staticmethod
+    def key(model: str, text: str) -> bytes:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).digest()
+
+    def get_many(self, model: str, texts: list[str]) -> dict[str, list[float]]:
+        found: dict[str, list[float]] = {}
+        keys = {self.key(model, t): t for t in texts}
+        key_list = list(keys)
+        # SQLite caps bound parameters per statement
+        for i in range(0, len(key_list), 500):
+            batch = key_list[i:i + 500]
+            rows = self.db.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+            ).fetchall()
+            for key, blob in rows:
+                vector = array("f")
+                vector.frombytes(blob)
+                found[keys[key]] = vector.tolist()
+        if found:
+            now = time.time()
+            self.db.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                [(now, self.key(model, t)) for t in found])
+            # Commit now: an open write transaction would block the other chunking workers
+            self.db.commit()
+        return found
+
+    def put_many(self, model: str, vectors: dict[str, list[float]]) -> None:
+        now = time.time()
+        rows = [(self.key(model, t), array("f", v).tobytes(), now) for t, v in vectors.items()]
+        self.db.executemany("INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows)
+        self.size += sum(len(row[1]) for row in rows)
+        if self.size > self.max_bytes:
+            self._evict()
+        self.db.commit()
+
+    def _evict(self) -> None:
+        """Drop least recently used vectors until the cache is 10% under its limit"""
+        target = self.max_bytes * 0.9
+        while self.size > target:
+            rows = self.db.execute("SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used LIMIT 1000").fetchall()
+            if not rows:
+                break
+            self.db.executemany("DELETE FROM embeddings WHERE key = ?", [(k,) for k, _ in rows])
+            self.size -= sum(n for _, n in rows)
+            self.evicted += len(rows)
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self) -> None:
+        self.db.commit()
+        self.db.close()
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Cache-first wrapper around another embedding model; misses go out in batches"""
+
+    _inner: BaseEmbedding = PrivateAttr()
+    _cache: EmbeddingCache = PrivateAttr()
+    _stats: dict = PrivateAttr()
+
+    def __init__(self, inner: BaseEmbedding, cache: EmbeddingCache, batch_size: int = 1024, **kwargs):
+        super().__init__(model_name=inner.model_name, embed_batch_size=min(batch_size, 2048), **kwargs)
+        inner.embed_batch_size = min(batch_size, 2048)
+        self._inner = inner
+        self._cache = cache
+        self._stats = {"requests": 0, "embedded": 0, "hits": 0}
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def stats(self) -> dict:
+        return dict(self._stats)
+
+    def embed_many(self, texts: list[str]) -> list[list[float]]:
+        vectors = self._cache.get_many(self.model_name, list(dict.fromkeys(texts)))
+        self._stats["hits"] += len(vectors)
+        misses = [t for t in dict.fromkeys(texts) if t not in vectors]
+        if misses:
+            batch_size = self._inner.embed_batch_size
+            fresh = {}
+            for i in range(0, len(misses), batch_size):
+                batch = misses[i:i + batch_size]
+                self._stats["requests"] += 1
+                for text, vector in zip(batch, self._inner.get_text_embedding_batch(batch)):
+                    fresh[text] = _float32(vector)
+            self._stats["embedded"] += len(fresh)
+            self._cache.put_many(self.model_name, fresh)
+            vectors.update(fresh)
+        return [vectors[t] for t in texts]
+
+    def prefetch(self, texts: list[str]) -> None:
+        """Embed and cache texts ahead of the splitter asking for them"""
+        if texts:
+            self.embed_many(texts)
+
+    def _get_text_embeddings(self, texts: list[str]) -> list[list[float]]:
+        return self.embed_many(texts)
+
+    def _get_text_embedding(self, text: str) -> list[float]:
+        return self.embed_many([text])[0]
+
+    def _get_query_embedding(self, query: str) -> list[float]:
+        return self._inner.get_query_embedding(query)
+
+    async def _aget_query_embedding(self, query: str) -> list[float]:
+        return await self._inner.aget_query_embedding(query)
+
+    def summary(self) -> str:
+        s = self._stats
+        return (f"{s['requests']} embedding requests for {s['embedded']} texts, {s['hits']} cache hits, "
+                f"{self._cache.evicted} evicted")
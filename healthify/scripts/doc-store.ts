@@ -0,0 +1,86 @@
+import type { FileHandle } from 'node:fs/promises';
+import fs from 'node:fs/promises';
+import path from 'node:path';
+import { gunzipSync } from 'node:zlib';
+
+// Reader for the packed JSONL store written by crawl_common/docstore.py:
+// shard-NN.jsonl.gz files made of independently gzipped blocks, plus an
+// append-only index.jsonl where the latest line per key wins.
+
+type IndexLine = {
+  key: string;
+  shard?: number;
+  offset?: number;
+  length?: number;
+  line?: number;
+  deleted?: boolean;
+};
+
+type LiveEntry = { shard: number; offset: number; length: number; line: number };
+
+export async function isDocStore(dir: string): Promise<boolean> {
+  try {
+    await fs.access(path.join(dir, 'store.json'));
+    return true;
+  } catch {
+    return false;
+  }
+}
+
+async function readLiveEntries(dir: string): Promise<Map<string, LiveEntry>> {
+  const live = new Map<string, LiveEntry>();
+  const raw = await fs.readFile(path.join(dir, 'index.jsonl'), 'utf8').catch(() => '');
+  for (const text of raw.split('\n')) {
+    if (!text.trim()) {
+      continue;
+    }
+    let e: IndexLine;
+    try {
+      e = JSON.parse(text) as IndexLine;
+    } catch {
+      continue; // torn last line
+    }
+    if (e.deleted) {
+      live.delete(e.key);
+    } else {
+      live.set(e.key, { shard: e.shard!, offset: e.offset!, length: e.length!, line: e.line! });
+    }
+  }
+  return live;
+}
+
+// Streams every live record, decompressing one block at a time
+export async function* readDocStore<T>(dir: string): AsyncGenerator<T> {
+  const blocks = new Map<string, LiveEntry[]>();
+  for (const entry of (await readLiveEntries(dir)).values()) {
+    const id = `${entry.shard}:${entry.offset}`;
+    const list = blocks.get(id);
+    if (list) {
+      list.push(entry);
+    } else {
+      blocks.set(id, [entry]);
+    }
+  }
+  const ordered = [...blocks.values()].sort((a, b) => a[0]!.shard - b[0]!.shard || a[0]!.offset - b[0]!.offset);
+
+  let shard = -1;
+  let handle: FileHandle | null = null;
+  try {
+    for (const entries of ordered) {
+      const first = entries[0]!;
+      if (first.shard !== shard) {
+        await handle?.close();
+        shard = first.shard;
+        handle = await fs.open(path.join(dir, `shard-${String(shard).padStart(2, '0')}.jsonl.gz`), 'r');
+      }
+      const buf = Buffer.alloc(first.length);
+      await handle!.read(buf, 0, first.length, first.offset);
+      const lines = gunzipSync(buf).toString('utf8').split('\n');
+      for (const entry of entries.sort((a, b) => a.line - b.line)) {
+        yield JSON.parse(lines[entry.line]!) as T;
+      }
+    }
+  } finally {
+    await handle?.close();
+  }
+}
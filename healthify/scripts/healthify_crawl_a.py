@@ -1,12 +1,21 @@
+import argparse
 import asyncio
 import hashlib
 import json
+import logging
+import multiprocessing
+import os
 import re
+import string
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from urllib.parse import urljoin, urlparse
-import urllib.request
 
+import aiohttp
 from crawl4ai import (
     AsyncWebCrawler,
     CrawlerRunConfig,
@@ -15,30 +24,99 @@ from crawl4ai import (
     LXMLWebScrapingStrategy,
 )
 
-INDEX_URL = "https://healthify.nz/health-a-z/a"
+# Helpers shared with the GP clinic scraper live in crawl_common/ at the repository root
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from crawl_common.adaptive import AdaptiveConcurrency, backoff_reason
+from crawl_common.docstore import DocStore
+from crawl_common.metrics import Metrics, MetricsReporter, add_metrics_arguments, profiling
+from crawl_common.retry import HedgeBudget, LatencyTracker, RetryPolicy, hedged
+
+INDEX_URL = "https://healthify.nz/health-a-z/{letter}"
+LETTERS = string.ascii_lowercase
 OUTPUT_DIR = Path("data")
-CONCURRENCY = 5
+# Pages are appended to a packed store; --export-files also writes the one-JSON-per-page layout to OUTPUT_DIR
+STORE_DIR = OUTPUT_DIR / "store"
+CONCURRENCY = 5  # starting point; adapts between MIN_CONCURRENCY and MAX_CONCURRENCY
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 16
+# Processes for clean_markdown/serialisation, and store writes allowed to queue before crawl workers wait
+CPU_WORKERS = min(4, os.cpu_count() or 1)
+MAX_PENDING_WRITES = 64
+# Attempts per page (and index) before it is reported as failed; hedge pages slower than this latency quantile
+MAX_ATTEMPTS = 4
+HEDGE_QUANTILE = 0.95
 USER_AGENT = "NexWaveSolutions-HealthifyCrawler/1.0"
 MAX_PAGES = None  # set to an int to cap pages (e.g., 200)
+# Per-URL validators and cleaned-markdown hashes from earlier runs, and this run's change list
+MANIFEST_PATH = Path("crawl_manifest.json")
+CHANGES_PATH = Path("crawl_changes.json")
+
+# Per-stage histograms (fetch, clean, write, concurrency wait) and outcome counters
+METRICS = Metrics(prefix="healthify_crawler")
+
+def parse_letters(value: str) -> str:
+    """'a,b,c', 'abc' or 'all' -> sorted unique lowercase letters"""
+    if value.strip().lower() == "all":
+        return LETTERS
+    letters = {ch for ch in value.lower() if ch not in ", "}
+    invalid = letters - set(LETTERS)
+    if invalid or not letters:
+        raise argparse.ArgumentTypeError(f"letters must be a-z, got {value!r}")
+    return "".join(sorted(letters))
+
+class CrawlFailure(Exception):
+    """A classified fetch failure; kind is 'timeout', 'http', 'empty', 'parse' or 'error'"""
+
+    RETRYABLE_STATUS = {408, 425, 429}
 
-# Simple, dependency-free HTML fetch for the index page
-def fetch_index_html(url: str) -> str:
-    req = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
-    with urllib.request.urlopen(req, timeout=60) as resp:
-        return resp.read().decode("utf-8", errors="ignore")
+    def __init__(self, kind: str, detail: str = "", status: int | None = None):
+        super().__init__(" ".join(str(part) for part in (kind, status, detail) if part))
+        self.kind = kind
+        self.detail = detail
+        self.status = status
 
-# Extract condition links from the A index page; keep only /health-a-z/a/... pages
-def extract_condition_links(index_html: str, base_url: str) -> list[str]:
+    @property
+    def retryable(self) -> bool:
+        # A parse error or a 404 will fail the same way next time
+        if self.kind == "http":
+            return self.status in self.RETRYABLE_STATUS or (self.status or 0) >= 500
+        return self.kind in ("timeout", "empty", "error")
+
+    @classmethod
+    def from_exception(cls, e: Exception) -> "CrawlFailure":
+        if isinstance(e, CrawlFailure):
+            return e
+        timeout = isinstance(e, asyncio.TimeoutError) or backoff_reason(True, None, str(e)) == "timeout"
+        return cls("timeout" if timeout else "error", f"{type(e).__name__}: {e}"[:200])
+
+# Index pages are fetched under the same concurrency budget as the condition pages
+async def fetch_index_html(session: aiohttp.ClientSession, url: str, controller: AdaptiveConcurrency) -> str:
+    try:
+        async with controller.slot() as slot:
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=60)) as resp:
+                html = await resp.text(errors="ignore")
+                slot.record(resp.status < 400, resp.status)
+    except Exception as e:
+        raise CrawlFailure.from_exception(e) from e
+    if resp.status >= 400:
+        raise CrawlFailure("http", status=resp.status)
+    return html
+
+# Extract condition links from one letter's index page; keep only /health-a-z/<letter>/... pages
+def extract_condition_links(index_html: str, base_url: str, letter: str = "a") -> list[str]:
     hrefs = re.findall(r'href=["\'](.*?)["\']', index_html, flags=re.IGNORECASE)
+    pattern = re.compile(
+        r"^https?://(www\.)?healthify\.nz/health-a-z/" + re.escape(letter) + r"/[^?#]+/?$", re.IGNORECASE
+    )
     urls = set()
     for href in hrefs:
         if not href or href.startswith("#") or href.startswith("mailto:"):
             continue
         absolute = urljoin(base_url, href)
-        # Filter strictly to A-section condition pages
-        if re.match(r"^https?://(www\.)?healthify\.nz/health-a-z/a/[^?#]+/?$", absolute, flags=re.IGNORECASE):
-            # exclude index page itself (exact A page)
-            if absolute.rstrip("/").lower() != INDEX_URL.rstrip("/").lower():
+        # Filter strictly to this letter's condition pages
+        if pattern.match(absolute):
+            # exclude index page itself
+            if absolute.rstrip("/").lower() != base_url.rstrip("/").lower():
                 urls.add(absolute.rstrip("/") + "/")
     return sorted(urls)
 
@@ -61,123 +139,426 @@ def infer_letter_and_slug(url: str) -> tuple[str, str]:
     slug = parts[2] if len(parts) >= 3 else (parts[-1] if parts else "index")
     return letter, slug
 
+def markdown_hash(markdown: str) -> str:
+    return hashlib.sha256(markdown.encode("utf-8")).hexdigest()
+
+def response_validators(headers: dict | None) -> dict:
+    """ETag / Last-Modified from response headers, keyed as stored in the manifest"""
+    lower = {str(k).lower(): v for k, v in (headers or {}).items()}
+    found = {}
+    if lower.get("etag"):
+        found["etag"] = lower["etag"]
+    if lower.get("last-modified"):
+        found["lastModified"] = lower["last-modified"]
+    return found
+
+def load_manifest(path: Path = MANIFEST_PATH) -> dict[str, dict]:
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except ValueError as e:
+        print(f"Ignoring unreadable manifest {path}: {e}")
+        return {}
+
+def write_json_atomic(data, path: Path) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+async def check_unchanged(session: aiohttp.ClientSession, url: str, entry: dict,
+                          controller: AdaptiveConcurrency) -> tuple[str | None, str | None, dict]:
+    """
+    Conditional GET with the manifest's validators, as (check, body hash, validators).
+    check is "not_modified" on a 304 and "body_hash" when a 200's HTML hashes to the
+    manifest's bodyHash, so the page is only rendered when its HTML changed; else None.
+    """
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("lastModified"):
+        headers["If-Modified-Since"] = entry["lastModified"]
+    async with controller.slot() as slot:
+        async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=60)) as resp:
+            slot.record(resp.status < 400, resp.status)
+            if resp.status == 304:
+                return "not_modified", None, {}
+            if resp.status != 200:
+                return None, None, {}
+            body_hash = hashlib.sha256(await resp.read()).hexdigest()
+            validators = response_validators(dict(resp.headers))
+    return ("body_hash" if body_hash == entry.get("bodyHash") else None), body_hash, validators
+
+# Cleaning rules, compiled once per process
+BREADCRUMB_PATTERN = re.compile(r"^\s*\d+\.\s*\[.*?\]\(https?://healthify\.nz/.*?\)\s*$", re.I)
+IMAGE_LINE_PATTERN = re.compile(r"^!\[[^\]]*\]\(([^)]*)\)\s*$")
+DROP_EXACT = frozenset({"qr code", "print", "open all close all"})
+
 def clean_markdown(markdown: str, page_url: str) -> str:
     """Remove site chrome noise like breadcrumbs, QR/Print lines, and page-self QR image."""
     lines = markdown.splitlines()
-    cleaned: list[str] = []
 
     # Drop leading breadcrumb list (eg: "1. [Home] ...")
-    import re as _re
-    breadcrumb_pattern = _re.compile(r"^\s*\d+\.\s*\[.*?\]\(https?://healthify\.nz/.*?\)\s*$", _re.I)
     idx = 0
-    while idx < len(lines) and breadcrumb_pattern.match(lines[idx] or ""):
+    while idx < len(lines) and BREADCRUMB_PATTERN.match(lines[idx]):
         idx += 1
     # Skip following blank lines
-    while idx < len(lines) and (lines[idx] or "").strip() == "":
+    while idx < len(lines) and lines[idx].strip() == "":
         idx += 1
 
-    # Process remaining lines
-    page_url_img_pattern = _re.compile(r"^!\[[^\]]*\]\(" + _re.escape(page_url.rstrip("/")) + r"/?\)\s*$", _re.I)
-    drop_exact = {"qr code", "print", "open all close all"}
-    for i in range(idx, len(lines)):
-        raw = lines[i] or ""
-        s = raw.strip().lower()
-        if s in drop_exact:
-            continue
-        if page_url_img_pattern.match(raw):
+    # Process remaining lines; the page's own URL as an image is its QR code
+    page_url = page_url.rstrip("/").lower()
+    cleaned: list[str] = []
+    for raw in lines[idx:]:
+        if raw.strip().lower() in DROP_EXACT:
             continue
-        cleaned.append(lines[i])
+        if raw.startswith("!["):
+            m = IMAGE_LINE_PATTERN.match(raw)
+            if m and m.group(1).lower() in (page_url, page_url + "/"):
+                continue
+        cleaned.append(raw)
 
     return "\n".join(cleaned).strip() + "\n"
 
-async def crawl_one(crawler: AsyncWebCrawler, url: str) -> dict | None:
+def prepare_document(markdown: str, url: str) -> tuple[dict, str, bytes, float]:
+    """Clean, hash and serialise one page: (document, markdown hash, JSON line, seconds). Runs in CPU_WORKERS."""
+    start = time.perf_counter()
+    # Post-process to remove residual chrome (breadcrumbs/QR/Print)
+    markdown = clean_markdown(markdown, url)
+    letter, slug = infer_letter_and_slug(url)
+    doc = {
+        "url": url,
+        "title": slug.replace("-", " ").title(),
+        "markdown": markdown,
+        "metadata": {
+            "source": "healthify",
+            "crawledAt": datetime.utcnow().isoformat() + "Z",
+            "letter": letter.lower(),
+            "slug": slug.lower(),
+        },
+    }
+    line = json.dumps(doc, ensure_ascii=False).encode("utf-8") + b"\n"
+    return doc, markdown_hash(markdown), line, time.perf_counter() - start
+
+class StoreWriter:
+    """
+    Owns the DocStore on one writer thread so compression and disk I/O stay off
+    the event loop. put() returns once the write is queued, and waits while
+    max_pending writes are already queued.
+    """
+
+    def __init__(self, store: DocStore, max_pending: int = MAX_PENDING_WRITES):
+        self.store = store
+        # URLs whose write raised; the caller drops them from the manifest
+        self.failed: list[str] = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="store-writer")
+        self._slots = asyncio.Semaphore(max_pending)
+        self._queued: set[asyncio.Future] = set()
+        self._lock = threading.Lock()
+
+    def _put(self, doc: dict, name: str, line: bytes) -> None:
+        start = time.perf_counter()
+        try:
+            with self._lock:
+                self.store.put(doc, name=name, encoded=line)
+        except Exception as e:
+            self.failed.append(doc["url"])
+            METRICS.inc("failures_total", reason="write")
+            print(f"Store write failed for {doc['url']}: {e}")
+            return
+        METRICS.observe("write_seconds", time.perf_counter() - start)
+
+    def _done(self, future: asyncio.Future) -> None:
+        self._queued.discard(future)
+        self._slots.release()
+
+    async def put(self, doc: dict, name: str, line: bytes) -> None:
+        await self._slots.acquire()
+        future = asyncio.get_running_loop().run_in_executor(self._executor, self._put, doc, name, line)
+        self._queued.add(future)
+        future.add_done_callback(self._done)
+
+    def contains(self, key: str) -> bool:
+        with self._lock:
+            return key in self.store
+
+    async def drain(self) -> None:
+        await asyncio.gather(*list(self._queued), return_exceptions=True)
+
+    def close(self) -> None:
+        """Stop the writer thread; the store stays open for the caller"""
+        self._executor.shutdown(wait=True)
+
+async def crawl_one(crawler: AsyncWebCrawler, url: str, controller: AdaptiveConcurrency,
+                    pool: ProcessPoolExecutor | None = None,
+                    latencies: LatencyTracker | None = None,
+                    admitted: asyncio.Event | None = None) -> tuple[dict, str, bytes, dict]:
+    """(document, markdown hash, JSON line, response validators); raises CrawlFailure"""
     try:
-        result = await crawler.arun(
-            url=url,
-            config=CrawlerRunConfig(
-                cache_mode=CacheMode.BYPASS,
-                # Generate markdown using default generator; library returns a MarkdownGenerationResult
-                markdown_generator=DefaultMarkdownGenerator(),
-                scraping_strategy=LXMLWebScrapingStrategy(),
-                css_selector="#main, main, article",
-                excluded_selector=(
-                    'header, nav, footer, aside, '
-                    'nav[aria-label="breadcrumb"], ol.breadcrumbs, .breadcrumb, [class*="breadcrumb"], '
-                    '.cookie, .ads, .newsletter, '
-                    '.share, .social, .site-header, .site-footer, '
-                    '[class*="qr"], [id*="qr"], .qr, .qr-code, .qrCode, .qr-code-block, '
-                    '[class*="print"], .print, .print-link, a[href*="print"], '
-                    '.open-all, .close-all, [class*="toggle"], [id*="toggle"]'
+        async with controller.slot() as slot:
+            if admitted is not None:
+                admitted.set()
+            start = time.perf_counter()
+            result = await crawler.arun(
+                url=url,
+                config=CrawlerRunConfig(
+                    cache_mode=CacheMode.BYPASS,
+                    # Generate markdown using default generator; library returns a MarkdownGenerationResult
+                    markdown_generator=DefaultMarkdownGenerator(),
+                    scraping_strategy=LXMLWebScrapingStrategy(),
+                    css_selector="#main, main, article",
+                    excluded_selector=(
+                        'header, nav, footer, aside, '
+                        'nav[aria-label="breadcrumb"], ol.breadcrumbs, .breadcrumb, [class*="breadcrumb"], '
+                        '.cookie, .ads, .newsletter, '
+                        '.share, .social, .site-header, .site-footer, '
+                        '[class*="qr"], [id*="qr"], .qr, .qr-code, .qrCode, .qr-code-block, '
+                        '[class*="print"], .print, .print-link, a[href*="print"], '
+                        '.open-all, .close-all, [class*="toggle"], [id*="toggle"]'
+                    ),
+                    exclude_social_media_links=True,
+                    exclude_social_media_domains=[
+                        "facebook.com", "linkedin.com", "instagram.com", "x.com", "twitter.com"
+                    ],
+                    user_agent=USER_AGENT,
+                    verbose=False,
                 ),
-                exclude_social_media_links=True,
-                exclude_social_media_domains=[
-                    "facebook.com", "linkedin.com", "instagram.com", "x.com", "twitter.com"
-                ],
-                user_agent=USER_AGENT,
-                verbose=False,
-            ),
-        )
-        md_obj = getattr(result, "markdown", None)
-        markdown = (
-            getattr(md_obj, "raw_markdown", None)
-            if md_obj is not None
-            else None
-        ) or getattr(result, "cleaned_html", "") or getattr(result, "html", "")
-        if not markdown.strip():
-            return None
-        # Post-process to remove residual chrome (breadcrumbs/QR/Print)
-        markdown = clean_markdown(markdown, url)
-        letter, slug = infer_letter_and_slug(url)
-        return {
-            "url": url,
-            "title": slug.replace("-", " ").title(),
-            "markdown": markdown,
-            "metadata": {
-                "source": "healthify",
-                "crawledAt": datetime.utcnow().isoformat() + "Z",
-                "letter": letter.lower(),
-                "slug": slug.lower(),
-            },
-        }
-    except Exception:
-        return None
-
-async def main():
-    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+            )
+            status = getattr(result, "status_code", None)
+            error = getattr(result, "error_message", "") or ""
+            slot.record(result.success, status, error)
+    except Exception as e:
+        raise CrawlFailure.from_exception(e) from e
+    latency = time.perf_counter() - start
+    METRICS.observe("fetch_seconds", latency)
+    if status is not None and status >= 400:
+        raise CrawlFailure("http", error[:200], status)
+    if not result.success:
+        raise CrawlFailure("timeout" if backoff_reason(False, status, error) == "timeout" else "error", error[:200])
+    if latencies is not None:
+        latencies.observe(latency)
+    md_obj = getattr(result, "markdown", None)
+    markdown = (
+        getattr(md_obj, "raw_markdown", None)
+        if md_obj is not None
+        else None
+    ) or getattr(result, "cleaned_html", "") or getattr(result, "html", "")
+    if not markdown.strip():
+        raise CrawlFailure("empty", "no markdown extracted")
+    try:
+        if pool is None:
+            doc, digest, line, seconds = prepare_document(markdown, url)
+        else:
+            doc, digest, line, seconds = await asyncio.get_running_loop().run_in_executor(
+                pool, prepare_document, markdown, url
+            )
+    except Exception as e:
+        raise CrawlFailure("parse", f"{type(e).__name__}: {e}"[:200]) from e
+    METRICS.observe("parse_seconds", seconds)
+    return doc, digest, line, response_validators(getattr(result, "response_headers", None))
 
-    print("Fetching A-index page…")
-    html = fetch_index_html(INDEX_URL)
-    urls = extract_condition_links(html, INDEX_URL)
-    if MAX_PAGES:
-        urls = urls[:MAX_PAGES]
-    print(f"Discovered {len(urls)} condition pages under A")
+async def main(
+    letters: str = LETTERS,
+    metrics_json: str | None = None,
+    metrics_prom: str | None = None,
+    metrics_interval: float = 30.0,
+    concurrency: int = CONCURRENCY,
+    min_concurrency: int = MIN_CONCURRENCY,
+    max_concurrency: int = MAX_CONCURRENCY,
+    full: bool = False,
+    export_files: bool = False,
+    cpu_workers: int = CPU_WORKERS,
+    max_attempts: int = MAX_ATTEMPTS,
+    hedge: bool = True,
+):
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    writer = StoreWriter(DocStore(STORE_DIR))
+    store = writer.store
+    # Spawned, not forked: the parent runs a browser and event loop threads
+    pool = ProcessPoolExecutor(cpu_workers, mp_context=multiprocessing.get_context("spawn")) if cpu_workers else None
+    manifest = load_manifest()
+    changes: dict[str, list[str]] = {"added": [], "changed": [], "removed": []}
+    if manifest:
+        print(f"Manifest has {len(manifest)} pages" + ("; --full ignores validators" if full else ""))
 
+    print(f"Fetching {len(letters)} index page(s): {letters.upper()}")
     success = 0
+    unchanged = 0
     errors = 0
-    async with AsyncWebCrawler() as crawler:
-        sem = asyncio.Semaphore(CONCURRENCY)
-
-        async def bound(u: str) -> int:
-            async with sem:
-                doc = await crawl_one(crawler, u)
-                if not doc:
-                    return 0
-                out_path = OUTPUT_DIR / safe_filename(u)
-                with open(out_path, "w", encoding="utf-8") as f:
-                    json.dump(doc, f, ensure_ascii=False, indent=2)
-                return 1
-
-        tasks = [asyncio.create_task(bound(u)) for u in urls]
+    indexed: set[str] = set()
+    # URL -> why it was given up on, reported in the change list
+    failed: dict[str, dict] = {}
+    retry_policy = RetryPolicy(max_attempts=max_attempts)
+    latencies = LatencyTracker(quantile=HEDGE_QUANTILE)
+    hedges = HedgeBudget()
+    async with aiohttp.ClientSession(headers={"User-Agent": USER_AGENT}) as session, \
+            AsyncWebCrawler() as crawler, MetricsReporter(METRICS, metrics_json, metrics_prom, metrics_interval):
+        # In-flight index and page loads follow what healthify.nz can handle (AIMD on latency and errors)
+        controller = AdaptiveConcurrency(concurrency, min_concurrency, max_concurrency, metrics=METRICS)
+
+        async def with_retries(url: str, attempt):
+            """Await attempt() until it succeeds or the retry policy gives up (then None)"""
+            retry_policy.record_attempt()
+            attempts = 0
+            while True:
+                attempts += 1
+                try:
+                    return await attempt()
+                except CrawlFailure as failure:
+                    METRICS.inc("failures_total", reason=failure.kind)
+                    if not retry_policy.should_retry(attempts, failure.retryable):
+                        failed[url] = {"reason": failure.kind, "status": failure.status,
+                                       "detail": failure.detail, "attempts": attempts}
+                        return None
+                    METRICS.inc("retries_total", reason=failure.kind)
+                    await asyncio.sleep(retry_policy.delay(attempts))
+
+        async def discover(letter: str) -> list[str]:
+            index_url = INDEX_URL.format(letter=letter)
+            html = await with_retries(index_url, lambda: fetch_index_html(session, index_url, controller))
+            if html is None:
+                print(f"Index {letter.upper()} failed: {failed[index_url]['reason']} "
+                      f"{failed[index_url]['status'] or failed[index_url]['detail']}")
+                return []
+            indexed.add(letter)
+            found = extract_condition_links(html, index_url, letter)
+            print(f"Discovered {len(found)} condition pages under {letter.upper()}")
+            return found
+
+        async def bound(u: str) -> str:
+            """'added', 'changed', 'unchanged' or 'failed'"""
+            entry = manifest.get(u)
+            on_disk = entry is not None and writer.contains(u)
+            # Hash of the raw HTML from the check, kept so the next run can skip the render
+            body_hash = None
+            if on_disk and not full:
+                try:
+                    check, body_hash, validators = await check_unchanged(session, u, entry, controller)
+                    if check:
+                        if check == "body_hash":
+                            manifest[u] = {**entry, **validators}
+                        METRICS.inc("pages_unchanged_total", check=check)
+                        return "unchanged"
+                except Exception:
+                    pass  # fall through to a full crawl
+            extra = {"bodyHash": body_hash} if body_hash else {}
+
+            async def fetch_page():
+                # Duplicate a request that outlives recent p95 fetch latency once admitted, if a slot is free
+                admitted = asyncio.Event()
+                crawled, hedge_won = await hedged(
+                    lambda: crawl_one(crawler, u, controller, pool, latencies, admitted),
+                    latencies.threshold if hedge else None,
+                    hedges,
+                    ready=lambda: controller.in_flight < controller.current_limit,
+                    started=admitted,
+                )
+                if hedge_won:
+                    METRICS.inc("hedges_won_total")
+                return crawled
+
+            crawled = await with_retries(u, fetch_page)
+            if crawled is None:
+                return "failed"
+            doc, digest, line, validators = crawled
+            if on_disk and entry.get("hash") == digest:
+                manifest[u] = {"file": entry["file"], **validators, "hash": digest, **extra,
+                               "crawledAt": entry.get("crawledAt")}
+                METRICS.inc("pages_unchanged_total", check="hash")
+                return "unchanged"
+            name = safe_filename(u)
+            await writer.put(doc, name, line)
+            METRICS.inc("pages_saved_total")
+            manifest[u] = {"file": name, **validators, "hash": digest, **extra,
+                           "crawledAt": doc["metadata"]["crawledAt"]}
+            outcome = "added" if entry is None else "changed"
+            changes[outcome].append(u)
+            return outcome
+
+        # Each letter's pages start crawling as soon as its index arrives
+        urls: set[str] = set()
+        tasks = []
+        for discovery in asyncio.as_completed([asyncio.create_task(discover(letter)) for letter in letters]):
+            for u in await discovery:
+                if u in urls or (MAX_PAGES and len(urls) >= MAX_PAGES):
+                    continue
+                urls.add(u)
+                tasks.append(asyncio.create_task(bound(u)))
+        print(f"Discovered {len(urls)} condition pages in total")
+
         for i, t in enumerate(asyncio.as_completed(tasks), 1):
             try:
-                success += await t
+                outcome = await t
             except Exception:
+                outcome = "failed"
+            if outcome == "failed":
                 errors += 1
+            elif outcome == "unchanged":
+                unchanged += 1
+            else:
+                success += 1
             if i % 20 == 0:
-                print(f"Progress: {i}/{len(urls)} processed; {success} saved")
+                print(f"Progress: {i}/{len(urls)} processed; {success} saved, {unchanged} unchanged")
+        await writer.drain()
+
+    if pool is not None:
+        pool.shutdown()
+    writer.close()
+    for u in writer.failed:
+        manifest.pop(u, None)
+        for urls_changed in changes.values():
+            if u in urls_changed:
+                urls_changed.remove(u)
+        failed[u] = {"reason": "write", "status": None, "detail": "", "attempts": 1}
+        success -= 1
+        errors += 1
+    # A page is gone only if its letter's index was read in full and no longer lists it
+    if not MAX_PAGES:
+        for u in [u for u in manifest if u not in urls and infer_letter_and_slug(u)[0].lower() in indexed]:
+            store.delete(u)
+            (OUTPUT_DIR / manifest.pop(u)["file"]).unlink(missing_ok=True)
+            changes["removed"].append(u)
+    if export_files:
+        print(f"Exported {store.export(OUTPUT_DIR)} files to {OUTPUT_DIR}")
+    store.close()
+    write_json_atomic(manifest, MANIFEST_PATH)
+    write_json_atomic({
+        "generatedAt": datetime.utcnow().isoformat() + "Z",
+        "letters": sorted(indexed),
+        "counts": {**{k: len(v) for k, v in changes.items()}, "unchanged": unchanged, "failed": errors},
+        **{k: [{"url": u, "file": safe_filename(u)} for u in sorted(v)] for k, v in changes.items()},
+        "failed": [{"url": u, **failed[u]} for u in sorted(failed)],
+    }, CHANGES_PATH)
 
-    print(f"Done. Saved {success} documents to ./data; {len(urls) - success} skipped/failed")
+    print(f"Done. Saved {success} documents to {STORE_DIR}; {unchanged} unchanged, {errors} skipped/failed, "
+          f"{len(changes['removed'])} removed (change list: {CHANGES_PATH})")
+    print(f"Adaptive {controller.summary()}")
+    print(f"Retries: {retry_policy.summary()}; {hedges.spent} hedged requests")
+    print(METRICS.summary())
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Crawl Healthify health A-Z pages into ./data")
+    parser.add_argument("--letters", type=parse_letters, default=LETTERS,
+                        help="Index letters to crawl, e.g. 'abc' or 'a,b,c' (default: all)")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="Starting number of pages in flight")
+    parser.add_argument("--min-concurrency", type=int, default=MIN_CONCURRENCY)
+    parser.add_argument("--max-concurrency", type=int, default=MAX_CONCURRENCY)
+    parser.add_argument("--full", action="store_true",
+                        help="Re-fetch every page instead of sending conditional requests from the manifest")
+    parser.add_argument("--cpu-workers", type=int, default=CPU_WORKERS,
+                        help="Processes for markdown cleaning and serialisation (0 = on the event loop)")
+    parser.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS,
+                        help="Attempts per page before it is reported as failed")
+    parser.add_argument("--no-hedge", action="store_true",
+                        help="Never send a duplicate request for a slow page")
+    parser.add_argument("--export-files", action="store_true",
+                        help="Also write one JSON file per page to ./data (the pre-store layout)")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    # profiling() reports through logging
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    with profiling(args.profile, args.tracemalloc):
+        asyncio.run(main(args.letters, args.metrics_json, args.metrics_prom, args.metrics_interval,
+                         args.concurrency, args.min_concurrency, args.max_concurrency, args.full,
+                         args.export_files, args.cpu_workers, args.max_attempts, not args.no_hedge))
 
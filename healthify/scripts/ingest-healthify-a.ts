@@ -8,6 +8,8 @@ import { Document as LlamaDocument, MarkdownNodeParser, SentenceSplitter } from
 import { ingestDocument } from '@/src/lib/rag';
 import type { DocumentToIngest } from '@/src/lib/rag/types';
 
+import { isDocStore, readDocStore } from './doc-store';
+
 type HealthifyJson = {
   url: string;
   title?: string;
@@ -69,8 +71,19 @@ async function main(): Promise<void> {
   }
 
   const dataDir = path.resolve(process.cwd(), 'data');
-  console.log(`[INGEST] Reading Healthify JSON files from ${dataDir} ...`);
-  const items = await readHealthifyFiles(dataDir);
+  // Pages crawled by healthify_crawl_a.py live in a packed store under data/store
+  const storeDir = path.join(dataDir, 'store');
+  let items: HealthifyJson[];
+  if (await isDocStore(storeDir)) {
+    console.log(`[INGEST] Reading Healthify pages from ${storeDir} ...`);
+    items = [];
+    for await (const item of readDocStore<HealthifyJson>(storeDir)) {
+      items.push(item);
+    }
+  } else {
+    console.log(`[INGEST] Reading Healthify JSON files from ${dataDir} ...`);
+    items = await readHealthifyFiles(dataDir);
+  }
   console.log(`[INGEST] Found ${items.length} files to consider.`);
 
   let ingested = 0;
@@ -3,9 +3,15 @@
 import fs from 'node:fs/promises';
 import path from 'node:path';
 
+import { and, eq } from 'drizzle-orm';
+
 import { ingestDocument } from '@/src/lib/rag';
 import type { DocumentToIngest } from '@/src/lib/rag/types';
 
+import { getDb } from '../../database/client';
+import { ragDocuments } from '../../database/schema/rag';
+import { isDocStore, readDocStore } from './doc-store';
+
 type ChunkJson = {
   url: string;
   title?: string;
@@ -14,6 +20,37 @@ type ChunkJson = {
   metadata?: { lastUpdated?: string; [k: string]: unknown };
 };
 
+type ChunkRef = { url: string; chunkIndex: number; name: string };
+
+// Written by semantic_chunk_healthify.py on every run
+type ChunkChanges = { changed: ChunkRef[]; removed: ChunkRef[] };
+
+const refKey = (url: string, chunkIndex: number) => `${url}#${chunkIndex}`;
+
+async function readChunkChanges(dir: string): Promise<ChunkChanges | null> {
+  try {
+    return JSON.parse(await fs.readFile(path.join(dir, 'chunk_changes.json'), 'utf8')) as ChunkChanges;
+  } catch (err: any) {
+    if (err?.code === 'ENOENT') {
+      return null;
+    }
+    throw err;
+  }
+}
+
+async function deleteChunks(refs: ChunkRef[]): Promise<number> {
+  const db = getDb();
+  let deleted = 0;
+  for (const ref of refs) {
+    const rows = await db
+      .delete(ragDocuments)
+      .where(and(eq(ragDocuments.source, ref.url), eq(ragDocuments.chunkIndex, ref.chunkIndex)))
+      .returning({ id: ragDocuments.id });
+    deleted += rows.length;
+  }
+  return deleted;
+}
+
 async function readChunkFiles(dir: string): Promise<ChunkJson[]> {
   try {
     const entries = await fs.readdir(dir, { withFileTypes: true });
@@ -39,24 +76,68 @@ async function readChunkFiles(dir: string): Promise<ChunkJson[]> {
   }
 }
 
+function argValue(name: string): string | undefined {
+  const args = process.argv.slice(2);
+  const i = args.findIndex(a => a === name || a.startsWith(`${name}=`));
+  if (i === -1) {
+    return undefined;
+  }
+  return args[i]!.includes('=') ? args[i]!.slice(name.length + 1) : args[i + 1];
+}
+
 async function main(): Promise<void> {
   if (!process.env.OPENAI_API_KEY) {
     console.error('[INGEST-CHUNKS] Missing OPENAI_API_KEY');
     process.exit(1);
   }
 
-  const dir = path.resolve(process.cwd(), 'healthify/data/chunks');
-  console.log(`[INGEST-CHUNKS] Reading chunks from ${dir}`);
-  const chunks = await readChunkFiles(dir);
-  console.log(`[INGEST-CHUNKS] Found ${chunks.length} chunks`);
+  // --dir: the chunker's output directory (semantic_chunk_healthify.py --out-dir); both default to healthify/data/chunks
+  const dirArg = argValue('--dir');
+  const dir = path.resolve(process.cwd(), dirArg ?? 'healthify/data/chunks');
+  // --changed-only: upsert just the chunks the last chunker run added or changed, and delete removed ones
+  const changedOnly = process.argv.includes('--changed-only');
+  let wanted: Set<string> | null = null;
+  if (changedOnly) {
+    const changes = await readChunkChanges(dir);
+    if (!changes) {
+      console.error(`[INGEST-CHUNKS] --changed-only needs ${path.join(dir, 'chunk_changes.json')}; `
+        + 'pass the chunker\'s output directory with --dir');
+      process.exit(1);
+    }
+    const deleted = await deleteChunks(changes.removed);
+    console.log(`[INGEST-CHUNKS] Removed ${deleted} rows for ${changes.removed.length} stale chunks`);
+    wanted = new Set(changes.changed.map(ref => refKey(ref.url, ref.chunkIndex)));
+    console.log(`[INGEST-CHUNKS] ${wanted.size} changed chunks to ingest`);
+  }
+
+  // Prefer the packed store written by semantic_chunk_healthify.py; fall back to one file per chunk
+  const storeDir = path.join(dir, 'store');
+  let chunks: AsyncIterable<ChunkJson> | ChunkJson[];
+  let total = '?';
+  if (await isDocStore(storeDir)) {
+    console.log(`[INGEST-CHUNKS] Streaming chunks from ${storeDir}`);
+    chunks = readDocStore<ChunkJson>(storeDir);
+  } else {
+    console.log(`[INGEST-CHUNKS] Reading chunks from ${dir}`);
+    const files = await readChunkFiles(dir);
+    console.log(`[INGEST-CHUNKS] Found ${files.length} chunks`);
+    chunks = files;
+    total = String(files.length);
+  }
+  if (wanted) {
+    total = String(wanted.size);
+  }
 
   let ingested = 0;
   let failed = 0;
-  for (const ch of chunks) {
+  for await (const ch of chunks) {
     if (!ch.url || !ch.content || typeof ch.chunkIndex !== 'number') {
       failed++;
       continue;
     }
+    if (wanted && !wanted.has(refKey(ch.url, ch.chunkIndex))) {
+      continue;
+    }
     const lastUpdated = ch.metadata?.lastUpdated ? new Date(ch.metadata.lastUpdated) : undefined;
     const doc: DocumentToIngest = {
       title: ch.title || 'Untitled',
@@ -70,7 +151,7 @@ async function main(): Promise<void> {
       await ingestDocument(doc, { chunkIndex: ch.chunkIndex });
       ingested++;
       if (ingested % 50 === 0) {
-        console.log(`[INGEST-CHUNKS] Ingested ${ingested}/${chunks.length}`);
+        console.log(`[INGEST-CHUNKS] Ingested ${ingested}/${total}`);
       }
     } catch (err) {
       failed++;
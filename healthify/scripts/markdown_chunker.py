@@ -0,0 +1,130 @@
+"""
+Structure-aware chunking for semantic_chunk_healthify.py --mode fast
+
+Crawled Healthify pages are markdown with a clear heading structure, so most
+chunk boundaries can be found without embeddings:
+- The page is cut into sections at every heading.
+- Sections are packed greedily into chunks of about `target` tokens, never
+  more than `max_tokens`.
+- A section over `max_tokens` is cut at paragraph and list-item boundaries,
+  then sentences, then words. Each piece keeps the section heading for
+  context.
+- A section over `semantic_threshold` tokens is passed to the optional
+  `oversize` callable instead (the semantic splitter), since its topic may
+  change mid-section. Its pieces are packed like any other.
+
+Token counts are estimated at four characters per token, which is accurate
+enough for sizing chunks and costs nothing.
+"""
+
+import re
+from typing import Callable
+
+HEADING_PATTERN = re.compile(r"^#{1,6}\s")
+LIST_ITEM_PATTERN = re.compile(r"^\s*(?:[*+-]|\d+[.)])\s")
+SENTENCE_END_PATTERN = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9(\"'*\[])")
+
+
+def approx_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+def split_sections(markdown: str) -> list[str]:
+    """The page cut before every heading line; text before the first heading is its own section"""
+    sections: list[list[str]] = [[]]
+    for line in markdown.splitlines():
+        if HEADING_PATTERN.match(line) and any(l.strip() for l in sections[-1]):
+            sections.append([])
+        sections[-1].append(line)
+    return [text for text in ("\n".join(lines).strip() for lines in sections) if text]
+
+
+def split_blocks(text: str) -> list[str]:
+    """Paragraphs and list items; a list item keeps its indented continuation lines"""
+    blocks: list[list[str]] = []
+    current: list[str] = []
+    for line in text.splitlines():
+        if not line.strip():
+            if current:
+                blocks.append(current)
+                current = []
+        elif current and (LIST_ITEM_PATTERN.match(line)
+                          or LIST_ITEM_PATTERN.match(current[0]) and not line[:1].isspace()):
+            blocks.append(current)
+            current = [line]
+        else:
+            current.append(line)
+    if current:
+        blocks.append(current)
+    return ["\n".join(lines).strip() for lines in blocks]
+
+
+def _split_words(text: str, max_tokens: int) -> list[str]:
+    pieces: list[str] = []
+    current: list[str] = []
+    size = 0
+    for word in text.split():
+        if current and size + approx_tokens(word) + 1 > max_tokens:
+            pieces.append(" ".join(current))
+            current, size = [], 0
+        current.append(word)
+        size += approx_tokens(word) + 1
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def _fit(text: str, max_tokens: int) -> list[str]:
+    """Cut one block into pieces of at most max_tokens, at sentences if possible"""
+    if approx_tokens(text) <= max_tokens:
+        return [text]
+    pieces: list[str] = []
+    for sentence in SENTENCE_END_PATTERN.split(text):
+        pieces.extend([sentence] if approx_tokens(sentence) <= max_tokens else _split_words(sentence, max_tokens))
+    return pack(pieces, max_tokens, max_tokens, sep=" ")
+
+
+def pack(pieces: list[str], target: int, max_tokens: int, sep: str = "\n\n") -> list[str]:
+    """Join consecutive pieces until a chunk reaches target, without passing max_tokens"""
+    chunks: list[str] = []
+    current: list[str] = []
+    size = 0
+    for piece in pieces:
+        n = approx_tokens(piece) + (approx_tokens(sep) if current else 0)
+        if current and (size >= target or size + n > max_tokens):
+            chunks.append(sep.join(current))
+            current, size, n = [], 0, approx_tokens(piece)
+        current.append(piece)
+        size += n
+    if current:
+        chunks.append(sep.join(current))
+    return chunks
+
+
+def split_markdown(
+    markdown: str,
+    target: int = 350,
+    max_tokens: int = 600,
+    semantic_threshold: int = 1200,
+    oversize: Callable[[str], list[str]] | None = None,
+) -> list[str]:
+    """Chunk texts for one page, in page order"""
+    units: list[str] = []
+    for section in split_sections(markdown):
+        size = approx_tokens(section)
+        if size <= max_tokens:
+            units.append(section)
+            continue
+        # Pieces after the first repeat the heading so they read on their own
+        heading = section.splitlines()[0] if HEADING_PATTERN.match(section) else ""
+        limit = max_tokens - (approx_tokens(heading) + 1 if heading else 0)
+        if oversize is not None and size > semantic_threshold:
+            blocks = [p.strip() for p in oversize(section) if p.strip()]
+        else:
+            blocks = split_blocks(section)
+        pieces = [p for block in blocks for p in _fit(block, limit)]
+        for i, piece in enumerate(pack(pieces, target, limit)):
+            if i and heading and not piece.startswith(heading):
+                piece = f"{heading}\n{piece}"
+            units.append(piece)
+    return pack(units, target, max_tokens)
@@ -1,7 +1,13 @@
 #!/usr/bin/env python3
+import argparse
+import hashlib
 import json
+import multiprocessing
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Callable
 from datetime import datetime
 
 from llama_index.core import Document
@@ -11,11 +17,41 @@ try:
 except Exception:
     OpenAIEmbedding = None  # type: ignore
 
+# Packed document store shared with healthify_crawl_a.py
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from crawl_common.docstore import KEY_SEPARATOR, DocStore, is_store
+
+from chunk_embeddings import CachedEmbedding, EmbeddingCache, HashEmbedding
+from markdown_chunker import split_markdown
+
 DATA_DIR = Path("data")
-OUT_DIR = Path("data_chunks")
+# healthify/data/chunks wherever the script is run from; ingest-healthify-chunks.ts reads the same directory
+OUT_DIR = Path(__file__).resolve().parents[1] / "data" / "chunks"
+# Crawled pages are read from DOC_STORE_DIR when the crawler wrote one, else from DATA_DIR/*.json
+DOC_STORE_DIR = DATA_DIR / "store"
+# Sentence-group vectors by model + text hash; re-chunking unchanged pages needs no embedding calls
+EMBED_CACHE_PATH = OUT_DIR / "embedding_cache.sqlite"
+EMBED_CACHE_MB = 1024
+EMBED_BATCH_SIZE = 1024
+# Documents whose sentence groups are embedded together before they are split
+PREFETCH_DOCS = 200
+# --mode fast: chunk sizes in approximate tokens; only sections over FAST_SEMANTIC_TOKENS are embedded
+FAST_TARGET_TOKENS = 350
+FAST_MAX_TOKENS = 600
+FAST_SEMANTIC_TOKENS = 1200
+# Written into the output directory next to the chunk store (store/):
+# per page, a hash of everything its chunks depend on and the chunk names it produced
+CHUNK_MANIFEST_NAME = "chunk_manifest.json"
+# chunks changed or removed by the last run, for ingest-healthify-chunks.ts --changed-only
+CHUNK_CHANGES_NAME = "chunk_changes.json"
 
 def load_items() -> list[dict]:
     items: list[dict] = []
+    if is_store(DOC_STORE_DIR):
+        store = DocStore(DOC_STORE_DIR)
+        items.extend(store.iter_records())
+        store.close()
+        return items
     if not DATA_DIR.exists():
         print(f"[CHUNK] Data dir not found: {DATA_DIR}")
         return items
@@ -40,60 +76,285 @@ def coerce_date(meta: dict | None) -> str | None:
             continue
     return None
 
-def main() -> None:
-    OUT_DIR.mkdir(parents=True, exist_ok=True)
+def item_text(item: dict) -> str:
+    return (item.get("markdown") or item.get("content") or "").strip()
+
+def source_hash(item: dict, chunker: str) -> str:
+    """Changes whenever re-chunking the page could give different chunks; chunker names the mode and model"""
+    basis = [chunker, item.get("title") or "Untitled", coerce_date(item.get("metadata")), item_text(item)]
+    return hashlib.sha256(json.dumps(basis, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def load_chunk_manifest(path: Path) -> dict:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"[CHUNK] Ignoring unreadable {path}: {e}")
+        return {}
+
+def write_json_atomic(path: Path, data) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+def build_embed_model(model: str, cache_path: Path | None, cache_mb: int, batch_size: int) -> CachedEmbedding:
+    """model is 'openai' or 'local' (deterministic, offline); cache_path None keeps vectors in memory only"""
+    if model == "openai":
+        inner = OpenAIEmbedding(model="text-embedding-3-small")
+    else:
+        inner = HashEmbedding()
+    return CachedEmbedding(inner, EmbeddingCache(cache_path, max_bytes=cache_mb * 1024 * 1024), batch_size)
 
+def build_splitter(embedder: CachedEmbedding) -> SemanticSplitterNodeParser:
     # Reasonable defaults; adjust if needed
-    embed_model = None
-    if OpenAIEmbedding is not None:
-        embed_model = OpenAIEmbedding(model="text-embedding-3-small")
-    splitter = SemanticSplitterNodeParser.from_defaults(
+    return SemanticSplitterNodeParser.from_defaults(
         buffer_size=2,
         breakpoint_percentile_threshold=95,
-        embed_model=embed_model,
+        embed_model=embedder,
     )
 
+def sentence_groups(splitter: SemanticSplitterNodeParser, text: str) -> list[str]:
+    """The texts the splitter will embed for one document"""
+    return [g["combined_sentence"] for g in splitter._build_sentence_groups(splitter.sentence_splitter(text))]
+
+def semantic_split(splitter: SemanticSplitterNodeParser, text: str) -> list[str]:
+    nodes = splitter.get_nodes_from_documents([Document(text=text)])
+    return [getattr(node, "text", None) or (node.get_content() if hasattr(node, "get_content") else "")
+            for node in nodes]
+
+def chunk_item(split: Callable[[str], list[str]], item: dict) -> list[tuple[str, dict]]:
+    """(file name, chunk record) for each non-empty chunk of one crawled page"""
+    url = item.get("url")
+    title = item.get("title") or "Untitled"
+    text = item_text(item)
+    if not url or not text:
+        return []
+
+    meta = item.get("metadata") or {}
+    last_updated = coerce_date(meta)
+
+    # One store record per chunk, named as the per-chunk file it replaces
+    chunks = []
+    safe_name = url.strip("/").replace("https://", "").replace("http://", "").replace("/", "-")
+    for content in split(text):
+        if not content or not content.strip():
+            continue
+        chunk_idx = len(chunks)
+        chunks.append((f"{safe_name}-chunk-{chunk_idx}.json", {
+            "url": url,
+            "title": title,
+            "content": content,
+            "chunkIndex": chunk_idx,
+            "metadata": {
+                "lastUpdated": last_updated,
+                "source": "healthify",
+            },
+        }))
+    return chunks
+
+# This process's chunking setup (one per worker in --workers mode)
+_CHUNKER: dict = {}
+
+def init_chunker(mode: str, sizes: tuple[int, int, int], embed_model: str, embed_cache: Path | None,
+                 embed_cache_mb: int, embed_batch_size: int) -> None:
+    _CHUNKER.clear()
+    _CHUNKER["mode"] = mode
+    _CHUNKER["sizes"] = sizes
+    _CHUNKER["embed_args"] = (embed_model, embed_cache, embed_cache_mb, embed_batch_size)
+
+def chunker_splitter() -> tuple[CachedEmbedding, SemanticSplitterNodeParser]:
+    """Built on first use, so fast mode never creates an embedding client unless a section needs it"""
+    if "splitter" not in _CHUNKER:
+        embedder = build_embed_model(*_CHUNKER["embed_args"])
+        _CHUNKER["embedder"] = embedder
+        _CHUNKER["splitter"] = build_splitter(embedder)
+    return _CHUNKER["embedder"], _CHUNKER["splitter"]
+
+def embed_stats() -> dict:
+    return _CHUNKER["embedder"].stats if "embedder" in _CHUNKER else {"requests": 0, "embedded": 0, "hits": 0}
+
+def chunk_window(items: list[dict]) -> tuple[list[list[tuple[str, dict]]], dict]:
+    """Chunks for each item, in order, plus the embedding stats this window added"""
+    before = embed_stats()
+    if _CHUNKER["mode"] == "fast":
+        target, max_tokens, threshold = _CHUNKER["sizes"]
+        oversize = (lambda section: semantic_split(chunker_splitter()[1], section)) if threshold else None
+        results = [chunk_item(lambda text: split_markdown(text, target, max_tokens, threshold, oversize), item)
+                   for item in items]
+    else:
+        embedder, splitter = chunker_splitter()
+        # Embed the whole window's sentence groups in a few large requests; the splits below hit the cache
+        embedder.prefetch([g for item in items if item.get("url") for g in sentence_groups(splitter, item_text(item))])
+        results = [chunk_item(lambda text: semantic_split(splitter, text), item) for item in items]
+    return results, {k: v - before[k] for k, v in embed_stats().items()}
+
+def main(
+    export_files: bool = False,
+    embed_model: str = "openai" if OpenAIEmbedding is not None else "local",
+    embed_cache: Path | None = EMBED_CACHE_PATH,
+    embed_cache_mb: int = EMBED_CACHE_MB,
+    embed_batch_size: int = EMBED_BATCH_SIZE,
+    workers: int = 1,
+    full: bool = False,
+    mode: str = "semantic",
+    sizes: tuple[int, int, int] = (FAST_TARGET_TOKENS, FAST_MAX_TOKENS, FAST_SEMANTIC_TOKENS),
+    out_dir: Path = OUT_DIR,
+) -> None:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    chunk_store_dir = out_dir / "store"
+    store = DocStore(chunk_store_dir, key_fields=("url", "chunkIndex"))
+    embedding = f"{embed_model}" + (f", cache {embed_cache}" if embed_cache else "")
+    if mode == "fast":
+        target, max_tokens, threshold = sizes
+        print(f"[CHUNK] Splitting on markdown structure, ~{target} tokens per chunk (max {max_tokens}); "
+              + (f"sections over {threshold} tokens split semantically with {embedding}" if threshold
+                 else "no semantic fallback"))
+        # Settings that change fast-mode output are part of every page's hash
+        chunker = f"fast:{target}:{max_tokens}:{threshold}:{embed_model}"
+    else:
+        print(f"[CHUNK] Embedding with {embedding}")
+        chunker = embed_model
+
     items = load_items()
-    print(f"[CHUNK] Loaded {len(items)} items from {DATA_DIR}")
+    print(f"[CHUNK] Loaded {len(items)} items from {DOC_STORE_DIR if is_store(DOC_STORE_DIR) else DATA_DIR}")
+    if not items:
+        # Most likely run from the wrong directory; pruning now would delete every chunk
+        store.close()
+        return
 
-    total_chunks = 0
+    manifest = {} if full else load_chunk_manifest(out_dir / CHUNK_MANIFEST_NAME)
+    hashes: dict[str, str] = {}
+    todo: list[dict] = []
     for item in items:
         url = item.get("url")
-        title = item.get("title") or "Untitled"
-        text = (item.get("markdown") or item.get("content") or "").strip()
-        if not url or not text:
+        if not url or not item_text(item):
             continue
+        hashes[url] = source_hash(item, chunker)
+        entry = manifest.get(url)
+        if (entry and entry["hash"] == hashes[url]
+                and all(store.key(url, i) in store for i in range(len(entry["chunks"])))):
+            continue
+        todo.append(item)
+    print(f"[CHUNK] {len(todo)} of {len(hashes)} pages new or changed" + (" (--full)" if full else ""))
+
+    changed: list[dict] = []
+    removed: list[dict] = []
+    unchanged_chunks = 0
+
+    def remove_chunks(url: str, start: int) -> None:
+        """Drop chunk `start` onwards of a page, from the store and any exported files"""
+        names = (manifest.get(url) or {}).get("chunks", [])
+        idx = start
+        while idx < len(names) or store.key(url, idx) in store:
+            key = store.key(url, idx)
+            name = names[idx] if idx < len(names) else store.name_of(key)
+            store.delete(key)
+            if name:
+                (out_dir / name).unlink(missing_ok=True)
+            removed.append({"url": url, "chunkIndex": idx, "name": name})
+            idx += 1
+
+    chunker_args = (mode, sizes, embed_model, embed_cache, embed_cache_mb, embed_batch_size)
+    if workers > 1 and todo:
+        # Smaller windows than serial mode so the workers stay evenly loaded
+        size = max(1, min(PREFETCH_DOCS, -(-len(todo) // (workers * 4))))
+        windows = [todo[i:i + size] for i in range(0, len(todo), size)]
+        # Spawned, not forked: each worker builds its own splitter and embedding client
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=init_chunker, initargs=chunker_args)
+        results = pool.map(chunk_window, windows)
+        print(f"[CHUNK] Chunking {len(windows)} windows of up to {size} pages on {workers} workers")
+    elif todo:
+        pool = None
+        init_chunker(*chunker_args)
+        results = map(chunk_window, (todo[i:i + PREFETCH_DOCS] for i in range(0, len(todo), PREFETCH_DOCS)))
+    else:
+        pool = None
+        results = iter(())
+
+    # Results arrive in input order, so chunkIndex values, names and store order match the serial run
+    stats = {"requests": 0, "embedded": 0, "hits": 0}
+    windows_done = 0
+    for chunked, window_stats in results:
+        window = todo[windows_done:windows_done + len(chunked)]
+        windows_done += len(chunked)
+        for item, chunks in zip(window, chunked):
+            url = item["url"]
+            for name, out in chunks:
+                # Rewrite only chunks whose content differs, so the changes list stays minimal
+                if store.get(store.key(url, out["chunkIndex"])) == out:
+                    unchanged_chunks += 1
+                    continue
+                store.put(out, name=name)
+                changed.append({"url": url, "chunkIndex": out["chunkIndex"], "name": name})
+            remove_chunks(url, len(chunks))
+            manifest[url] = {"hash": hashes[url], "chunks": [name for name, _ in chunks]}
+        for k, v in window_stats.items():
+            stats[k] += v
+    if pool is not None:
+        pool.shutdown()
+
+    # Pages gone from the crawl (or now empty) lose all their chunks; the store keys
+    # also cover chunks written before there was a manifest
+    stored_urls = {key.split(KEY_SEPARATOR, 1)[0] for key in store.keys()}
+    gone = sorted(url for url in set(manifest) | stored_urls if url not in hashes)
+    for url in gone:
+        remove_chunks(url, 0)
+        manifest.pop(url, None)
 
-        meta = item.get("metadata") or {}
-        last_updated = coerce_date(meta)
-
-        doc = Document(text=text, metadata={"url": url, "title": title})
-        nodes = splitter.get_nodes_from_documents([doc])
-
-        # Write one file per chunk
-        chunk_idx = 0
-        for node in nodes:
-            content = getattr(node, "text", None) or (node.get_content() if hasattr(node, "get_content") else "")
-            if not content or not content.strip():
-                continue
-            out = {
-                "url": url,
-                "title": title,
-                "content": content,
-                "chunkIndex": chunk_idx,
-                "metadata": {
-                    "lastUpdated": last_updated,
-                    "source": "healthify",
-                },
-            }
-            safe_name = url.strip("/").replace("https://", "").replace("http://", "").replace("/", "-")
-            out_path = OUT_DIR / f"{safe_name}-chunk-{chunk_idx}.json"
-            out_path.write_text(json.dumps(out, ensure_ascii=False, indent=2), encoding="utf-8")
-            chunk_idx += 1
-            total_chunks += 1
-
-    print(f"[CHUNK] Wrote {total_chunks} chunks into {OUT_DIR}")
+    if export_files:
+        print(f"[CHUNK] Exported {store.export(out_dir)} chunk files to {out_dir}")
+    total_chunks = len(store)
+    store.close()
+    write_json_atomic(out_dir / CHUNK_MANIFEST_NAME, manifest)
+    write_json_atomic(out_dir / CHUNK_CHANGES_NAME, {
+        "generatedAt": datetime.now().astimezone().isoformat(),
+        "counts": {
+            "pagesRechunked": len(todo),
+            "pagesRemoved": len(gone),
+            "changed": len(changed),
+            "unchanged": unchanged_chunks,
+            "removed": len(removed),
+        },
+        "changed": changed,
+        "removed": removed,
+    })
+    print(f"[CHUNK] {len(changed)} chunks written, {unchanged_chunks} unchanged, {len(removed)} removed; "
+          f"{total_chunks} chunks in {chunk_store_dir}")
+    print(f"[CHUNK] {stats['requests']} embedding requests for {stats['embedded']} texts, {stats['hits']} cache hits")
+    print(f"[CHUNK] Changed chunks listed in {out_dir / CHUNK_CHANGES_NAME}; ingest them with "
+          f"npm run db:ingest-healthify-chunks -- --dir {out_dir.resolve()} --changed-only")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Semantically chunk crawled Healthify pages")
+    parser.add_argument("--mode", choices=["semantic", "fast"], default="semantic",
+                        help="'fast' splits on markdown headings, paragraphs and list items, embedding only oversized sections")
+    parser.add_argument("--target-tokens", type=int, default=FAST_TARGET_TOKENS, help="--mode fast: chunk size to aim for")
+    parser.add_argument("--max-tokens", type=int, default=FAST_MAX_TOKENS, help="--mode fast: hard chunk size limit")
+    parser.add_argument("--semantic-threshold", type=int, default=FAST_SEMANTIC_TOKENS,
+                        help="--mode fast: split sections larger than this semantically (0 never embeds)")
+    parser.add_argument("--out-dir", type=Path, default=OUT_DIR,
+                        help="Chunk store, manifest and change list (default healthify/data/chunks, "
+                             "where ingest-healthify-chunks.ts looks unless given --dir)")
+    parser.add_argument("--export-files", action="store_true",
+                        help="Also write one JSON file per chunk to the output directory (the pre-store layout)")
+    parser.add_argument("--embed-model", choices=["openai", "local"],
+                        default="openai" if OpenAIEmbedding is not None else "local",
+                        help="'local' is a deterministic offline stand-in (default when llama-index-embeddings-openai is missing)")
+    parser.add_argument("--embed-cache", type=Path, default=EMBED_CACHE_PATH,
+                        help="SQLite embedding cache shared across runs")
+    parser.add_argument("--no-embed-cache", action="store_true", help="Keep embeddings in memory for this run only")
+    parser.add_argument("--embed-cache-mb", type=int, default=EMBED_CACHE_MB,
+                        help="Evict least recently used vectors beyond this size")
+    parser.add_argument("--embed-batch-size", type=int, default=EMBED_BATCH_SIZE,
+                        help="Texts per embedding request (max 2048)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Chunking processes; output is identical to the serial run")
+    parser.add_argument("--full", action="store_true",
+                        help="Re-split every page, ignoring the chunk manifest")
+    args = parser.parse_args()
+    main(args.export_files, args.embed_model, None if args.no_embed_cache else args.embed_cache,
+         args.embed_cache_mb, args.embed_batch_size, args.workers, args.full, args.mode,
+         (args.target_tokens, args.max_tokens, args.semantic_threshold), args.out_dir)
 